@@ -0,0 +1,10 @@
+-- Adds the table the pipeline keeps its salesfeed high-water mark in, for databases
+-- created before it existed. Until it exists, every load with a high-water mark
+-- fails and rolls back its sales. Safe to run more than once.
+
+CREATE TABLE IF NOT EXISTS etl_watermark (
+    pipeline_name VARCHAR(50) NOT NULL,
+    high_water_mark BIGINT NOT NULL,
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (pipeline_name)
+);
@@ -0,0 +1,178 @@
+"""Script for backfilling historical salesfeed windows through the ETL in parallel."""
+# pylint: disable=broad-except
+
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import nullcontext
+from datetime import datetime, UTC
+
+import pandas as pd
+from dotenv import load_dotenv
+
+from utilities import get_logger, set_logger
+from extract import (fetch_new_api_data, collect_api_columns, get_enriched_items,
+                     MAX_SCRAPE_WORKERS)
+from transform import REQUIRED_COLUMNS
+from load import load_stage_frames
+from staging import build_stage_frames
+
+WINDOW_SECONDS = 600
+MAX_WINDOW_REQUESTS = 50
+DEFAULT_CHECKPOINT_PATH = "data/backfill_checkpoint.json"
+
+_DB_SEMAPHORE = None
+
+
+def split_windows(start: int, end: int,
+                  window_seconds: int = WINDOW_SECONDS) -> list[tuple[int, int]]:
+    """Returns consecutive (window_start, window_end) pairs covering start to end."""
+    if not isinstance(start, int) or not isinstance(end, int):
+        raise TypeError("Backfill start and end must be epoch seconds.")
+    if start < 0 or end <= start:
+        raise ValueError("Backfill end must be after a non-negative start.")
+    if window_seconds <= 0:
+        raise ValueError("Window size must be positive.")
+    return [(window_start, min(window_start + window_seconds, end))
+            for window_start in range(start, end, window_seconds)]
+
+
+def load_checkpoint(checkpoint_path: str) -> set[int]:
+    """Returns the start times of windows already finished by a previous backfill."""
+    if not os.path.exists(checkpoint_path):
+        return set()
+    with open(checkpoint_path, encoding="utf-8") as checkpoint_file:
+        return set(json.load(checkpoint_file).get("completed", []))
+
+
+def save_checkpoint(checkpoint_path: str, completed: set[int]) -> None:
+    """Returns None, but atomically rewrites the checkpoint with the finished windows."""
+    temp_path = checkpoint_path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as checkpoint_file:
+        json.dump({"completed": sorted(completed)}, checkpoint_file)
+    os.replace(temp_path, checkpoint_path)
+
+
+def init_worker(db_semaphore) -> None:
+    """Returns None, but sets up logging and the shared DB semaphore in a worker process."""
+    global _DB_SEMAPHORE  # pylint: disable=global-statement
+    _DB_SEMAPHORE = db_semaphore
+    set_logger()
+    load_dotenv(".env")
+
+
+def hold_db_slot():
+    """Returns a context manager holding one of the DB semaphore's slots, or doing
+    nothing outside a backfill worker."""
+    return nullcontext() if _DB_SEMAPHORE is None else _DB_SEMAPHORE
+
+
+def get_enriched_items_limited(urls: list[str]) -> dict[str, dict]:
+    """Returns get_enriched_items for the urls, holding a DB slot while it queries,
+    so the per-window lookups count towards the same connection limit as loads."""
+    with hold_db_slot():
+        return get_enriched_items(urls)
+
+
+def process_window(window: tuple[int, int], scrape_workers: int = MAX_SCRAPE_WORKERS) -> int:
+    """Returns the number of events loaded after running extract, transform and load
+    for one window. Only as many windows as the DB semaphore allows look up stored
+    items or load at once; scraping runs outside it."""
+    logger = get_logger()
+    window_start, window_end = window
+    try:
+        api_data = fetch_new_api_data(window_start, MAX_WINDOW_REQUESTS, until=window_end)
+    except ValueError:
+        logger.info("No salesfeed data for window starting %s.", window_start)
+        return 0
+    events = [event for event in api_data.get("events") or []
+              if event.get("items") and event.get("utc_date", window_start) < window_end]
+    if not events:
+        return 0
+
+    api_columns = collect_api_columns(
+        api_data | {"events": events}, max_workers=scrape_workers,
+        columns=REQUIRED_COLUMNS, lookup_enriched=get_enriched_items_limited)
+    sales, tags = build_stage_frames(pd.DataFrame(api_columns))
+
+    with hold_db_slot():
+        load_stage_frames(sales, tags)
+    return len(sales)
+
+
+def run_backfill(start: int, end: int, workers: int = 4, db_workers: int = 4,
+                 checkpoint_path: str = DEFAULT_CHECKPOINT_PATH,
+                 window_seconds: int = WINDOW_SECONDS) -> dict:
+    """Returns a summary of the backfill after processing every unfinished window
+    between start and end across a process pool.
+    db_workers bounds how many windows load into the database at the same time.
+    Finished windows are checkpointed, so an interrupted backfill resumes where it stopped."""
+    logger = get_logger()
+    windows = split_windows(start, end, window_seconds)
+    completed = load_checkpoint(checkpoint_path)
+    pending = [window for window in windows if window[0] not in completed]
+    logger.info("Backfilling %s windows (%s already done) with %s workers...",
+                len(pending), len(windows) - len(pending), workers)
+
+    events_loaded = 0
+    failed = 0
+    started_at = time.perf_counter()
+    db_semaphore = multiprocessing.get_context().BoundedSemaphore(db_workers)
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(db_semaphore,)) as executor:
+        futures = {executor.submit(process_window, window): window for window in pending}
+        for future in as_completed(futures):
+            window = futures[future]
+            try:
+                window_events = future.result()
+            except Exception:
+                logger.exception("Window starting %s failed.", window[0])
+                failed += 1
+                continue
+            events_loaded += window_events
+            completed.add(window[0])
+            save_checkpoint(checkpoint_path, completed)
+            elapsed = time.perf_counter() - started_at
+            logger.info("Window starting %s done: %s events (%.1f events/s overall)",
+                        window[0], window_events, events_loaded / elapsed)
+
+    elapsed = time.perf_counter() - started_at
+    summary = {
+        "windows": len(pending) - failed,
+        "failed": failed,
+        "events": events_loaded,
+        "seconds": round(elapsed, 2),
+        "events_per_second": round(events_loaded / elapsed, 2) if elapsed else 0.0,
+    }
+    logger.info("Backfill finished: %s", summary)
+    return summary
+
+
+def parse_timestamp(value: str) -> int:
+    """Returns epoch seconds for an ISO date or datetime (taken as UTC) or an epoch string."""
+    if value.isdigit():
+        return int(value)
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=UTC)
+    return int(parsed.timestamp())
+
+
+if __name__ == "__main__":
+    set_logger()
+    load_dotenv(".env")
+    parser = argparse.ArgumentParser(description="Backfill salesfeed history.")
+    parser.add_argument("start", type=parse_timestamp,
+                        help="Start of the range (ISO datetime in UTC, or epoch seconds).")
+    parser.add_argument("end", type=parse_timestamp,
+                        help="End of the range (ISO datetime in UTC, or epoch seconds).")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--db-workers", type=int, default=4)
+    parser.add_argument("--window-seconds", type=int, default=WINDOW_SECONDS)
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT_PATH)
+    args = parser.parse_args()
+    run_backfill(args.start, args.end, args.workers, args.db_workers,
+                 args.checkpoint, args.window_seconds)
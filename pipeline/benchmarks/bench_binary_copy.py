@@ -0,0 +1,82 @@
+"""Benchmark comparing CSV and binary COPY payloads for the staging tables.
+
+Builds the staging frames for a synthetic extract, then in a fresh process per
+run copies them with load.copy_df in either format. The COPY goes to a cursor
+that reads the payload in 8 kB blocks, as psycopg2 does, and drops it, so no
+database is needed. Peak resident set size is measured from after the frames
+are built, so it shows what the COPY itself holds in memory. Before timing,
+the streamed binary payload is checked against one built in a single chunk.
+
+Run from the pipeline directory:
+    python benchmarks/bench_binary_copy.py [rows ...]
+"""
+
+import gc
+import multiprocessing
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable=wrong-import-position
+from bench_transform_memory import build_extract_frame, read_memory_kb
+from binary_copy import CopyStream, encode_columns, iter_copy_chunks
+from load import copy_df, SALE_COLS, TAG_COLS, STAGE_COLUMN_TYPES
+from staging import build_stage_frames
+
+DEFAULT_ROWS = (10000, 100000, 1000000)
+BLOCK_SIZE = 8192
+
+
+class DiscardingCursor:
+    """Stands in for a database cursor, reading each COPY payload in blocks and dropping it."""
+
+    def __init__(self):
+        self.bytes_read = 0
+
+    def copy_expert(self, _sql: str, buf) -> None:
+        """Reads the COPY buffer a block at a time like psycopg2 does."""
+        while block := buf.read(BLOCK_SIZE):
+            self.bytes_read += len(block)
+
+
+def check_same_payload(rows: int = 10000) -> None:
+    """Checks that streaming the binary payload in chunks gives the same bytes."""
+    sales, _ = build_stage_frames(build_extract_frame(rows))
+    parts = encode_columns(sales, SALE_COLS, STAGE_COLUMN_TYPES)
+    streamed = CopyStream(iter_copy_chunks(parts, len(sales), chunk_rows=997))
+    whole = CopyStream(iter_copy_chunks(parts, len(sales), chunk_rows=len(sales)))
+    assert streamed.read() == whole.read()
+
+
+def measure_copy(rows: int, binary: bool) -> tuple[float, float, float]:
+    """Returns the peak RSS in MB, wall seconds and payload MB of one copy.
+    Runs in a child process."""
+    sales, tags = build_stage_frames(build_extract_frame(rows))
+    cur = DiscardingCursor()
+    gc.collect()
+    with open("/proc/self/clear_refs", "w", encoding="utf-8") as clear_refs:
+        clear_refs.write("5")
+    started_at = time.perf_counter()
+    copy_df(cur, sales, "stage_sale", SALE_COLS, binary=binary)
+    copy_df(cur, tags, "stage_tag", TAG_COLS, binary=binary)
+    elapsed = time.perf_counter() - started_at
+    return read_memory_kb("VmHWM") / 1024, elapsed, cur.bytes_read / 2 ** 20
+
+
+def run_benchmark(row_counts: tuple[int, ...] = DEFAULT_ROWS) -> None:
+    """Prints peak memory, time, throughput and payload size of both formats."""
+    check_same_payload()
+    context = multiprocessing.get_context("spawn")
+    print(f"{'rows':>10}{'format':>8}{'peak MB':>10}{'wall s':>9}{'rows/s':>12}{'payload MB':>12}")
+    for rows in row_counts:
+        for binary in (False, True):
+            with context.Pool(1) as pool:
+                peak, elapsed, payload = pool.apply(measure_copy, (rows, binary))
+            print(f"{rows:>10,}{'binary' if binary else 'csv':>8}{peak:>10.1f}"
+                  f"{elapsed:>9.2f}{rows / elapsed:>12,.0f}{payload:>12.1f}")
+
+
+if __name__ == "__main__":
+    run_benchmark(tuple(int(rows) for rows in sys.argv[1:]) or DEFAULT_ROWS)
@@ -0,0 +1,75 @@
+"""Benchmark comparing separate and fused transform and load frame building.
+
+Times build_frames(clean_dataframe(df)) against staging.build_stage_frames on
+synthetic extract frames, checking that both give identical staging frames
+first. Peak memory of each path is measured in a fresh process as in
+bench_transform_memory.
+
+Run from the pipeline directory:
+    python benchmarks/bench_fused_stage.py [rows ...]
+"""
+
+import ctypes
+import gc
+import multiprocessing
+import os
+import sys
+import time
+
+import pandas as pd
+import pyarrow as pa
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable=wrong-import-position
+from bench_transform_memory import build_extract_frame, read_memory_kb
+from load import build_frames
+from staging import build_stage_frames
+from transform import clean_dataframe
+
+DEFAULT_ROWS = (1000, 100000, 1000000)
+
+
+def separate_path(df: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Returns the staging frames built by clean_dataframe and then build_frames."""
+    return build_frames(clean_dataframe(df))
+
+
+def measure_path(rows: int, fused: bool) -> tuple[float, float]:
+    """Returns the extra peak RSS in MB and wall seconds for one path.
+    Runs in a child process."""
+    df = build_extract_frame(rows)
+    gc.collect()
+    ctypes.CDLL("libc.so.6").malloc_trim(0)
+    pa.default_memory_pool().release_unused()
+    with open("/proc/self/clear_refs", "w", encoding="utf-8") as clear_refs:
+        clear_refs.write("5")
+    baseline = read_memory_kb("VmRSS")
+    started_at = time.perf_counter()
+    _ = build_stage_frames(df) if fused else separate_path(df)
+    elapsed = time.perf_counter() - started_at
+    return (read_memory_kb("VmHWM") - baseline) / 1024, elapsed
+
+
+def check_same_output(rows: int = 10000) -> None:
+    """Raises AssertionError unless both paths give the same staging frames."""
+    df = build_extract_frame(rows)
+    for expected, actual in zip(separate_path(df), build_stage_frames(df)):
+        pd.testing.assert_frame_equal(expected, actual)
+
+
+def run_benchmark(row_counts: tuple[int, ...] = DEFAULT_ROWS) -> None:
+    """Prints extra peak memory and wall time for both paths at each row count."""
+    check_same_output()
+    context = multiprocessing.get_context("spawn")
+    print(f"{'rows':>10}{'path':>10}{'peak +MB':>11}{'wall s':>9}")
+    for rows in row_counts:
+        for fused in (False, True):
+            with context.Pool(1) as pool:
+                peak, elapsed = pool.apply(measure_path, (rows, fused))
+            print(f"{rows:>10,}{'fused' if fused else 'separate':>10}"
+                  f"{peak:>11.1f}{elapsed:>9.3f}")
+
+
+if __name__ == "__main__":
+    run_benchmark(tuple(int(rows) for rows in sys.argv[1:]) or DEFAULT_ROWS)
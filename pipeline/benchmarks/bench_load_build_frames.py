@@ -0,0 +1,113 @@
+"""Benchmark comparing row-wise and vectorised name columns in load.build_frames.
+
+Builds a synthetic cleaned frame and times the previous per-row .apply
+derivation of track_name, album_name and merch_name against build_frames,
+checking that both give identical output first.
+
+Run from the pipeline directory:
+    python benchmarks/bench_load_build_frames.py [rows ...]
+"""
+
+import gc
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable=wrong-import-position
+from load import build_frames, NAME_LEN
+
+DEFAULT_ROWS = (1000, 100000, 1000000)
+ITEM_KINDS = (("t", "t"), ("a", "a"), ("a", "p"), ("p", "p"), ("t", "a"))
+
+
+def build_clean_frame(rows: int) -> pd.DataFrame:
+    """Returns a synthetic frame shaped like transform's output.
+    Some descriptions are missing, empty or longer than the name columns allow."""
+    rng = np.random.default_rng(42)
+    kinds = rng.integers(0, len(ITEM_KINDS), rows)
+    descriptions = np.array([f"Release {i}" for i in range(rows)], dtype=object)
+    oddities = rng.choice(4, rows, p=[0.85, 0.05, 0.05, 0.05])
+    descriptions[oddities == 1] = ""
+    descriptions[oddities == 2] = None
+    descriptions[oddities == 3] = "x" * (NAME_LEN + 20)
+    return pd.DataFrame({
+        "utc_date": pd.to_datetime(1749583860 + rng.uniform(0, 86400, rows),
+                                   unit="s", utc=True),
+        "item_type": [ITEM_KINDS[kind][1] for kind in kinds],
+        "album_name": np.where(rng.random(rows) < 0.5, "Album Name", None),
+        "artist_name": "Artist",
+        "item_description": descriptions,
+        "tag_names": [["rock", "indie"]] * rows,
+        "sold_for": rng.uniform(1, 50, rows).round(2),
+        "release_date": pd.Timestamp("2024-10-11"),
+        "country_name": "Japan",
+        "slug_type": [ITEM_KINDS[kind][0] for kind in kinds],
+        "url": [f"https://artist{i % 5000}.bandcamp.com/album/release" for i in range(rows)],
+        "art_url": "https://f4.bcbits.com/img/a3672109546_7.jpg",
+    })
+
+
+def apply_names(df: pd.DataFrame) -> pd.DataFrame:
+    """Returns the name columns derived the previous way, with one .apply per column."""
+    item_description = df["item_description"].fillna("")
+    names = pd.DataFrame(index=df.index)
+    names["track_name"] = df.apply(
+        lambda row: (
+            item_description[row.name][:NAME_LEN]
+            if (row.slug_type == "t" and row.item_type == "t")
+            else None
+        ),
+        axis=1,
+    )
+    names["album_name"] = df.apply(
+        lambda row: (
+            (row.album_name if row.item_type == "p"
+             else (row.get('album_title') or item_description[row.name] or 'Unknown Album'))[:NAME_LEN]
+            if (row.slug_type == "a" and row.item_type in ["a", "p"]) else None
+        ),
+        axis=1,
+    )
+    names["merch_name"] = df.apply(
+        lambda row: (item_description[row.name][:NAME_LEN]
+                     if (row.slug_type == "p" and row.item_type == "p") else None), axis=1
+    )
+    return names
+
+
+def vectorised_names(df: pd.DataFrame) -> pd.DataFrame:
+    """Returns the name columns from build_frames."""
+    sales, _ = build_frames(df)
+    return sales[["track_name", "album_name", "merch_name"]]
+
+
+def time_path(func, df: pd.DataFrame) -> tuple[float, pd.DataFrame]:
+    """Returns wall seconds and the result of func."""
+    gc.collect()
+    started_at = time.perf_counter()
+    result = func(df)
+    return time.perf_counter() - started_at, result
+
+
+def run_benchmark(row_counts: tuple[int, ...] = DEFAULT_ROWS) -> None:
+    """Prints wall time for the previous name derivation and the whole of build_frames."""
+    print(f"{'rows':>10}{'apply s':>12}{'build s':>12}{'speed-up':>10}")
+    for rows in row_counts:
+        df = build_clean_frame(rows)
+        # album-merch rows without an album name made the previous code fail.
+        df = df[~((df["item_type"] == "p") & (df["slug_type"] == "a")
+                  & df["album_name"].isna())]
+        apply_seconds, expected = time_path(apply_names, df)
+        build_seconds, actual = time_path(vectorised_names, df)
+        # build_frames keeps string columns arrow-backed, so only the values must match.
+        pd.testing.assert_frame_equal(expected, actual, check_dtype=False)
+        print(f"{rows:>10,}{apply_seconds:>12.3f}{build_seconds:>12.3f}"
+              f"{apply_seconds / build_seconds:>9.1f}x")
+
+
+if __name__ == "__main__":
+    run_benchmark(tuple(int(rows) for rows in sys.argv[1:]) or DEFAULT_ROWS)
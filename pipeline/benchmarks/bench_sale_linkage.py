@@ -0,0 +1,133 @@
+"""Benchmark comparing the two ways of linking new sales to their assignments.
+
+Stages synthetic sales where groups of purchases share a timestamp and country,
+then in an in-memory SQLite database (standing in for PostgreSQL, with the same
+table and join shapes as load.merge_staging) inserts the sales and fills the
+sale_*_assignment tables either by joining the returned sales back to staging on
+(utc_date, country_id), as the pipeline used to, or on the stage_id each sale
+was inserted with. Every staged sale should give exactly one assignment; the old
+join gives one per sale in the same (utc_date, country) group instead.
+
+Run from the pipeline directory:
+    python benchmarks/bench_sale_linkage.py [rows]
+"""
+
+import sqlite3
+import sys
+import time
+
+DEFAULT_ROWS = 20000
+GROUP_SIZES = (1, 5, 25, 100)
+COUNTRIES = ("Japan", "Germany", "United Kingdom", "United States")
+KINDS = ("track", "album", "merchandise")
+
+SCHEMA = """
+CREATE TABLE country (country_id INTEGER PRIMARY KEY, country_name TEXT UNIQUE);
+CREATE TABLE track (track_id INTEGER PRIMARY KEY, url TEXT UNIQUE);
+CREATE TABLE album (album_id INTEGER PRIMARY KEY, url TEXT UNIQUE);
+CREATE TABLE merchandise (merchandise_id INTEGER PRIMARY KEY, url TEXT UNIQUE);
+CREATE TABLE sale (sale_id INTEGER PRIMARY KEY, utc_date TEXT, country_id INTEGER);
+CREATE TABLE sale_track_assignment (track_id INTEGER, sale_id INTEGER, sold_for REAL);
+CREATE TABLE sale_album_assignment (album_id INTEGER, sale_id INTEGER, sold_for REAL);
+CREATE TABLE sale_merchandise_assignment (merchandise_id INTEGER, sale_id INTEGER,
+                                          sold_for REAL);
+CREATE TABLE stage_sale (stage_id INTEGER PRIMARY KEY, utc_date TEXT, country_name TEXT,
+                         kind TEXT, url TEXT, sold_for REAL);
+"""
+
+
+def build_database(rows: int, group_size: int) -> sqlite3.Connection:
+    """Returns a database with rows staged sales, group_size of them per
+    (utc_date, country), and the dimension rows they refer to."""
+    conn = sqlite3.connect(":memory:")
+    conn.executescript(SCHEMA)
+    conn.executemany("INSERT INTO country(country_name) VALUES (?)",
+                     [(country,) for country in COUNTRIES])
+    staged = []
+    for i in range(rows):
+        group = i // group_size
+        kind = KINDS[i % len(KINDS)]
+        staged.append((f"2025-06-10 08:{group // 60 % 60:02}:{group % 60:02}.{group // 3600}",
+                       COUNTRIES[group % len(COUNTRIES)], kind,
+                       f"//artist{i}.bandcamp.com/{kind}/{i}", 8.0))
+    conn.executemany("INSERT INTO stage_sale(utc_date, country_name, kind, url, sold_for) "
+                     "VALUES (?, ?, ?, ?, ?)", staged)
+    for kind in KINDS:
+        conn.execute(f"INSERT INTO {kind}(url) SELECT url FROM stage_sale WHERE kind = ?",
+                     (kind,))
+    return conn
+
+
+def link_by_date(conn: sqlite3.Connection) -> None:
+    """Inserts the sales and links them by joining back on (utc_date, country_id)."""
+    inserted = conn.execute("""
+        INSERT INTO sale(utc_date, country_id)
+        SELECT s.utc_date, c.country_id
+        FROM stage_sale s JOIN country c USING (country_name)
+        RETURNING sale_id, utc_date, country_id""").fetchall()
+    conn.execute("CREATE TEMP TABLE inserted_sales (sale_id, utc_date, country_id)")
+    conn.executemany("INSERT INTO inserted_sales VALUES (?, ?, ?)", inserted)
+    for kind in KINDS:
+        conn.execute(f"""
+            INSERT INTO sale_{kind}_assignment({kind}_id, sale_id, sold_for)
+            SELECT d.{kind}_id, i.sale_id, s.sold_for
+            FROM stage_sale s
+            JOIN {kind} d USING (url)
+            JOIN country c USING (country_name)
+            JOIN inserted_sales i
+            ON i.utc_date = s.utc_date AND i.country_id = c.country_id""")
+
+
+def link_by_stage_id(conn: sqlite3.Connection) -> None:
+    """Inserts the sales with ids drawn up front, carrying stage_id out of the insert,
+    and links them by joining on it."""
+    next_id = conn.execute("SELECT COALESCE(MAX(sale_id), 0) FROM sale").fetchone()[0]
+    conn.execute("""
+        CREATE TEMP TABLE new_sales AS
+        SELECT s.stage_id, s.stage_id + ? AS sale_id, s.utc_date, c.country_id
+        FROM stage_sale s JOIN country c USING (country_name)""", (next_id,))
+    returned = conn.execute("""
+        INSERT INTO sale(sale_id, utc_date, country_id)
+        SELECT sale_id, utc_date, country_id FROM new_sales
+        RETURNING sale_id""").fetchall()
+    conn.execute("CREATE TEMP TABLE inserted_sales (stage_id INTEGER PRIMARY KEY, sale_id)")
+    conn.execute("CREATE TEMP TABLE returned_ids (sale_id INTEGER PRIMARY KEY)")
+    conn.executemany("INSERT INTO returned_ids VALUES (?)", returned)
+    conn.execute("""
+        INSERT INTO inserted_sales
+        SELECT n.stage_id, r.sale_id FROM returned_ids r JOIN new_sales n USING (sale_id)""")
+    for kind in KINDS:
+        conn.execute(f"""
+            INSERT INTO sale_{kind}_assignment({kind}_id, sale_id, sold_for)
+            SELECT d.{kind}_id, i.sale_id, s.sold_for
+            FROM inserted_sales i
+            JOIN stage_sale s USING (stage_id)
+            JOIN {kind} d USING (url)""")
+
+
+def measure(link, rows: int, group_size: int) -> tuple[float, int]:
+    """Returns the wall seconds taken and the number of assignment rows written."""
+    conn = build_database(rows, group_size)
+    started_at = time.perf_counter()
+    link(conn)
+    elapsed = time.perf_counter() - started_at
+    linked = sum(conn.execute(f"SELECT COUNT(*) FROM sale_{kind}_assignment").fetchone()[0]
+                 for kind in KINDS)
+    conn.close()
+    return elapsed, linked
+
+
+def run_benchmark(rows: int = DEFAULT_ROWS) -> None:
+    """Prints the assignment rows and time of both linkages for each group size."""
+    print(f"{'sales':>8}{'per group':>11}{'date rows':>12}{'date s':>9}"
+          f"{'stage_id rows':>15}{'stage_id s':>12}")
+    for group_size in GROUP_SIZES:
+        date_seconds, date_rows = measure(link_by_date, rows, group_size)
+        stage_seconds, stage_rows = measure(link_by_stage_id, rows, group_size)
+        assert stage_rows == rows
+        print(f"{rows:>8,}{group_size:>11}{date_rows:>12,}{date_seconds:>9.2f}"
+              f"{stage_rows:>15,}{stage_seconds:>12.2f}")
+
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ROWS)
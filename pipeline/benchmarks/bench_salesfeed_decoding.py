@@ -0,0 +1,132 @@
+"""Benchmark comparing dict-based and typed-record decoding of a salesfeed payload.
+
+Builds a synthetic 50k-event feed and times the path from raw JSON to the
+extract DataFrame, reporting wall time and peak traced memory for each.
+
+Run from the pipeline directory:
+    python benchmarks/bench_salesfeed_decoding.py [events]
+"""
+
+import gc
+import json
+import random
+import re
+import sys
+import os
+import time
+import tracemalloc
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable=wrong-import-position
+from salesfeed import decode_salesfeed, items_to_columns
+
+DEFAULT_EVENTS = 50000
+DISTINCT_URLS = 2000
+
+
+def build_feed(events: int) -> tuple[bytes, dict]:
+    """Returns a synthetic salesfeed payload and the scraped details for its urls."""
+    rng = random.Random(42)
+    urls = [f"//artist{i}.bandcamp.com/{'album' if i % 3 else 'track'}/release-{i}"
+            for i in range(DISTINCT_URLS)]
+    feed_events = []
+    for index in range(events):
+        url = rng.choice(urls)
+        item_type = "a" if "/album/" in url else "t"
+        feed_events.append({
+            "event_type": "sale",
+            "utc_date": 1749638295.3 + index,
+            "items": [{
+                "utc_date": 1749638295.4 + index,
+                "artist_name": f"Artist {url[8:12]}",
+                "item_type": item_type,
+                "item_description": f"Release {index % DISTINCT_URLS}",
+                "album_title": None,
+                "slug_type": item_type,
+                "track_album_slug_text": None,
+                "currency": "EUR",
+                "amount_paid": 7,
+                "item_price": 7,
+                "amount_paid_usd": 8,
+                "country": rng.choice(["Japan", "Germany", "United Kingdom"]),
+                "art_id": 3672109546,
+                "releases": None,
+                "package_image_id": None,
+                "url": url,
+                "country_code": "jp",
+                "amount_paid_fmt": "€7",
+                "art_url": "https://f4.bcbits.com/img/a3672109546_7.jpg",
+            }],
+        })
+    payload = {"start_date": 1749583860, "end_date": 1749584460,
+               "data_delay_sec": 120, "events": feed_events, "server_time": 1749584469}
+    details = {"https://" + url.lstrip("/"): {
+        "release_date": "released October 11, 2024", "genres": ["jazz", "ambient"]}
+        for url in urls}
+    return json.dumps(payload).encode(), details
+
+
+def dict_path(raw: bytes, details: dict) -> pd.DataFrame:
+    """Returns the extract DataFrame built the previous way, from merged row dicts."""
+    api_data = json.loads(raw)
+    item_rows = []
+    all_keys = set()
+    for event in api_data["events"]:
+        for event_item in event["items"]:
+            current_url = re.sub(r'^(https:)?//', '', event_item["url"])
+            event_item["url"] = "https://" + current_url
+            event_item = event_item | details[event_item["url"]]
+            item_rows.append(event_item)
+            all_keys.update(event_item.keys())
+    all_keys.add("addl_count")
+    for row in item_rows:
+        if not row.get("addl_count"):
+            row["addl_count"] = None
+    keys = sorted(all_keys)
+    return pd.DataFrame(item_rows)[keys]
+
+
+def record_path(raw: bytes, details: dict) -> pd.DataFrame:
+    """Returns the extract DataFrame built from SaleItem records and column lists."""
+    api_data = decode_salesfeed(raw)
+    items = [item for event in api_data["events"] for item in event["items"]]
+    for item in items:
+        item.url = "https://" + re.sub(r'^(https:)?//', '', item.url)
+        item_details = details[item.url]
+        item.release_date = item_details["release_date"]
+        item.genres = item_details["genres"]
+    return pd.DataFrame(items_to_columns(items))
+
+
+def measure(func, raw: bytes, details: dict) -> tuple[float, float, pd.DataFrame]:
+    """Returns wall seconds, peak traced MB and the result of func."""
+    gc.collect()
+    started_at = time.perf_counter()
+    result = func(raw, details)
+    elapsed = time.perf_counter() - started_at
+
+    gc.collect()
+    tracemalloc.start()
+    func(raw, details)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 1024 / 1024, result
+
+
+def run_benchmark(events: int = DEFAULT_EVENTS) -> None:
+    """Prints wall time and peak memory for both decoding paths."""
+    raw, details = build_feed(events)
+    print(f"Synthetic feed: {events:,} events, {len(raw) / 1024 / 1024:.1f} MB of JSON")
+    print(f"{'path':<10}{'wall s':>10}{'peak MB':>10}")
+    results = {}
+    for name, func in (("dicts", dict_path), ("records", record_path)):
+        elapsed, peak, results[name] = measure(func, raw, details)
+        print(f"{name:<10}{elapsed:>10.3f}{peak:>10.1f}")
+    pd.testing.assert_frame_equal(results["dicts"], results["records"])
+
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_EVENTS)
@@ -0,0 +1,93 @@
+"""Benchmark comparing the pandas and record-based staging paths on small batches.
+
+Builds synthetic SaleItems and times turning them into the stage_sale and
+stage_tag CSV with items_to_dataframe, clean_dataframe and build_frames
+against staging.build_stage_csv, checking that both write identical bytes
+first. The crossover shows where SMALL_BATCH_ROWS should sit.
+
+Run from the pipeline directory:
+    python benchmarks/bench_small_batch.py [rows ...]
+"""
+
+import gc
+import io
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable=wrong-import-position
+from extract import items_to_dataframe
+from load import build_frames, SALE_COLS
+from salesfeed import SaleItem
+from staging import build_stage_csv
+from transform import clean_dataframe
+
+DEFAULT_ROWS = (10, 100, 500, 1000, 5000, 20000)
+REPEATS = 5
+ITEM_KINDS = (("t", "t"), ("a", "a"), ("a", "p"), ("p", "p"))
+
+
+def build_items(rows: int) -> list[SaleItem]:
+    """Returns synthetic SaleItems shaped like a salesfeed window."""
+    rng = np.random.default_rng(42)
+    items = []
+    for i in range(rows):
+        slug_type, item_type = ITEM_KINDS[rng.integers(0, len(ITEM_KINDS))]
+        items.append(SaleItem.from_mapping({
+            "utc_date": float(1749583860 + rng.uniform(0, 600)),
+            "artist_name": f"Artist {rng.integers(0, 500)}",
+            "item_type": item_type, "slug_type": slug_type,
+            "item_description": f"Release {i}", "album_title": f"Album {i}",
+            "amount_paid_usd": round(float(rng.uniform(1, 50)), 2),
+            "country": "Japan", "url": f"//artist{i}.bandcamp.com/album/release",
+            "art_url": "https://f4.bcbits.com/img/a3672109546_7.jpg",
+            "release_date": f"released October {i % 28 + 1}, 2024",
+            "genres": ["jazz", "ambient"],
+        }))
+    return items
+
+
+def pandas_path(items: list[SaleItem]) -> tuple[str, str]:
+    """Returns the staging CSV written through the DataFrame stages."""
+    sales, tags = build_frames(clean_dataframe(items_to_dataframe(items)))
+    sales_buf, tags_buf = io.StringIO(), io.StringIO()
+    sales.to_csv(sales_buf, index=False, header=False, columns=SALE_COLS)
+    tags.to_csv(tags_buf, index=False, header=False, columns=["url", "tag_name"])
+    return sales_buf.getvalue(), tags_buf.getvalue()
+
+
+def record_path(items: list[SaleItem]) -> tuple[str, str]:
+    """Returns the staging CSV written from the records."""
+    sales_csv, tags_csv, _ = build_stage_csv(items)
+    return sales_csv, tags_csv
+
+
+def time_path(func, items: list[SaleItem]) -> tuple[float, tuple]:
+    """Returns the best wall seconds of REPEATS runs and the result of func."""
+    best = float("inf")
+    for _ in range(REPEATS):
+        gc.collect()
+        started_at = time.perf_counter()
+        result = func(items)
+        best = min(best, time.perf_counter() - started_at)
+    return best, result
+
+
+def run_benchmark(row_counts: tuple[int, ...] = DEFAULT_ROWS) -> None:
+    """Prints wall time for both paths and the speed-up at each batch size."""
+    print(f"{'rows':>10}{'pandas ms':>12}{'records ms':>12}{'speed-up':>10}")
+    for rows in row_counts:
+        items = build_items(rows)
+        pandas_seconds, expected = time_path(pandas_path, items)
+        record_seconds, actual = time_path(record_path, items)
+        assert expected == actual
+        print(f"{rows:>10,}{pandas_seconds * 1000:>12.2f}{record_seconds * 1000:>12.2f}"
+              f"{pandas_seconds / record_seconds:>9.1f}x")
+
+
+if __name__ == "__main__":
+    run_benchmark(tuple(int(rows) for rows in sys.argv[1:]) or DEFAULT_ROWS)
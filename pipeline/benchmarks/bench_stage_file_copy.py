@@ -0,0 +1,91 @@
+"""Benchmark comparing the pandas round trip with streaming staging CSV files into COPY.
+
+Writes a cleaned CSV and the matching staging CSV files for synthetic sales,
+then times loading each into COPY: the cleaned file through load_data,
+build_frames and copy_df, and the staging files through copy_csv_file. COPY
+goes to a cursor that reads the data in 8 kB blocks like psycopg2 and discards
+it, so no database is needed.
+
+Run from the pipeline directory:
+    python benchmarks/bench_stage_file_copy.py [rows ...]
+"""
+
+import gc
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable=wrong-import-position
+from bench_transform_memory import build_extract_frame
+from load import (build_frames, copy_df, copy_csv_file, get_stage_tag_path,
+                  SALE_COLS, TAG_COLS)
+from staging import export_stage_files
+from transform import clean_dataframe
+from utilities import load_data, save_parquet_data
+
+DEFAULT_ROWS = (10000, 100000, 1000000)
+COPY_BLOCK_SIZE = 8192
+
+
+class DiscardingCursor:
+    """Stands in for a database cursor, reading each COPY payload and dropping it."""
+
+    rowcount = -1
+
+    def copy_expert(self, _sql: str, buf) -> None:
+        """Reads the COPY buffer in blocks like psycopg2 does."""
+        while buf.read(COPY_BLOCK_SIZE):
+            pass
+
+    def execute(self, _sql: str) -> None:
+        """Accepts and ignores a statement."""
+
+
+def pandas_load(clean_path: str) -> None:
+    """Copies the cleaned file the run_load way, through pandas."""
+    cur = DiscardingCursor()
+    sales, tags = build_frames(load_data(clean_path))
+    copy_df(cur, sales, "stage_sale", SALE_COLS)
+    copy_df(cur, tags, "stage_tag", TAG_COLS)
+
+
+def file_load(sales_path: str) -> None:
+    """Copies the staging files straight from disk."""
+    cur = DiscardingCursor()
+    copy_csv_file(cur, sales_path, "stage_sale", SALE_COLS)
+    copy_csv_file(cur, get_stage_tag_path(sales_path), "stage_tag", TAG_COLS)
+
+
+def time_load(func, path: str) -> float:
+    """Returns wall seconds for one load."""
+    gc.collect()
+    started_at = time.perf_counter()
+    func(path)
+    return time.perf_counter() - started_at
+
+
+def run_benchmark(row_counts: tuple[int, ...] = DEFAULT_ROWS) -> None:
+    """Prints wall time and throughput of both loads for each file size."""
+    print(f"{'rows':>10}{'MB':>8}{'pandas s':>10}{'stream s':>10}{'stream MB/s':>13}{'speed-up':>10}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for rows in row_counts:
+            extract_path = os.path.join(tmp_dir, "output.parquet")
+            clean_path = os.path.join(tmp_dir, "clean_sales.csv")
+            sales_path = os.path.join(tmp_dir, "stage_sale.csv")
+            extract_df = build_extract_frame(rows)
+            save_parquet_data(extract_df, extract_path)
+            clean_dataframe(extract_df).to_csv(clean_path, index=False)
+            export_stage_files(extract_path, sales_path)
+            megabytes = (os.path.getsize(sales_path)
+                         + os.path.getsize(get_stage_tag_path(sales_path))) / 1024 / 1024
+            pandas_seconds = time_load(pandas_load, clean_path)
+            stream_seconds = time_load(file_load, sales_path)
+            print(f"{rows:>10,}{megabytes:>8.1f}{pandas_seconds:>10.3f}{stream_seconds:>10.3f}"
+                  f"{megabytes / stream_seconds:>13.1f}{pandas_seconds / stream_seconds:>9.1f}x")
+
+
+if __name__ == "__main__":
+    run_benchmark(tuple(int(rows) for rows in sys.argv[1:]) or DEFAULT_ROWS)
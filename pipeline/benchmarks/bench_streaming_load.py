@@ -0,0 +1,83 @@
+"""Benchmark comparing whole-file and chunked loading of extract files.
+
+Writes synthetic extract parquet files, then in a fresh process per run
+reads each one, builds the staging frames and serialises them for COPY,
+either all at once or CHUNK rows at a time. The COPY goes to a cursor that
+reads and discards the data, so no database is needed. Peak resident set
+size should grow with the file for whole-file loads and stay flat when chunked.
+
+Run from the pipeline directory:
+    python benchmarks/bench_streaming_load.py [rows ...]
+"""
+
+import gc
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable=wrong-import-position
+from bench_transform_memory import build_extract_frame, read_memory_kb
+from load import copy_df, SALE_COLS
+from staging import build_stage_frames
+from utilities import load_data, iter_data_chunks, save_parquet_data
+
+DEFAULT_ROWS = (100000, 500000, 1000000)
+CHUNK = 50000
+
+
+class DiscardingCursor:
+    """Stands in for a database cursor, reading each COPY payload and dropping it."""
+
+    def copy_expert(self, _sql: str, buf) -> None:
+        """Reads the whole COPY buffer like the server would."""
+        buf.read()
+
+
+def stage_frames(cur: DiscardingCursor, frames) -> int:
+    """Returns the number of sales copied after copying each (sales, tags) pair."""
+    row_count = 0
+    for sales, tags in frames:
+        copy_df(cur, sales, "stage_sale", SALE_COLS)
+        copy_df(cur, tags, "stage_tag", ["url", "tag_name"])
+        row_count += len(sales)
+    return row_count
+
+
+def measure_load(file_path: str, chunked: bool) -> tuple[float, float, int]:
+    """Returns the peak RSS in MB, wall seconds and rows for one load.
+    Runs in a child process."""
+    gc.collect()
+    with open("/proc/self/clear_refs", "w", encoding="utf-8") as clear_refs:
+        clear_refs.write("5")
+    started_at = time.perf_counter()
+    if chunked:
+        frames = (build_stage_frames(chunk) for chunk in iter_data_chunks(file_path, CHUNK))
+    else:
+        frames = [build_stage_frames(load_data(file_path))]
+    row_count = stage_frames(DiscardingCursor(), frames)
+    elapsed = time.perf_counter() - started_at
+    return read_memory_kb("VmHWM") / 1024, elapsed, row_count
+
+
+def run_benchmark(row_counts: tuple[int, ...] = DEFAULT_ROWS) -> None:
+    """Prints peak memory, time and throughput of both loads for each file size."""
+    context = multiprocessing.get_context("spawn")
+    print(f"{'rows':>10}{'mode':>9}{'peak MB':>10}{'wall s':>9}{'rows/s':>11}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for rows in row_counts:
+            file_path = os.path.join(tmp_dir, f"output_{rows}.parquet")
+            save_parquet_data(build_extract_frame(rows), file_path)
+            for chunked in (False, True):
+                with context.Pool(1) as pool:
+                    peak, elapsed, loaded = pool.apply(measure_load, (file_path, chunked))
+                assert loaded == rows
+                print(f"{rows:>10,}{'chunked' if chunked else 'whole':>9}"
+                      f"{peak:>10.1f}{elapsed:>9.2f}{loaded / elapsed:>11,.0f}")
+
+
+if __name__ == "__main__":
+    run_benchmark(tuple(int(rows) for rows in sys.argv[1:]) or DEFAULT_ROWS)
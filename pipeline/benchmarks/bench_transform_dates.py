@@ -0,0 +1,80 @@
+"""Benchmark comparing row-wise and vectorised date standardisation in transform.
+
+Builds synthetic utc_date and release_date columns and times the previous
+per-row .apply path against the vectorised series functions, checking that
+both give identical results first.
+
+Run from the pipeline directory:
+    python benchmarks/bench_transform_dates.py [rows ...]
+"""
+
+import gc
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable=wrong-import-position
+from transform import (standardize_dates, standardize_release_date,
+                       standardize_date_series, standardize_release_date_series)
+
+DEFAULT_ROWS = (1000, 100000, 1000000)
+DISTINCT_RELEASES = 5000
+MONTHS = ("January", "February", "March", "April", "May", "June", "July",
+          "August", "September", "October", "November", "December")
+
+
+def build_columns(rows: int) -> tuple[pd.Series, pd.Series]:
+    """Returns synthetic utc_date and release_date columns of the given length.
+    Release dates repeat like real sales of the same items do, and some are missing."""
+    rng = np.random.default_rng(42)
+    utc_dates = pd.Series(1749583860 + rng.uniform(0, 86400 * 30, rows))
+    releases = [f"released {MONTHS[i % 12]} {i % 28 + 1}, {2000 + i % 25}"
+                for i in range(DISTINCT_RELEASES)]
+    release_dates = pd.Series(np.array(releases, dtype=object)[
+        rng.integers(0, DISTINCT_RELEASES, rows)])
+    release_dates[rng.random(rows) < 0.05] = None
+    return utc_dates, release_dates
+
+
+def apply_path(utc_dates: pd.Series, release_dates: pd.Series) -> tuple[pd.Series, pd.Series]:
+    """Returns both columns standardised the previous way, one row at a time."""
+    return (utc_dates.apply(standardize_dates),
+            release_dates.apply(
+                lambda x: standardize_release_date(x) if isinstance(x, str) else x))
+
+
+def vectorised_path(utc_dates: pd.Series,
+                    release_dates: pd.Series) -> tuple[pd.Series, pd.Series]:
+    """Returns both columns standardised with the vectorised series functions."""
+    return (standardize_date_series(utc_dates),
+            standardize_release_date_series(release_dates))
+
+
+def time_path(func, utc_dates: pd.Series, release_dates: pd.Series) -> tuple[float, tuple]:
+    """Returns wall seconds and the result of func."""
+    gc.collect()
+    started_at = time.perf_counter()
+    result = func(utc_dates, release_dates)
+    return time.perf_counter() - started_at, result
+
+
+def run_benchmark(row_counts: tuple[int, ...] = DEFAULT_ROWS) -> None:
+    """Prints wall time for both paths and the speed-up at each row count."""
+    print(f"{'rows':>10}{'apply s':>12}{'vector s':>12}{'speed-up':>10}")
+    for rows in row_counts:
+        utc_dates, release_dates = build_columns(rows)
+        apply_seconds, expected = time_path(apply_path, utc_dates, release_dates)
+        vector_seconds, actual = time_path(vectorised_path, utc_dates, release_dates)
+        for expected_column, actual_column in zip(expected, actual):
+            pd.testing.assert_series_equal(expected_column, actual_column)
+        print(f"{rows:>10,}{apply_seconds:>12.3f}{vector_seconds:>12.3f}"
+              f"{apply_seconds / vector_seconds:>9.1f}x")
+
+
+if __name__ == "__main__":
+    run_benchmark(tuple(int(rows) for rows in sys.argv[1:]) or DEFAULT_ROWS)
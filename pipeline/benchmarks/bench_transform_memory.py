@@ -0,0 +1,130 @@
+"""Benchmark comparing peak memory of the one-pass clean_dataframe with the
+step-by-step chain it replaced (baseline): rename, select, dropna, album names,
+dates and sort, each producing a new frame.
+
+Each mode runs in a fresh process on a synthetic extract frame. The peak
+resident set size is reset once the input is built (Linux, glibc), so the extra
+peak reported is the cleaning alone. The size of the cleaned frame and the
+wall time are printed too.
+
+Run from the pipeline directory:
+    python benchmarks/bench_transform_memory.py [rows ...]
+"""
+
+import ctypes
+import gc
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable=wrong-import-position
+from transform import (clean_dataframe, rename_columns, get_required_columns,
+                       handle_missing_values, correct_album_name, standardize_date_series,
+                       standardize_release_date_series, sort_by_date)
+
+DEFAULT_ROWS = (100000, 1000000)
+MODES = ("baseline", "one-pass")
+COUNTRIES = ("Japan", "Germany", "United Kingdom", "United States", "France", "Brazil")
+
+
+def build_extract_frame(rows: int, ordered: bool = False) -> pd.DataFrame:
+    """Returns a synthetic frame shaped like run_extract's output.
+    Set ordered for sales already in utc_date order, as the salesfeed sends them."""
+    rng = np.random.default_rng(42)
+    kinds = rng.choice(["a", "t", "p"], rows)
+    utc_dates = 1749583860 + rng.uniform(0, 86400 * 30, rows)
+    return pd.DataFrame({
+        "utc_date": np.sort(utc_dates) if ordered else utc_dates,
+        "item_type": kinds,
+        "album_title": [None] * rows,
+        "artist_name": [f"Artist {i}" for i in rng.integers(0, 20000, rows)],
+        "item_description": [f"Release {i}" for i in range(rows)],
+        "genres": [["jazz", "ambient"]] * rows,
+        "amount_paid_usd": rng.uniform(1, 50, rows).round(2),
+        "release_date": [f"released October {i % 28 + 1}, 2024" for i in range(rows)],
+        "country": rng.choice(COUNTRIES, rows),
+        "slug_type": kinds,
+        "url": [f"https://artist{i}.bandcamp.com/album/release" for i in range(rows)],
+        "art_url": "https://f4.bcbits.com/img/a3672109546_7.jpg",
+    })
+
+
+def clean_dataframe_baseline(df: pd.DataFrame) -> pd.DataFrame:
+    """Returns the frame cleaned by the separate rename, select, dropna, album name,
+    date and sort steps clean_dataframe chained before it cleaned in one pass."""
+    df = rename_columns(df)
+    df = get_required_columns(df)
+    df = handle_missing_values(df)
+    df = correct_album_name(df)
+    df["utc_date"] = standardize_date_series(df["utc_date"])
+    df["release_date"] = standardize_release_date_series(df["release_date"])
+    return sort_by_date(df)
+
+
+def clean_with_mode(df: pd.DataFrame, mode: str) -> pd.DataFrame:
+    """Returns the frame cleaned by the named mode."""
+    if mode == "baseline":
+        return clean_dataframe_baseline(df)
+    return clean_dataframe(df)
+
+
+def read_memory_kb(field: str) -> int:
+    """Returns a memory figure in kB (VmRSS or VmHWM) for this process."""
+    with open("/proc/self/status", encoding="utf-8") as status_file:
+        for line in status_file:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    raise KeyError(field)
+
+
+def measure_mode(rows: int, ordered: bool, mode: str) -> tuple[float, float, float]:
+    """Returns the extra peak RSS in MB, cleaned frame MB and wall seconds for one mode.
+    Runs in a child process."""
+    df = build_extract_frame(rows, ordered)
+    gc.collect()
+    # Hand memory freed while building the input back to the OS, so the
+    # cleaning's allocations show up in RSS instead of reusing it.
+    ctypes.CDLL("libc.so.6").malloc_trim(0)
+    pa.default_memory_pool().release_unused()
+    with open("/proc/self/clear_refs", "w", encoding="utf-8") as clear_refs:
+        clear_refs.write("5")
+    baseline = read_memory_kb("VmRSS")
+    started_at = time.perf_counter()
+    clean_df = clean_with_mode(df, mode)
+    elapsed = time.perf_counter() - started_at
+    peak = read_memory_kb("VmHWM")
+    frame_bytes = clean_df.memory_usage(deep=True).sum()
+    return (peak - baseline) / 1024, frame_bytes / 1024 / 1024, elapsed
+
+
+def check_same_output(rows: int = 10000) -> None:
+    """Raises AssertionError unless both modes give the same rows and values."""
+    for ordered in (False, True):
+        pd.testing.assert_frame_equal(
+            clean_dataframe(build_extract_frame(rows, ordered)),
+            clean_dataframe_baseline(build_extract_frame(rows, ordered)))
+
+
+def run_benchmark(row_counts: tuple[int, ...] = DEFAULT_ROWS) -> None:
+    """Prints extra peak memory, output size and time for both modes."""
+    check_same_output()
+    context = multiprocessing.get_context("spawn")
+    print(f"{'rows':>10}{'input':>10}{'mode':>10}{'peak +MB':>11}{'frame MB':>11}{'wall s':>9}")
+    for rows in row_counts:
+        for ordered in (False, True):
+            for mode in MODES:
+                with context.Pool(1) as pool:
+                    peak, frame, elapsed = pool.apply(measure_mode, (rows, ordered, mode))
+                print(f"{rows:>10,}{'ordered' if ordered else 'shuffled':>10}{mode:>10}"
+                      f"{peak:>11.1f}{frame:>11.1f}{elapsed:>9.3f}")
+
+
+if __name__ == "__main__":
+    run_benchmark(tuple(int(rows) for rows in sys.argv[1:]) or DEFAULT_ROWS)
@@ -0,0 +1,84 @@
+"""Micro-benchmark comparing the structured-data, streaming and BeautifulSoup scraping paths.
+
+Run from the pipeline directory:
+    python benchmarks/bench_web_scraper.py
+"""
+
+import logging
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable=wrong-import-position
+from web_scraper import (get_release_date_and_genres_from_structured_data,
+                         parse_relevant_html, get_release_date, get_genres,
+                         parse_page_stream, STREAM_CHUNK_SIZE)
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+FIXTURE_PAGES = ["album_page.html", "track_page.html"]
+REPEATS = 50
+STRUCTURED_DATA_PATTERN = re.compile(
+    rb'<script type="application/ld\+json">.*?</script>|data-tralbum="[^"]*"', re.S)
+
+
+def soup_path(content: bytes, logger) -> dict:
+    """Returns the release date and genres using the full-DOM BeautifulSoup path."""
+    results = parse_relevant_html(content, logger)
+    return {"release_date": get_release_date(results, logger),
+            "genres": get_genres(results, logger)}
+
+
+def page_chunks(content: bytes):
+    """Yields the page in the chunk size used when streaming from the network."""
+    for start in range(0, len(content), STREAM_CHUNK_SIZE):
+        yield content[start:start + STREAM_CHUNK_SIZE]
+
+
+def stream_path(content: bytes, logger) -> dict:
+    """Returns the release date and genres by streaming the page in network-sized chunks."""
+    return parse_page_stream(page_chunks(content), logger)[0]
+
+
+def streamed_bytes(content: bytes, logger) -> int:
+    """Returns the number of page bytes the streaming path reads before stopping."""
+    return parse_page_stream(page_chunks(content), logger)[1]
+
+
+def time_per_page(func, content: bytes, logger) -> float:
+    """Returns the best average time in milliseconds for one call of func on content."""
+    timings = timeit.repeat(lambda: func(content, logger), number=REPEATS, repeat=3)
+    return min(timings) / REPEATS * 1000
+
+
+def run_benchmark() -> None:
+    """Prints per-page parse time for each scraping path over every fixture page,
+    with and without the page's structured data."""
+    logger = logging.getLogger("bench")
+    logger.setLevel(logging.CRITICAL)
+    print(f"{'page':<26}{'size KB':>9}{'soup ms':>10}{'fast ms':>10}"
+          f"{'stream ms':>11}{'stream KB':>11}")
+    for page in FIXTURE_PAGES:
+        with open(os.path.join(FIXTURE_DIR, page), "rb") as fixture:
+            original = fixture.read()
+        variants = [(page, original),
+                    (page + " (no LD)", STRUCTURED_DATA_PATTERN.sub(b"", original))]
+        for name, content in variants:
+            expected = soup_path(content, logger)
+            if stream_path(content, logger) != expected:
+                raise AssertionError(f"Streaming path disagrees on {name}")
+            fast = get_release_date_and_genres_from_structured_data(content, logger)
+            if fast not in (None, expected):
+                raise AssertionError(f"Structured-data path disagrees on {name}")
+            soup_ms = time_per_page(soup_path, content, logger)
+            fast_ms = (time_per_page(get_release_date_and_genres_from_structured_data,
+                                     content, logger) if fast else float("nan"))
+            stream_ms = time_per_page(stream_path, content, logger)
+            print(f"{name:<26}{len(content) / 1024:>9.1f}{soup_ms:>10.3f}{fast_ms:>10.3f}"
+                  f"{stream_ms:>11.3f}{streamed_bytes(content, logger) / 1024:>11.1f}")
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,188 @@
+"""Script for streaming DataFrames to PostgreSQL in the binary COPY format.
+Columns are encoded straight from their typed arrays, and the rows are joined
+and handed to the server a chunk at a time, so the payload never exists as text."""
+
+import os
+import struct
+from collections.abc import Iterator
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from pandas.api.types import (is_bool_dtype, is_datetime64_any_dtype,
+                              is_integer_dtype, is_numeric_dtype)
+
+COPY_SIGNATURE = b"PGCOPY\n\xff\r\n\x00" + struct.pack("!ii", 0, 0)
+COPY_TRAILER = struct.pack("!h", -1)
+POSTGRES_EPOCH_DAYS = 10957
+POSTGRES_EPOCH_US = POSTGRES_EPOCH_DAYS * 86400 * 1_000_000
+NUMERIC_POSITIVE, NUMERIC_NEGATIVE = 0x0000, 0x4000
+BINARY_COPY_ROWS = int(os.getenv("BINARY_COPY_ROWS", "50000"))
+
+
+class CopyStream:
+    """File-like object handing COPY data to psycopg2 one chunk at a time,
+    so only the chunk being sent is held in memory."""
+
+    def __init__(self, chunks: Iterator[bytes]):
+        self._chunks = chunks
+        self._view = memoryview(b"")
+        self._pos = 0
+
+    def read(self, size: int = -1) -> bytes:
+        """Returns up to size bytes of COPY data (all that's left if size is negative),
+        or b"" once everything has been read."""
+        if size < 0:
+            rest = b"".join([self._view[self._pos:], *self._chunks])
+            self._view, self._pos = memoryview(b""), 0
+            return rest
+        while self._pos >= len(self._view):
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return b""
+            self._view, self._pos = memoryview(chunk), 0
+        data = self._view[self._pos:self._pos + size]
+        self._pos += len(data)
+        return bytes(data)
+
+
+def encode_numeric(value: int | float) -> bytes:
+    """Returns a number in PostgreSQL's binary NUMERIC format, with the digits and
+    scale its text would give (so 8.0 keeps one decimal place, like the CSV path)."""
+    number = Decimal(repr(value)) if isinstance(value, float) else Decimal(int(value))
+    sign, digits, exponent = number.as_tuple()
+    coefficient = int("".join(map(str, digits)))
+    dscale = max(0, -exponent)
+    fraction_groups = -(-dscale // 4)
+    scaled = coefficient * 10 ** (exponent + 4 * fraction_groups)
+
+    groups = []
+    while scaled:
+        scaled, group = divmod(scaled, 10000)
+        groups.append(group)
+    groups.reverse()
+    weight = len(groups) - 1 - fraction_groups
+    while groups and groups[-1] == 0:
+        groups.pop()
+    if not groups:
+        weight, sign = 0, 0
+    return struct.pack(f"!hhhh{len(groups)}h", len(groups), weight,
+                       NUMERIC_NEGATIVE if sign else NUMERIC_POSITIVE, dscale, *groups)
+
+
+def get_length_prefixes(lengths: np.ndarray) -> pa.Array:
+    """Returns the 4-byte field length prefixes for the lengths (-1 for NULL)."""
+    prefixes = np.ascontiguousarray(lengths, dtype=">i4")
+    return pc.cast(pa.FixedSizeBinaryArray.from_buffers(
+        pa.binary(4), len(prefixes), [None, pa.py_buffer(prefixes)]), pa.binary())
+
+
+def encode_fixed_width(values: np.ndarray, valid: np.ndarray) -> tuple[pa.Array, pa.Array]:
+    """Returns the length prefixes and field data for big-endian fixed-width values."""
+    width = values.dtype.itemsize
+    validity = pa.array(valid).buffers()[1]
+    data = pa.FixedSizeBinaryArray.from_buffers(
+        pa.binary(width), len(values),
+        [validity, pa.py_buffer(np.ascontiguousarray(values))])
+    return get_length_prefixes(np.where(valid, width, -1)), pc.cast(data, pa.binary())
+
+
+def encode_text(values: pd.Series) -> tuple[pa.Array, pa.Array]:
+    """Returns the length prefixes and UTF-8 field data for a text column.
+    Empty strings are sent as NULL, as the CSV path loads them.
+    Raises a TypeError for columns holding anything but strings."""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        array = pa.array(values).dictionary_decode()
+        if not pa.types.is_string(array.type) and not pa.types.is_large_string(array.type):
+            raise TypeError(f"Column {values.name} is not text.")
+        array = array.cast(pa.string())
+    else:
+        array = pa.array(values, type=pa.string(), from_pandas=True)
+    lengths = pc.fill_null(pc.binary_length(array), 0).to_numpy()
+    return get_length_prefixes(np.where(lengths == 0, -1, lengths)), array.cast(pa.binary())
+
+
+def encode_timestamp(values: pd.Series) -> tuple[pa.Array, pa.Array]:
+    """Returns the length prefixes and field data for a TIMESTAMP column.
+    Timezone-aware values keep their wall time, as the CSV path's offset is ignored."""
+    if not is_datetime64_any_dtype(values):
+        raise TypeError(f"Column {values.name} is not datetimes.")
+    if values.dt.tz is not None:
+        values = values.dt.tz_localize(None)
+    dates = values.to_numpy()
+    valid = ~np.isnat(dates)
+    if np.datetime_data(dates.dtype)[0] == "ns":
+        microseconds = (dates.astype(np.int64) + 500) // 1000
+    else:
+        microseconds = dates.astype("datetime64[us]").astype(np.int64)
+    return encode_fixed_width((microseconds - POSTGRES_EPOCH_US).astype(">i8"), valid)
+
+
+def encode_date(values: pd.Series) -> tuple[pa.Array, pa.Array]:
+    """Returns the length prefixes and field data for a DATE column."""
+    if values.isna().all():
+        return encode_fixed_width(np.zeros(len(values), dtype=">i4"),
+                                  np.zeros(len(values), dtype=bool))
+    if not is_datetime64_any_dtype(values):
+        raise TypeError(f"Column {values.name} is not datetimes.")
+    dates = values.to_numpy()
+    days = dates.astype("datetime64[D]").astype(np.int64) - POSTGRES_EPOCH_DAYS
+    return encode_fixed_width(days.astype(">i4"), ~np.isnat(dates))
+
+
+def encode_numeric_column(values: pd.Series) -> tuple[pa.Array, pa.Array]:
+    """Returns the length prefixes and field data for a NUMERIC column.
+    Each distinct value is encoded once. Raises a ValueError for infinities."""
+    valid = values.notna().to_numpy()
+    if valid.any() and (not is_numeric_dtype(values) or is_bool_dtype(values)):
+        raise TypeError(f"Column {values.name} is not numeric.")
+    numbers = values[valid].to_numpy(dtype=np.int64 if is_integer_dtype(values) else np.float64)
+    if np.isinf(numbers).any():
+        raise ValueError(f"Column {values.name} holds infinite values.")
+
+    uniques, inverse = np.unique(numbers, return_inverse=True)
+    encoded = [encode_numeric(number) for number in uniques.tolist()]
+    indices = np.zeros(len(values), dtype=np.int64)
+    indices[valid] = inverse
+    lengths = np.full(len(values), -1, dtype=np.int64)
+    lengths[valid] = np.array([len(number) for number in encoded], dtype=np.int64)[inverse]
+    data = pa.array(encoded, pa.binary()).take(pa.array(indices, mask=~valid))
+    return get_length_prefixes(lengths), data
+
+
+COLUMN_ENCODERS = {
+    "text": encode_text,
+    "timestamp": encode_timestamp,
+    "date": encode_date,
+    "numeric": encode_numeric_column,
+}
+
+
+def encode_columns(df: pd.DataFrame, cols: list[str],
+                   column_types: dict[str, str]) -> list[pa.Array]:
+    """Returns the length prefix and data arrays of each column, in order.
+    Columns not in column_types are text. Raises a TypeError, ValueError or
+    ArrowException if a column can't be encoded as its type."""
+    parts = []
+    for col in cols:
+        parts.extend(COLUMN_ENCODERS[column_types.get(col, "text")](df[col]))
+    return parts
+
+
+def iter_copy_chunks(parts: list[pa.Array], row_count: int,
+                     chunk_rows: int = BINARY_COPY_ROWS) -> Iterator[bytes]:
+    """Yields the binary COPY data for the encoded columns: the header, the tuples
+    chunk_rows at a time, and the trailer."""
+    yield COPY_SIGNATURE
+    field_count = pa.scalar(struct.pack("!h", len(parts) // 2), pa.binary())
+    for start in range(0, row_count, chunk_rows):
+        rows = pc.binary_join_element_wise(
+            field_count, *(part.slice(start, chunk_rows) for part in parts), b"",
+            null_handling="replace", null_replacement=b"")
+        _, offsets, data = rows.buffers()
+        bounds = np.frombuffer(offsets, dtype=np.int32, count=len(rows) + 1,
+                               offset=rows.offset * 4)
+        yield data[bounds[0]:bounds[-1]].to_pybytes()
+    yield COPY_TRAILER
@@ -4,6 +4,7 @@ import pytest
 import pandas as pd
 import os
 from unittest.mock import patch
+import rate_limiter
 
 
 @pytest.fixture
@@ -151,3 +152,16 @@ def setup_test_env():
 
     with patch.dict(os.environ, test_env):
         yield
+
+
+@pytest.fixture(autouse=True)
+def isolated_scrape_cache(tmp_path, monkeypatch):
+    """Points the scrape cache at a temporary file so tests never share cached pages."""
+    monkeypatch.setenv("SCRAPE_CACHE_PATH", str(tmp_path / "scrape_cache.sqlite3"))
+
+
+@pytest.fixture(autouse=True)
+def unthrottled_rate_limiter(monkeypatch):
+    """Replaces the shared scrape rate limiter with one fast enough not to slow tests down."""
+    monkeypatch.setattr(rate_limiter, "_RATE_LIMITER",
+                        rate_limiter.AdaptiveRateLimiter(rate=10000, concurrency=32))
@@ -0,0 +1,64 @@
+-- Adds the sale event key to a database created before it existed, removes the
+-- duplicate sales already loaded and adds the unique index that keeps them out,
+-- plus the utc_date index recent events are read back with.
+-- Safe to run more than once.
+
+BEGIN;
+
+CREATE OR REPLACE FUNCTION sale_event_key(utc_date TIMESTAMP, country_id BIGINT, url TEXT, sold_for NUMERIC)
+RETURNS UUID
+LANGUAGE SQL IMMUTABLE
+AS $$
+    SELECT md5(concat_ws('|',
+        to_char(utc_date, 'YYYY-MM-DD HH24:MI:SS.US'),
+        country_id,
+        COALESCE(url, ''),
+        COALESCE(trim_scale(sold_for)::TEXT, '')))::UUID
+$$;
+
+ALTER TABLE sale ADD COLUMN IF NOT EXISTS event_key UUID;
+
+-- Key each sale from the item it was linked to (the lowest url if it has several).
+WITH sale_items AS (
+    SELECT DISTINCT ON (sale_id) sale_id, url, sold_for
+    FROM (
+        SELECT sale_id, url, sold_for
+        FROM sale_track_assignment JOIN track USING (track_id)
+        UNION ALL
+        SELECT sale_id, url, sold_for
+        FROM sale_album_assignment JOIN album USING (album_id)
+        UNION ALL
+        SELECT sale_id, url, sold_for
+        FROM sale_merchandise_assignment JOIN merchandise USING (merchandise_id)
+    ) items
+    ORDER BY sale_id, url, sold_for
+)
+UPDATE sale
+SET event_key = sale_event_key(sale.utc_date, sale.country_id, sale_items.url, sale_items.sold_for)
+FROM sale_items
+WHERE sale_items.sale_id = sale.sale_id
+AND sale.event_key IS NULL;
+
+UPDATE sale
+SET event_key = sale_event_key(utc_date, country_id, NULL, NULL)
+WHERE event_key IS NULL;
+
+-- Keep the first sale loaded for each event key.
+CREATE TEMP TABLE duplicate_sales ON COMMIT DROP AS
+SELECT sale_id
+FROM (
+    SELECT sale_id, ROW_NUMBER() OVER (PARTITION BY event_key ORDER BY sale_id) AS copy_number
+    FROM sale
+) numbered
+WHERE copy_number > 1;
+
+DELETE FROM sale_track_assignment WHERE sale_id IN (SELECT sale_id FROM duplicate_sales);
+DELETE FROM sale_album_assignment WHERE sale_id IN (SELECT sale_id FROM duplicate_sales);
+DELETE FROM sale_merchandise_assignment WHERE sale_id IN (SELECT sale_id FROM duplicate_sales);
+DELETE FROM sale WHERE sale_id IN (SELECT sale_id FROM duplicate_sales);
+
+ALTER TABLE sale ALTER COLUMN event_key SET NOT NULL;
+CREATE UNIQUE INDEX IF NOT EXISTS unique_sale_event_key ON sale (event_key);
+CREATE INDEX IF NOT EXISTS sale_utc_date ON sale (utc_date);
+
+COMMIT;
@@ -1,27 +1,33 @@
 """Script that combines all individual parts of the ETL into one."""
 # pylint: disable=broad-except
 
-import pandas as pd
 from dotenv import load_dotenv
 from utilities import get_logger, set_logger
-from extract import run_extract
-from transform import clean_dataframe
-from load import run_load
+from extract import extract_items, items_to_dataframe
+from recent_events import get_recent_events
+from staging import run_load_items, run_load_frame, SMALL_BATCH_ROWS
 
 
 def run_pipeline() -> None:
-    """Runs each stage of the pipeline in succession."""
+    """Runs each stage of the pipeline in succession.
+    Sales already loaded by a recent run are dropped before scraping, and the ones
+    loaded now are remembered once committed.
+    Batches under SMALL_BATCH_ROWS sales skip pandas and go straight to staging rows."""
     set_logger()
     logger = get_logger()
     load_dotenv('.env')
 
     try:
         logger.info("Extracting...")
-        extract_df = run_extract(None)
-        clean_df = clean_dataframe(extract_df)
-
-        logger.info("Loading...")
-        run_load(clean_df)
+        recent_events = get_recent_events()
+        items, high_water_mark = extract_items(recent_events=recent_events)
+        if len(items) < SMALL_BATCH_ROWS:
+            logger.info("Loading %s sales without pandas...", len(items))
+            run_load_items(items, high_water_mark)
+        else:
+            logger.info("Transforming and loading...")
+            run_load_frame(items_to_dataframe(items), high_water_mark)
+        recent_events.add(items)
         logger.info("Success!...")
     except Exception:
         logger.exception("Critical error. Stopping pipeline")
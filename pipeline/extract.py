@@ -1,55 +1,165 @@
-"""Script for the extract part of the ETL."""
+"""Script for the extract part of the ETL.
+pandas and pyarrow are imported by the functions that build frames or files,
+so extracting records for a small batch never imports them."""
+# pylint: disable=import-outside-toplevel
+from __future__ import annotations
 
 import time
 import csv
 import os
 import re
-from datetime import datetime
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, date
+from os import environ as ENV
+from typing import TYPE_CHECKING
 
 
 import requests
-import pandas as pd
+import psycopg2
 
-from utilities import get_logger, set_logger
+from utilities import get_logger, set_logger, PARQUET_COMPRESSION
 from web_scraper import get_release_date_and_genres
+from http_client import get_session, log_connection_stats
+from scrape_cache import ScrapeCache
+from recent_events import RecentEvents
+from rate_limiter import AdaptiveRateLimiter, get_rate_limiter
+from salesfeed import (SaleItem, salesfeed_pairs_hook, items_to_columns,
+                       columns_to_rows, SALE_ITEM_FIELDS, get_columns_schema)
+from record_transform import COLUMN_RENAMES, REQUIRED_COLUMNS
+from load import get_db_connection, WATERMARK_NAME
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 BANDCAMP_API_URL = "https://bandcamp.com/api/salesfeed/1/get?start_date="
+MAX_SCRAPE_WORKERS = int(os.getenv("SCRAPE_MAX_WORKERS", "8"))
+TIMEOUT_BUDGET = float(os.getenv("SCRAPE_TIMEOUT_BUDGET", "0.25"))
+MIN_TIMEOUT_LIMIT = 2
+TIME_OFFSET = 200
+MAX_CATCHUP_WINDOWS = 10
+
+ENRICHED_ITEMS_SQL = """
+SELECT item.url, item.release_date,
+       ARRAY_REMOVE(ARRAY_AGG(tg.tag_name ORDER BY tg.tag_name), NULL) AS genres
+FROM (
+    SELECT al.url, al.release_date, ata.tag_id, FALSE AS is_merch
+    FROM album al
+    LEFT JOIN album_tag_assignment ata USING (album_id)
+    WHERE al.url = ANY(%(urls)s)
+    UNION ALL
+    SELECT tr.url, tr.release_date, tta.tag_id, FALSE
+    FROM track tr
+    LEFT JOIN track_tag_assignment tta USING (track_id)
+    WHERE tr.url = ANY(%(urls)s)
+    UNION ALL
+    SELECT m.url, m.release_date, NULL, TRUE
+    FROM merchandise m
+    WHERE m.url = ANY(%(urls)s)
+) item
+LEFT JOIN tag tg USING (tag_id)
+WHERE item.release_date IS NOT NULL
+GROUP BY item.url, item.release_date
+-- Merchandise tags are never stored, so a release date is enough for merch.
+HAVING COUNT(tg.tag_id) > 0 OR BOOL_AND(item.is_merch)
+"""
 
 
 def get_api_request(start_date: int,
-                    bandcamp_url: str = BANDCAMP_API_URL
+                    bandcamp_url: str = BANDCAMP_API_URL,
+                    offset: int = TIME_OFFSET
                     ) -> dict:
     """Returns objects from a given API URL call.
+    The offset is subtracted from start_date before calling the API.
     Separated from fetch_api_data to allow mocking."""
     logger = get_logger()
 
-    start_date = get_time_offset(start_date)
+    start_date = get_time_offset(start_date, offset)
 
     if start_date < 0:
         logger.critical("start_date is a negative value. Halting.")
         raise ValueError("start_date is a negative value. Halting.")
     bandcamp_url += str(start_date)
-    logger.info("Retrieving BandCamp API report from 2 minutes ago (%s)...",
+    logger.info("Retrieving BandCamp API report from %s...",
                 datetime.fromtimestamp(start_date).strftime('%Y-%m-%d %H:%M:%S'))
-    response = requests.get(bandcamp_url, timeout=10)
+    response = get_session().get(bandcamp_url, timeout=10)
     if response.status_code != 200:
         logger.critical("Could not connect to BandCamp API.")
         raise ConnectionError("Could not connect to BandCamp API.")
-    return response.json()
+    return response.json(object_pairs_hook=salesfeed_pairs_hook)
 
 
-def fetch_api_data(start_date: int) -> dict:
+def fetch_api_data(start_date: int, offset: int = TIME_OFFSET) -> dict:
     """Returns data fetched from BandCamp's API.
     Start date is a seconds from epoch int that gets called in the API under start_date.
     This is the report that gets called every 2 minutes."""
     logger = get_logger()
-    api_data = get_api_request(start_date)
+    api_data = get_api_request(start_date, offset=offset)
     if not api_data.get('start_date'):
         logger.critical("API data did not return correctly.")
         raise ValueError("API data did not return correctly.")
     return api_data
 
 
+def get_watermark() -> int | None:
+    """Returns the stored salesfeed high-water mark, or None if there isn't one
+    or the database can't be reached."""
+    logger = get_logger()
+    try:
+        conn = get_db_connection(ENV)
+    except (KeyError, psycopg2.Error):
+        logger.warning("Could not read the watermark. Using a fixed offset.")
+        return None
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT high_water_mark FROM etl_watermark WHERE pipeline_name = %s",
+                (WATERMARK_NAME,))
+            row = cur.fetchone()
+    except psycopg2.Error:
+        logger.warning("Could not read the watermark. Using a fixed offset.")
+        return None
+    finally:
+        conn.close()
+    return row["high_water_mark"] if row else None
+
+
+def fetch_new_api_data(high_water_mark: int,
+                       max_windows: int = MAX_CATCHUP_WINDOWS,
+                       until: int = None) -> dict:
+    """Returns every salesfeed event since the high-water mark.
+    If runs were skipped the gap spans several API windows, which are fetched
+    back to back until the feed has caught up (or reached until, if given)
+    or max_windows is reached.
+    The returned end_date is the new high-water mark."""
+    logger = get_logger()
+    api_data = fetch_api_data(high_water_mark, offset=0)
+    start_date = api_data['start_date']
+    events = list(api_data.get('events') or [])
+
+    windows = 1
+    while True:
+        end_date = api_data.get('end_date')
+        available = api_data.get('server_time', 0) - api_data.get('data_delay_sec', 0)
+        if until is not None:
+            available = min(available, until)
+        if not end_date or end_date <= api_data['start_date'] or end_date >= available:
+            break
+        if windows >= max_windows:
+            logger.warning("Gap of %s seconds left after %s windows. Continuing next run.",
+                           available - end_date, windows)
+            break
+        logger.info("Filling gap of %s seconds...", available - end_date)
+        try:
+            api_data = fetch_api_data(end_date, offset=0)
+        except ValueError:
+            break
+        events.extend(api_data.get('events') or [])
+        windows += 1
+
+    return api_data | {'start_date': start_date, 'events': events}
+
+
 def validate_api_data(api_data: dict, file_path: str) -> str:
     """Validates API contents to make sure format is correct.
     Will execute with no issues if the format fulfills all validation conditions.
@@ -71,9 +181,9 @@ def validate_api_data(api_data: dict, file_path: str) -> str:
         if not os.path.isdir(os.path.dirname(new_file_path)):
             logger.critical("Folder path doesn't exist.")
             raise OSError("Folder path doesn't exist.")
-        if new_file_path[-4:] != '.csv':
-            logger.critical("Path does not end in .csv.")
-            raise ValueError("Path does not end in .csv.")
+        if os.path.splitext(new_file_path)[1] not in ('.csv', '.parquet'):
+            logger.critical("Path does not end in .csv or .parquet.")
+            raise ValueError("Path does not end in .csv or .parquet.")
     else:
         new_file_path = None
     if (not api_data.get('start_date') or not api_data.get('events')
@@ -84,47 +194,191 @@ def validate_api_data(api_data: dict, file_path: str) -> str:
     return new_file_path
 
 
-def collect_api_rows_and_columns(api_data: dict) -> tuple:
-    """Takes the API contents and readies them to be saved to csv.
-    Returns a tuple containing:
-      a list of all API items to be inserted into the csv
-      a list of all column keys that appeared during iteration."""
+def format_release_date(release_date: date) -> str:
+    """Returns a stored release date in the 'released June 3, 2025' form found on item pages."""
+    return f"released {release_date:%B} {release_date.day}, {release_date.year}"
+
+
+def get_enriched_items(urls: list[str]) -> dict[str, dict]:
+    """Returns the release date and genres of every url already stored in the database
+    with both, looked up in a single query. Merchandise only needs a release date,
+    as its tags are never stored, and comes back with no genres.
+    Returns an empty dict if the database can't be reached, so every url gets scraped."""
     logger = get_logger()
-    logger.info("Collecting API contents...")
-    timeout_limit = 2
+    if not urls:
+        return {}
+    try:
+        conn = get_db_connection(ENV)
+    except (KeyError, psycopg2.Error):
+        logger.warning("Could not look up enriched items. Scraping all pages.")
+        return {}
+    try:
+        with conn.cursor() as cur:
+            cur.execute(ENRICHED_ITEMS_SQL, {"urls": list(set(urls))})
+            rows = cur.fetchall()
+    except psycopg2.Error:
+        logger.warning("Could not look up enriched items. Scraping all pages.")
+        return {}
+    finally:
+        conn.close()
+    return {row["url"]: {"release_date": format_release_date(row["release_date"]),
+                         "genres": list(row["genres"])}
+            for row in rows}
+
+
+def scrape_item_pages(urls: list[str],
+                      max_workers: int = MAX_SCRAPE_WORKERS,
+                      timeout_budget: float = TIMEOUT_BUDGET,
+                      cache: ScrapeCache = None,
+                      limiter: AdaptiveRateLimiter = None) -> list[dict | None]:
+    """Returns the scraped release date and genres for each url, fetched concurrently.
+    Results are in the same order as urls, with None for pages that could not be scraped.
+    Urls found in the cache are not requested, and fresh results are added to it.
+    Requests are paced by the adaptive rate limiter, which backs off on 429s, timeouts
+    and connection errors.
+    Raises a ReadTimeout once the share of requested pages that timed out or couldn't
+    connect exceeds timeout_budget, always allowing at least MIN_TIMEOUT_LIMIT of them.
+    The limiter's stats are logged either way."""
+    logger = get_logger()
+    limiter = limiter or get_rate_limiter()
+    results = [None] * len(urls)
+    if not urls:
+        return results
     timeout_count = 0
-    item_rows = []
-    api_events = api_data['events']
-    logger.info("Grabbing columns...")
-    all_keys = set()
-
-    for event in api_events:
-        for event_item in event['items']:
-            current_url = event_item.get('url')
-            if current_url:
-                current_url = re.sub(r'^(https:)?//', '', current_url)
-                event_item['url'] = 'https://' + current_url
+
+    to_scrape = []
+    for index, url in enumerate(urls):
+        cached = cache.get(url) if cache else None
+        if cached is None:
+            to_scrape.append(index)
+        else:
+            results[index] = cached
+    logger.info("Scraping %s item pages with %s workers...",
+                len(to_scrape), max_workers)
+    if not to_scrape:
+        return results
+    timeout_limit = max(MIN_TIMEOUT_LIMIT, timeout_budget * len(to_scrape))
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(limiter.call, get_release_date_and_genres,
+                                       urls[index], logger): index
+                       for index in to_scrape}
+            for future in as_completed(futures):
+                index = futures[future]
                 try:
-                    release_and_genre_info = get_release_date_and_genres(
-                        ("https://" + current_url), logger)
+                    results[index] = future.result()
+                    if cache:
+                        cache.set(urls[index], results[index])
                 except ValueError:
                     logger.warning("Could not find tags for this entry")
-                except requests.exceptions.ReadTimeout:
-                    logger.warning("Request timed out.")
+                except requests.exceptions.HTTPError:
+                    logger.warning("Request was rate limited.")
+                except (requests.exceptions.Timeout,
+                        requests.exceptions.ConnectionError) as error:
+                    logger.warning("Request timed out or could not connect.")
                     timeout_count += 1
                     if timeout_count > timeout_limit:
+                        executor.shutdown(wait=False, cancel_futures=True)
                         raise requests.exceptions.ReadTimeout(
-                            "Timeout limit exceeded")
-                if release_and_genre_info:
-                    event_item = event_item | release_and_genre_info
-            item_rows.append(event_item)
-            all_keys.update(event_item.keys())
-    all_keys.add('addl_count')
-    for row in item_rows:
-        if not row.get('addl_count'):
-            row['addl_count'] = None
-    keys = sorted(all_keys)
-    return (item_rows, keys)
+                            "Timeout limit exceeded") from error
+    finally:
+        limiter.report()
+    return results
+
+
+def get_source_fields(columns: list[str]) -> list[str]:
+    """Returns the salesfeed field names behind a projection given in the
+    column names used after transform's renaming."""
+    logger = get_logger()
+    source_names = {renamed: source for source, renamed in COLUMN_RENAMES.items()}
+    fields = [source_names.get(column, column) for column in columns]
+    unknown_fields = [field for field in fields if field not in SALE_ITEM_FIELDS]
+    if unknown_fields:
+        logger.critical("Unknown salesfeed columns: %s", unknown_fields)
+        raise KeyError(f"Unknown salesfeed columns: {unknown_fields}")
+    return fields
+
+
+def collect_api_items(api_data: dict,
+                      max_workers: int = MAX_SCRAPE_WORKERS,
+                      timeout_budget: float = TIMEOUT_BUDGET,
+                      cache: ScrapeCache = None,
+                      force_refresh: bool = False,
+                      recent_events: RecentEvents = None,
+                      lookup_enriched=None) -> list[SaleItem]:
+    """Takes the API contents and returns every event item as an enriched SaleItem.
+    Items are enriched in place, so no per-row dicts are built. Each distinct url
+    is scraped once and its details shared by every row selling it. Items already
+    stored with a release date and tags are not scraped again unless force_refresh is set.
+    If recent_events is given, sales it has already seen loaded are dropped before
+    anything is scraped. Stored items are looked up with lookup_enriched if given
+    (taking the distinct urls, like get_enriched_items), or get_enriched_items."""
+    logger = get_logger()
+    logger.info("Collecting API contents...")
+    items = [event_item if isinstance(event_item, SaleItem)
+             else SaleItem.from_mapping(event_item)
+             for event in api_data['events'] for event_item in event['items']]
+
+    for item in items:
+        if item.url:
+            item.url = 'https://' + re.sub(r'^(https:)?//', '', item.url)
+    if recent_events is not None:
+        items = recent_events.drop_loaded(items)
+    scrape_urls = [item.url for item in items if item.url]
+
+    distinct_urls = list(dict.fromkeys(scrape_urls))
+    if len(distinct_urls) < len(scrape_urls):
+        logger.info("Avoided %s duplicate item page fetches.",
+                    len(scrape_urls) - len(distinct_urls))
+
+    lookup_enriched = lookup_enriched or get_enriched_items
+    enriched_items = {} if force_refresh else lookup_enriched(distinct_urls)
+    if enriched_items:
+        logger.info("Skipping %s item pages already in the database.",
+                    len(enriched_items))
+    unknown_urls = [url for url in distinct_urls if url not in enriched_items]
+    details_by_url = enriched_items | dict(zip(unknown_urls, scrape_item_pages(
+        unknown_urls, max_workers, timeout_budget, cache)))
+
+    for item in items:
+        release_and_genre_info = details_by_url.get(item.url)
+        if release_and_genre_info:
+            item.release_date = release_and_genre_info.get('release_date')
+            item.genres = release_and_genre_info.get('genres')
+    return items
+
+
+def collect_api_columns(api_data: dict,
+                        max_workers: int = MAX_SCRAPE_WORKERS,
+                        timeout_budget: float = TIMEOUT_BUDGET,
+                        cache: ScrapeCache = None,
+                        force_refresh: bool = False,
+                        columns: list[str] = None,
+                        lookup_enriched=None) -> dict[str, list]:
+    """Takes the API contents and returns them as one list per column.
+    If columns is given (in transformed names, e.g. 'sold_for'), only the
+    salesfeed fields behind them are returned; otherwise every field is."""
+    logger = get_logger()
+    fields = SALE_ITEM_FIELDS if columns is None else get_source_fields(columns)
+    items = collect_api_items(api_data, max_workers, timeout_budget,
+                              cache, force_refresh, lookup_enriched=lookup_enriched)
+    logger.info("Grabbing columns...")
+    return items_to_columns(items, fields)
+
+
+def collect_api_rows_and_columns(api_data: dict,
+                                 max_workers: int = MAX_SCRAPE_WORKERS,
+                                 timeout_budget: float = TIMEOUT_BUDGET,
+                                 cache: ScrapeCache = None,
+                                 force_refresh: bool = False) -> tuple:
+    """Takes the API contents and readies them to be saved to csv.
+    Returns a tuple containing:
+      a list of all API items to be inserted into the csv
+      a list of all column keys."""
+    columns = collect_api_columns(api_data, max_workers, timeout_budget,
+                                  cache, force_refresh)
+    return (columns_to_rows(columns), list(columns))
 
 
 def save_to_csv(api_data: dict, keys: list, file_path: str) -> bool:
@@ -148,22 +402,114 @@ def save_to_csv(api_data: dict, keys: list, file_path: str) -> bool:
     return True
 
 
+def save_to_parquet(api_columns: dict[str, list], file_path: str) -> bool:
+    """Writes the extracted columns to a zstd-compressed .parquet file
+    using the salesfeed schema, so types survive the round trip."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    logger = get_logger()
+    logger.info("Saving to %s...", file_path)
+    try:
+        table = pa.table(api_columns, schema=get_columns_schema(api_columns))
+        pq.write_table(table, file_path, compression=PARQUET_COMPRESSION)
+    except OSError:
+        logger.exception("File I/O error.")
+        return False
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        logger.exception("Parquet schema error.")
+        return False
+    logger.info("Success!")
+    return True
+
+
+def fetch_salesfeed(curr_time: int = None) -> dict:
+    """Returns the salesfeed data to extract. Without a curr_time, fetches everything
+    since the stored high-water mark, or the last 200 seconds if none is stored."""
+    high_water_mark = get_watermark() if curr_time is None else None
+    if high_water_mark is not None:
+        return fetch_new_api_data(high_water_mark)
+    return fetch_api_data(int(time.time()) if curr_time is None else curr_time)
+
+
+def get_high_water_mark(api_data: dict) -> int:
+    """Returns the time the fetched salesfeed data runs up to."""
+    return api_data.get('end_date') or api_data.get('server_time')
+
+
+def collect_cached_api_items(api_data: dict, force_refresh: bool = False,
+                             recent_events: RecentEvents = None) -> list[SaleItem]:
+    """Returns collect_api_items for the data using the persistent scrape cache,
+    logging cache, recent event and connection statistics afterwards."""
+    cache = ScrapeCache()
+    try:
+        return collect_api_items(api_data, cache=cache, force_refresh=force_refresh,
+                                 recent_events=recent_events)
+    finally:
+        cache.report()
+        cache.close()
+        if recent_events is not None:
+            recent_events.report()
+        log_connection_stats()
+
+
+def extract_items(force_refresh: bool = False,
+                  recent_events: RecentEvents = None) -> tuple[list[SaleItem], int]:
+    """Returns the enriched SaleItems since the stored high-water mark and the new mark,
+    without building any columns, so small batches can skip pandas.
+    Sales recent_events has already seen loaded are left out."""
+    api_data = fetch_salesfeed()
+    validate_api_data(api_data, None)
+    return (collect_cached_api_items(api_data, force_refresh, recent_events),
+            get_high_water_mark(api_data))
+
+
+def items_to_dataframe(items: list[SaleItem], high_water_mark: int = None,
+                       columns: list[str] | None = None,
+                       all_columns: bool = False) -> pd.DataFrame:
+    """Returns the items as the extract DataFrame with the high-water mark attached
+    as attrs['high_water_mark']. Only the REQUIRED_COLUMNS fields are kept unless
+    other columns are given, or every field if all_columns is set."""
+    import pandas as pd
+    if all_columns:
+        fields = SALE_ITEM_FIELDS
+    else:
+        fields = get_source_fields(REQUIRED_COLUMNS if columns is None else columns)
+    extract_df = pd.DataFrame(items_to_columns(items, fields))
+    extract_df.attrs["high_water_mark"] = high_water_mark
+    return extract_df
+
+
 def run_extract(file_path: str = None,
-                curr_time: int = int(time.time())) -> bool | pd.DataFrame:
-    """Runs all required extract functions in succession for the ETL pipeline."""
-    api_data = fetch_api_data(curr_time)
+                curr_time: int = None,
+                force_refresh: bool = False,
+                all_columns: bool = False) -> bool | pd.DataFrame:
+    """Runs all required extract functions in succession for the ETL pipeline.
+    Without a curr_time, fetches everything since the stored high-water mark
+    (or the last 200 seconds if none is stored) and attaches the new mark to the
+    returned DataFrame as attrs['high_water_mark'].
+    Only the columns transform needs are kept unless all_columns is set.
+    Set force_refresh to scrape every item page, even ones already in the database."""
+    api_data = fetch_salesfeed(curr_time)
     directory_file_path = validate_api_data(api_data, file_path)
-    api_rows, api_columns = collect_api_rows_and_columns(api_data)
+    items = collect_cached_api_items(api_data, force_refresh)
     if directory_file_path:
-        return save_to_csv(api_rows, api_columns, directory_file_path)
-    return pd.DataFrame(api_rows)[api_columns]
+        fields = SALE_ITEM_FIELDS if all_columns else get_source_fields(REQUIRED_COLUMNS)
+        api_columns = items_to_columns(items, fields)
+        if directory_file_path.endswith('.parquet'):
+            return save_to_parquet(api_columns, directory_file_path)
+        return save_to_csv(columns_to_rows(api_columns), list(api_columns),
+                           directory_file_path)
+    return items_to_dataframe(items, get_high_water_mark(api_data),
+                              all_columns=all_columns)
 
 
-def get_time_offset(curr_time: int = int(time.time()), offset: int = 200) -> int:
+def get_time_offset(curr_time: int = None, offset: int = TIME_OFFSET) -> int:
     """Returns current time in epoch format, minus time offset."""
+    if curr_time is None:
+        curr_time = int(time.time())
     return curr_time - offset
 
 
 if __name__ == "__main__":
     set_logger()
-    run_extract('data/output.csv')
+    run_extract('data/output.parquet', all_columns='--all-columns' in sys.argv)
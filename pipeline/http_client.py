@@ -0,0 +1,97 @@
+"""Script for the shared HTTP client used by the extract and web scraper."""
+
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from utilities import get_logger
+
+DEFAULT_POOL_SIZE = 16
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+SCRAPE_RETRY_STATUSES = (500, 502, 503, 504)
+
+_SESSION = None
+_SCRAPE_SESSION = None
+_SESSION_LOCK = threading.Lock()
+
+
+def build_session(pool_size: int = None, retries: int = 3,
+                  backoff_factor: float = 0.5,
+                  backoff_jitter: float = 0.5,
+                  retry_statuses: tuple[int, ...] = RETRY_STATUSES) -> requests.Session:
+    """Returns a requests Session with keep-alive connection pools per host and
+    jittered retries on retry_statuses (429 and 5xx responses by default).
+    Read timeouts are not retried so callers can still count them."""
+    if pool_size is None:
+        pool_size = int(os.getenv("HTTP_POOL_SIZE", DEFAULT_POOL_SIZE))
+    if pool_size < 1:
+        raise ValueError("Pool size must be at least 1.")
+
+    retry = Retry(
+        total=retries,
+        read=False,
+        status_forcelist=retry_statuses,
+        allowed_methods=["GET"],
+        backoff_factor=backoff_factor,
+        backoff_jitter=backoff_jitter,
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size,
+                          max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"Accept-Encoding": "gzip, deflate",
+                            "Connection": "keep-alive"})
+    return session
+
+
+def get_session() -> requests.Session:
+    """Returns the Session shared by every module in this process, creating it on first use."""
+    global _SESSION  # pylint: disable=global-statement
+    with _SESSION_LOCK:
+        if _SESSION is None:
+            _SESSION = build_session()
+        return _SESSION
+
+
+def get_scrape_session() -> requests.Session:
+    """Returns the Session shared by item page scrapes, creating it on first use.
+    It doesn't retry 429s itself, so every one reaches the adaptive rate limiter
+    straight away instead of after hidden Retry-After sleeps."""
+    global _SCRAPE_SESSION  # pylint: disable=global-statement
+    with _SESSION_LOCK:
+        if _SCRAPE_SESSION is None:
+            _SCRAPE_SESSION = build_session(retry_statuses=SCRAPE_RETRY_STATUSES)
+        return _SCRAPE_SESSION
+
+
+def get_connection_stats(session: requests.Session = None) -> dict[str, dict]:
+    """Returns per-host counts of requests sent, connections opened and connections reused."""
+    session = session or get_session()
+    stats = {}
+    for adapter in {id(adapter): adapter for adapter in session.adapters.values()}.values():
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools[key]
+            host_stats = stats.setdefault(
+                pool.host, {"requests": 0, "connections": 0, "reused": 0})
+            host_stats["requests"] += pool.num_requests
+            host_stats["connections"] += pool.num_connections
+            host_stats["reused"] += pool.num_requests - pool.num_connections
+    return stats
+
+
+def log_connection_stats(session: requests.Session = None) -> None:
+    """Returns None, but logs connection reuse for every host contacted, by the given
+    session or else by both the shared and the scrape session."""
+    logger = get_logger()
+    for session_to_log in [session] if session else [get_session(), get_scrape_session()]:
+        for host, host_stats in get_connection_stats(session_to_log).items():
+            logger.info("%s: %s requests over %s connections (%s reused)",
+                        host, host_stats["requests"], host_stats["connections"],
+                        host_stats["reused"])
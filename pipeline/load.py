@@ -1,18 +1,29 @@
-"""Script for the load portion of the ETL pipeline."""
+"""Script for the load portion of the ETL pipeline.
+pandas and pyarrow are imported by the functions that use them, so loading staging
+CSV built without pandas never imports them."""
+# pylint: disable=import-outside-toplevel
+from __future__ import annotations
+
+import csv
 import io
 import os
 import sys
+from collections.abc import Iterable
 from os import environ as ENV
-import pandas as pd
+from typing import TYPE_CHECKING
 import psycopg2
 from dotenv import load_dotenv
 from psycopg2.extras import RealDictCursor
 from psycopg2.extensions import connection, cursor
-from utilities import get_logger
+from utilities import get_logger, load_data, iter_data_chunks, CHUNK_ROWS
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 
 STAGING_DDL = """
-CREATE UNLOGGED TABLE IF NOT EXISTS stage_sale(
+CREATE TEMP TABLE IF NOT EXISTS stage_sale(
+  stage_id      BIGINT GENERATED ALWAYS AS IDENTITY,
   utc_date      TIMESTAMP,
   country_name  TEXT,
   artist_name   TEXT,
@@ -26,7 +37,7 @@ CREATE UNLOGGED TABLE IF NOT EXISTS stage_sale(
   release_date  DATE,
   sold_for      NUMERIC);
 
-CREATE UNLOGGED TABLE IF NOT EXISTS stage_tag(
+CREATE TEMP TABLE IF NOT EXISTS stage_tag(
   url TEXT,
   tag_name TEXT);
 """
@@ -37,7 +48,12 @@ SALE_COLS = [
     "slug_type", "item_type", "url", "art_url",
     "release_date", "sold_for",
 ]
+TAG_COLS = ["url", "tag_name"]
+STAGE_COLUMN_TYPES = {"utc_date": "timestamp", "release_date": "date", "sold_for": "numeric"}
+BINARY_COPY = os.getenv("BINARY_COPY", "true").lower() == "true"
 TAG_LEN, ARTIST_LEN, COUNTRY_LEN, NAME_LEN = 50, 100, 60, 255
+WATERMARK_NAME = "salesfeed"
+DIMENSION_LOCK_NAME = "bandcamp_dimensions"
 
 
 def get_db_connection(config: dict[str, str]) -> connection:
@@ -52,17 +68,105 @@ def get_db_connection(config: dict[str, str]) -> connection:
     )
 
 
-def copy_df(cur: cursor, df: pd.DataFrame, table: str, cols: list[str]) -> None:
-    """Returns None, but copies DataFrame data to PostgreSQL table using COPY command."""
+def copy_csv(cur: cursor, buf: io.StringIO, table: str, cols: list[str]) -> None:
+    """Returns None, but copies headerless CSV text to PostgreSQL table using COPY command."""
+    cur.copy_expert(
+        f"COPY {table} ({', '.join(cols)}) FROM STDIN WITH CSV", buf)
+
+
+def copy_df(cur: cursor, df: pd.DataFrame, table: str, cols: list[str],
+            binary: bool = BINARY_COPY) -> None:
+    """Returns None, but copies DataFrame data to PostgreSQL table using COPY command.
+    With binary set (BINARY_COPY), the columns are streamed in the binary format a chunk
+    at a time; frames it can't encode fall back to CSV text."""
+    if binary:
+        import pyarrow as pa
+        from binary_copy import CopyStream, encode_columns, iter_copy_chunks
+        try:
+            parts = encode_columns(df, cols, STAGE_COLUMN_TYPES)
+        except (TypeError, ValueError, pa.ArrowException) as err:
+            get_logger().warning("Copying %s as CSV: %s", table, err)
+        else:
+            cur.copy_expert(
+                f"COPY {table} ({', '.join(cols)}) FROM STDIN WITH (FORMAT binary)",
+                CopyStream(iter_copy_chunks(parts, len(df))))
+            return
+
     buf = io.StringIO()
     df.to_csv(buf, index=False, header=False, columns=cols)
     buf.seek(0)
-    cur.copy_expert(
-        f"COPY {table} ({', '.join(cols)}) FROM STDIN WITH CSV", buf)
+    copy_csv(cur, buf, table, cols)
+
+
+def quote_identifier(name: str) -> str:
+    """Returns name as a double-quoted SQL identifier."""
+    return '"' + name.replace('"', '""') + '"'
+
+
+def read_csv_header(file_path: str) -> list[str]:
+    """Returns the column names in the first line of a CSV file."""
+    with open(file_path, encoding="utf-8", newline="") as csv_file:
+        return next(csv.reader([csv_file.readline()]), [])
+
+
+def is_stage_file(file_path: str) -> bool:
+    """Returns True if the file is a CSV already holding every stage_sale column,
+    like the ones staging.export_stage_files writes."""
+    return (file_path.endswith(".csv") and os.path.isfile(file_path)
+            and set(SALE_COLS) <= set(read_csv_header(file_path)))
+
+
+def get_stage_tag_path(sales_path: str) -> str:
+    """Returns the path of the stage_tag CSV that goes with a stage_sale CSV."""
+    return sales_path[:-len(".csv")] + "_tags.csv"
+
+
+def copy_csv_file(cur: cursor, file_path: str, table: str, cols: list[str]) -> int:
+    """Returns the number of rows copied after streaming a CSV file with a header
+    straight from disk into the table, without parsing it in Python.
+    The header may list the columns in any order; columns that aren't in cols are
+    dropped by copying into a temporary table first."""
+    with open(file_path, encoding="utf-8", newline="") as csv_file:
+        header = next(csv.reader([csv_file.readline()]), [])
+        file_cols = ", ".join(quote_identifier(col) for col in header)
+        if set(header) <= set(cols):
+            cur.copy_expert(f"COPY {table} ({file_cols}) FROM STDIN WITH CSV", csv_file)
+            return cur.rowcount
+
+        kept_cols = ", ".join(col for col in cols if col in header)
+        cur.execute(f"CREATE TEMP TABLE {table}_file (LIKE {table} INCLUDING IDENTITY) "
+                    "ON COMMIT DROP;")
+        for col in header:
+            if col not in cols:
+                cur.execute(f"ALTER TABLE {table}_file ADD COLUMN {quote_identifier(col)} TEXT;")
+        cur.copy_expert(f"COPY {table}_file ({file_cols}) FROM STDIN WITH CSV", csv_file)
+        cur.execute(f"INSERT INTO {table} ({kept_cols}) SELECT {kept_cols} FROM {table}_file;")
+        return cur.rowcount
+
+
+def truncate_strings(values: pd.Series, length: int) -> pd.Series:
+    """Returns the values with every string cut to length.
+    Columns holding no strings at all are returned unchanged."""
+    try:
+        return values.str[:length]
+    except AttributeError:
+        return values
+
+
+def to_datetime_column(values: pd.Series, format: str = None) -> pd.Series:
+    """Returns the values as datetimes, unparseable ones as NaT.
+    Columns transform already converted are returned as they are."""
+    # pylint: disable=redefined-builtin
+    import pandas as pd
+    from pandas.api.types import is_datetime64_any_dtype
+    if is_datetime64_any_dtype(values):
+        return values
+    return pd.to_datetime(values, errors="coerce", format=format)
 
 
 def build_frames(df: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
     """Returns tuple of (sales_dataframe, tags_dataframe) prepared for database insertion."""
+    import pandas as pd
     tag_df = (
         df[["url", "tag_names"]]
         .explode("tag_names")
@@ -74,39 +178,45 @@ def build_frames(df: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
     )
 
     sales = pd.DataFrame(index=df.index)
-    sales["utc_date"] = pd.to_datetime(df["utc_date"], errors="coerce")
+    sales["utc_date"] = to_datetime_column(df["utc_date"])
     sales["country_name"] = df["country_name"].astype(str).str[:COUNTRY_LEN]
     sales["artist_name"] = df["artist_name"].astype(str).str[:ARTIST_LEN]
     sales["slug_type"], sales["item_type"] = df["slug_type"], df["item_type"]
     sales["url"], sales["art_url"] = df["url"].astype(str), df["art_url"]
-    sales["release_date"] = pd.to_datetime(
-        df["release_date"], errors="coerce", format="%Y-%m-%d")
+    sales["release_date"] = to_datetime_column(df["release_date"], format="%Y-%m-%d")
     sales["sold_for"] = df["sold_for"]
 
     item_description = df["item_description"].fillna("")
+    slug_type, item_type = df["slug_type"], df["item_type"]
+    names = truncate_strings(item_description, NAME_LEN)
 
-    sales["track_name"] = df.apply(
-        lambda row: (
-            item_description[row.name][:NAME_LEN]
-            if (row.slug_type == "t" and row.item_type == "t")
-            else None
-        ),
-        axis=1,
-    )
-    sales["album_name"] = df.apply(
-        lambda row: (
-            (row.album_name if row.item_type == "p"
-             else (row.get('album_title') or item_description[row.name] or 'Unknown Album'))[:NAME_LEN]
-            if (row.slug_type == "a" and row.item_type in ["a", "p"]) else None
-        ),
-        axis=1,
-    )
-    sales["merch_name"] = df.apply(
-        lambda row: (item_description[row.name][:NAME_LEN]
-                     if (row.slug_type == "p" and row.item_type == "p") else None), axis=1
-    )
+    is_track = ((slug_type == "t") & (item_type == "t")).to_numpy()
+    is_album = ((slug_type == "a") & item_type.isin(["a", "p"])).to_numpy()
+    is_merch = ((slug_type == "p") & (item_type == "p")).to_numpy()
+    is_album_merch = is_album & (item_type == "p").to_numpy()
 
-    return sales[SALE_COLS], tag_df[["url", "tag_name"]]
+    missing = pd.Series(None, index=df.index, dtype=object)
+    album_name = df["album_name"] if "album_name" in df.columns else missing
+    album_title = df["album_title"] if "album_title" in df.columns else missing
+    has_title = (album_title.notna() & (album_title != "")).to_numpy()
+    album_titles = album_title.where(
+        has_title, item_description.where(item_description != "", "Unknown Album"))
+
+    # Kept as Series so string columns stay arrow-backed instead of going through object arrays.
+    sales["track_name"] = names.where(is_track)
+    sales["album_name"] = truncate_strings(
+        album_titles.where(~is_album_merch, album_name), NAME_LEN).where(is_album)
+    sales["merch_name"] = names.where(is_merch)
+
+    return sales[SALE_COLS], tag_df[TAG_COLS]
+
+
+def prepare_staging(cur: cursor) -> None:
+    """Returns None, but creates this session's temporary staging tables and empties them.
+    They are private to the connection, so loads running at the same time never see
+    or truncate each other's rows."""
+    cur.execute(STAGING_DDL)
+    cur.execute("TRUNCATE stage_sale, stage_tag RESTART IDENTITY;")
 
 
 def insert_dimension_data(cur: cursor, label: str, count_sql: str, insert_sql: str) -> None:
@@ -119,8 +229,241 @@ def insert_dimension_data(cur: cursor, label: str, count_sql: str, insert_sql: s
     logger.info(f"{label:12} {inserted}/{attempted:<7} inserted")
 
 
-def run_load(df=None, csv_path=None) -> None:
-    """Returns None, but loads DataFrame or CSV data into the database with full ETL process."""
+def save_watermark(cur: cursor, high_water_mark: int) -> None:
+    """Returns None, but advances the stored salesfeed high-water mark.
+    The mark never moves backwards, so an overlapping older run can't rewind it."""
+    logger = get_logger()
+    cur.execute("""
+        INSERT INTO etl_watermark(pipeline_name, high_water_mark)
+        VALUES (%s, %s)
+        ON CONFLICT (pipeline_name) DO UPDATE
+        SET high_water_mark = GREATEST(etl_watermark.high_water_mark,
+                                       EXCLUDED.high_water_mark),
+            updated_at = NOW()""", (WATERMARK_NAME, int(high_water_mark)))
+    logger.info("watermark advanced to %s", high_water_mark)
+
+
+def advance_watermark(high_water_mark: int) -> None:
+    """Returns None, but saves the high-water mark on its own, for runs that had
+    no new sales to load."""
+    load_dotenv(".env")
+    with get_db_connection(ENV) as conn:
+        with conn.cursor() as cur:
+            save_watermark(cur, high_water_mark)
+        conn.commit()
+
+
+def merge_dimensions(cur: cursor) -> None:
+    """Returns None, but upserts the staged countries, artists, tags, tracks, albums and
+    merchandise, and links artists and tags to them.
+    Holds a transaction-level advisory lock while doing so, so concurrent loads take
+    turns on these shared rows instead of deadlocking on each other's inserts."""
+    logger = get_logger()
+    cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s));", (DIMENSION_LOCK_NAME,))
+
+    insert_dimension_data(
+        cur,
+        "country",
+        "SELECT COUNT(DISTINCT country_name) FROM stage_sale WHERE country_name IS NOT NULL",
+        """INSERT INTO country(country_name)
+        SELECT country_name FROM stage_sale
+        WHERE country_name IS NOT NULL
+        ON CONFLICT DO NOTHING
+        RETURNING 1"""
+    )
+    insert_dimension_data(
+        cur,
+        "artist",
+        "SELECT COUNT(DISTINCT artist_name) FROM stage_sale WHERE artist_name IS NOT NULL",
+        """INSERT INTO artist(artist_name)
+        SELECT artist_name FROM stage_sale
+        WHERE artist_name IS NOT NULL
+        ON CONFLICT DO NOTHING
+        RETURNING 1"""
+    )
+    insert_dimension_data(
+        cur,
+        "tag",
+        "SELECT COUNT(DISTINCT tag_name) FROM stage_tag",
+        """INSERT INTO tag(tag_name)
+        SELECT tag_name FROM stage_tag
+        ON CONFLICT DO NOTHING
+        RETURNING 1"""
+    )
+    insert_dimension_data(
+        cur,
+        "track",
+        "SELECT COUNT(*) FROM stage_sale WHERE track_name IS NOT NULL",
+        """INSERT INTO track(track_name, url, art_url, release_date)
+        SELECT track_name, url, art_url, release_date
+        FROM stage_sale
+        WHERE track_name IS NOT NULL
+        ON CONFLICT (url) DO NOTHING
+        RETURNING 1"""
+    )
+    insert_dimension_data(
+        cur,
+        "album",
+        "SELECT COUNT(*) FROM stage_sale WHERE album_name IS NOT NULL",
+        """INSERT INTO album(album_name, url, art_url, release_date)
+        SELECT album_name, url, art_url, release_date
+        FROM stage_sale
+        WHERE album_name IS NOT NULL
+        ON CONFLICT (url) DO NOTHING
+        RETURNING 1"""
+    )
+    insert_dimension_data(
+        cur,
+        "merchandise",
+        "SELECT COUNT(*) FROM stage_sale WHERE merch_name IS NOT NULL",
+        """INSERT INTO merchandise(merchandise_name, url, art_url, release_date)
+        SELECT merch_name, url, art_url, release_date
+        FROM stage_sale
+        WHERE merch_name IS NOT NULL
+        ON CONFLICT (url) DO NOTHING
+        RETURNING 1"""
+    )
+
+    cur.execute("""
+        INSERT INTO artist_track_assignment(artist_id, track_id)
+        SELECT a.artist_id, t.track_id
+        FROM stage_sale s
+        JOIN artist a USING (artist_name)
+        JOIN track  t USING (url)
+        WHERE s.track_name IS NOT NULL
+        ON CONFLICT DO NOTHING
+        RETURNING 1""")
+    logger.info("artist_track %s rows linked", cur.rowcount)
+
+    cur.execute("""
+        INSERT INTO artist_album_assignment(artist_id, album_id)
+        SELECT a.artist_id, al.album_id
+        FROM stage_sale s
+        JOIN artist a USING (artist_name)
+        JOIN album  al USING (url)
+        WHERE s.album_name IS NOT NULL
+        ON CONFLICT DO NOTHING
+        RETURNING 1""")
+    logger.info("artist_album %s rows linked", cur.rowcount)
+
+    cur.execute("""
+        INSERT INTO artist_merchandise_assignment(artist_id, merchandise_id)
+        SELECT a.artist_id, m.merchandise_id
+        FROM stage_sale s
+        JOIN artist      a USING (artist_name)
+        JOIN merchandise m USING (url)
+        WHERE s.merch_name IS NOT NULL
+        ON CONFLICT DO NOTHING
+        RETURNING 1""")
+    logger.info("artist_merch %s rows linked", cur.rowcount)
+
+    cur.execute("""
+        INSERT INTO track_tag_assignment(tag_id, track_id)
+        SELECT tg.tag_id, tr.track_id
+        FROM stage_tag st
+        JOIN tag   tg USING (tag_name)
+        JOIN track tr USING (url)
+        ON CONFLICT DO NOTHING
+        RETURNING 1""")
+    logger.info("track_tag %s rows linked", cur.rowcount)
+
+    cur.execute("""
+        INSERT INTO album_tag_assignment(tag_id, album_id)
+        SELECT tg.tag_id, al.album_id
+        FROM stage_tag st
+        JOIN tag   tg USING (tag_name)
+        JOIN album al USING (url)
+        ON CONFLICT DO NOTHING
+        RETURNING 1""")
+    logger.info("album_tag %s rows linked", cur.rowcount)
+
+
+def merge_staging(cur: cursor, high_water_mark: int = None) -> None:
+    """Returns None, but moves the staged sales and tags into the dimension, sale and
+    assignment tables, saving high_water_mark with the sales if given.
+    The dimension upserts are committed first to release their lock; the sales and
+    their assignments only add new rows, so they run alongside other loads.
+    Each new sale_id is returned with the stage_id of the row it came from, so every
+    assignment joins back to exactly one staged sale. Sales whose event key (see
+    sale_event_key in schema.sql) is already stored are skipped, so reloading a batch
+    adds nothing."""
+    logger = get_logger()
+
+    merge_dimensions(cur)
+    cur.connection.commit()
+
+    cur.execute(
+        "CREATE TEMP TABLE inserted_sales (stage_id BIGINT, sale_id BIGINT) ON COMMIT DROP;")
+
+    cur.execute("""
+        WITH new_sales AS (
+            SELECT s.stage_id, c.country_id, s.utc_date,
+                   sale_event_key(s.utc_date, c.country_id, s.url, s.sold_for) AS event_key,
+                   nextval(pg_get_serial_sequence('sale', 'sale_id')) AS sale_id
+            FROM   stage_sale s
+            JOIN   country c USING (country_name)
+        ), ins AS (
+            INSERT INTO sale(sale_id, utc_date, country_id, event_key)
+            OVERRIDING SYSTEM VALUE
+            SELECT sale_id, utc_date, country_id, event_key FROM new_sales
+            ORDER BY event_key
+            ON CONFLICT (event_key) DO NOTHING
+            RETURNING sale_id
+        )
+        INSERT INTO inserted_sales
+        SELECT new_sales.stage_id, ins.sale_id
+        FROM ins
+        JOIN new_sales USING (sale_id);
+    """)
+    new_sales = cur.rowcount
+    logger.info("sale %s new rows", new_sales)
+
+    cur.execute("""
+        INSERT INTO sale_track_assignment(track_id, sale_id, sold_for)
+        SELECT t.track_id, inserted_sales.sale_id, s.sold_for
+        FROM inserted_sales
+        JOIN stage_sale   s  USING (stage_id)
+        JOIN track        t  USING (url)
+        WHERE s.track_name IS NOT NULL
+        ON CONFLICT DO NOTHING
+        RETURNING 1""")
+    logger.info("sale_track %s rows linked", cur.rowcount)
+
+    cur.execute("""
+        INSERT INTO sale_album_assignment(album_id, sale_id, sold_for, is_physical)
+        SELECT al.album_id, inserted_sales.sale_id, s.sold_for, (s.item_type = 'p')
+        FROM inserted_sales
+        JOIN stage_sale   s  USING (stage_id)
+        JOIN album        al USING (url)
+        WHERE s.album_name IS NOT NULL
+        ON CONFLICT DO NOTHING
+        RETURNING 1""")
+    logger.info("sale_album %s rows linked", cur.rowcount)
+
+    cur.execute("""
+        INSERT INTO sale_merchandise_assignment(merchandise_id, sale_id, sold_for)
+        SELECT m.merchandise_id, inserted_sales.sale_id, s.sold_for
+        FROM inserted_sales
+        JOIN stage_sale    s  USING (stage_id)
+        JOIN merchandise   m  USING (url)
+        WHERE s.merch_name IS NOT NULL
+        ON CONFLICT DO NOTHING
+        RETURNING 1""")
+    logger.info("sale_merch %s rows linked", cur.rowcount)
+
+    if high_water_mark is not None:
+        save_watermark(cur, high_water_mark)
+
+
+def run_load(df=None, csv_path=None, high_water_mark: int = None,
+             chunk_rows: int = CHUNK_ROWS) -> None:
+    """Returns None, but loads DataFrame, parquet or CSV data into the database with full ETL process.
+    csv_path may point at either a .parquet or a .csv file.
+    CSV files already in staging shape (see is_stage_file) are copied straight from disk,
+    with their stage_tag file beside them.
+    If chunk_rows is set (or CHUNK_ROWS is), other files are read and staged chunk_rows at
+    a time instead of all at once, so memory stays flat however large they are.
+    If high_water_mark is given it is saved in the same transaction as the sales."""
 
     logger = get_logger()
 
@@ -130,200 +473,91 @@ def run_load(df=None, csv_path=None) -> None:
     if df is None:
         if not os.path.exists(csv_path):
             raise FileNotFoundError(f"File not found: {csv_path}")
-        df = pd.read_csv(csv_path)
+        if is_stage_file(csv_path):
+            load_stage_files(csv_path, get_stage_tag_path(csv_path), high_water_mark)
+            return
+        if chunk_rows:
+            load_stage_chunks((build_frames(chunk)
+                               for chunk in iter_data_chunks(csv_path, chunk_rows)),
+                              high_water_mark)
+            return
+        df = load_data(csv_path)
 
     if df.empty:
         logger.info("Nothing to load")
         return
 
-    load_dotenv(".env")
     sales, tags = build_frames(df)
+    load_stage_frames(sales, tags, high_water_mark)
+
+
+def load_stage_frames(sales: pd.DataFrame, tags: pd.DataFrame,
+                      high_water_mark: int = None) -> None:
+    """Returns None, but loads the stage_sale and stage_tag frames from build_frames
+    into the database, saving high_water_mark with the sales if given."""
+    load_stage_chunks([(sales, tags)], high_water_mark)
+
+
+def load_stage_chunks(frames: Iterable[tuple[pd.DataFrame, pd.DataFrame]],
+                      high_water_mark: int = None) -> int:
+    """Returns the number of sales loaded after copying each (sales, tags) pair of
+    frames into staging as it arrives. The dimension, sale and assignment tables are
+    merged once all of them are staged (see merge_staging)."""
+    logger = get_logger()
+    load_dotenv(".env")
+    row_count = 0
+
+    with get_db_connection(ENV) as conn:
+        with conn.cursor() as cur:
+            prepare_staging(cur)
+            for sales, tags in frames:
+                copy_df(cur, sales, "stage_sale", SALE_COLS)
+                if not tags.empty:
+                    copy_df(cur, tags, "stage_tag", TAG_COLS)
+                row_count += len(sales)
+
+            merge_staging(cur, high_water_mark)
+        conn.commit()
+        logger.info(f"\nLoaded{row_count:,} rows ✔")
+    return row_count
+
+
+def load_stage_files(sales_path: str, tags_path: str = None,
+                     high_water_mark: int = None) -> int:
+    """Returns the number of sales loaded after streaming stage_sale and stage_tag CSV
+    files from disk into staging with COPY, skipping pandas entirely.
+    tags_path may be None or point at a file that doesn't exist if there are no tags."""
+    logger = get_logger()
+    load_dotenv(".env")
+
+    with get_db_connection(ENV) as conn:
+        with conn.cursor() as cur:
+            prepare_staging(cur)
+            row_count = copy_csv_file(cur, sales_path, "stage_sale", SALE_COLS)
+            if tags_path is not None and os.path.exists(tags_path):
+                copy_csv_file(cur, tags_path, "stage_tag", TAG_COLS)
+            merge_staging(cur, high_water_mark)
+        conn.commit()
+        logger.info(f"\nLoaded{row_count:,} rows ✔")
+    return row_count
+
+
+def load_staging_csv(sales_csv: str, tags_csv: str, row_count: int,
+                     high_water_mark: int = None) -> None:
+    """Returns None, but loads ready-made stage_sale and stage_tag CSV text into the
+    database, skipping the DataFrame stage. tags_csv may be empty."""
+    logger = get_logger()
+    load_dotenv(".env")
 
     with get_db_connection(ENV) as conn:
         with conn.cursor() as cur:
-            cur.execute(STAGING_DDL)
-            cur.execute("TRUNCATE stage_sale, stage_tag;")
-            copy_df(cur, sales, "stage_sale", SALE_COLS)
-            if not tags.empty:
-                copy_df(cur, tags, "stage_tag", ["url", "tag_name"])
-
-            insert_dimension_data(
-                cur,
-                "country",
-                "SELECT COUNT(DISTINCT country_name) FROM stage_sale WHERE country_name IS NOT NULL",
-                """INSERT INTO country(country_name)
-                SELECT country_name FROM stage_sale
-                WHERE country_name IS NOT NULL
-                ON CONFLICT DO NOTHING
-                RETURNING 1"""
-            )
-            insert_dimension_data(
-                cur,
-                "artist",
-                "SELECT COUNT(DISTINCT artist_name) FROM stage_sale WHERE artist_name IS NOT NULL",
-                """INSERT INTO artist(artist_name)
-                SELECT artist_name FROM stage_sale
-                WHERE artist_name IS NOT NULL
-                ON CONFLICT DO NOTHING
-                RETURNING 1"""
-            )
-            insert_dimension_data(
-                cur,
-                "tag",
-                "SELECT COUNT(DISTINCT tag_name) FROM stage_tag",
-                """INSERT INTO tag(tag_name)
-                SELECT tag_name FROM stage_tag
-                ON CONFLICT DO NOTHING
-                RETURNING 1"""
-            )
-            insert_dimension_data(
-                cur,
-                "track",
-                "SELECT COUNT(*) FROM stage_sale WHERE track_name IS NOT NULL",
-                """INSERT INTO track(track_name, url, art_url, release_date)
-                SELECT track_name, url, art_url, release_date
-                FROM stage_sale
-                WHERE track_name IS NOT NULL
-                ON CONFLICT (url) DO NOTHING
-                RETURNING 1"""
-            )
-            insert_dimension_data(
-                cur,
-                "album",
-                "SELECT COUNT(*) FROM stage_sale WHERE album_name IS NOT NULL",
-                """INSERT INTO album(album_name, url, art_url, release_date)
-                SELECT album_name, url, art_url, release_date
-                FROM stage_sale
-                WHERE album_name IS NOT NULL
-                ON CONFLICT (url) DO NOTHING
-                RETURNING 1"""
-            )
-            insert_dimension_data(
-                cur,
-                "merchandise",
-                "SELECT COUNT(*) FROM stage_sale WHERE merch_name IS NOT NULL",
-                """INSERT INTO merchandise(merchandise_name, url, art_url, release_date)
-                SELECT merch_name, url, art_url, release_date
-                FROM stage_sale
-                WHERE merch_name IS NOT NULL
-                ON CONFLICT (url) DO NOTHING
-                RETURNING 1"""
-            )
-
-            cur.execute(
-                "CREATE TEMP TABLE inserted_sales (sale_id BIGINT, utc_date TIMESTAMP, country_id SMALLINT) ON COMMIT DROP;")
-
-            cur.execute("""
-                WITH ins AS (
-                    INSERT INTO sale(utc_date, country_id)
-                    SELECT s.utc_date, c.country_id
-                    FROM   stage_sale s
-                    JOIN   country c USING (country_name)
-                    ON CONFLICT DO NOTHING
-                    RETURNING sale_id, utc_date, country_id
-                )
-                INSERT INTO inserted_sales
-                SELECT * FROM ins;
-            """)
-            new_sales = cur.rowcount
-            logger.info("sale %s new rows", new_sales)
-
-            cur.execute("""
-                INSERT INTO sale_track_assignment(track_id, sale_id, sold_for)
-                SELECT t.track_id, inserted_sales.sale_id, s.sold_for
-                FROM stage_sale s
-                JOIN track        t  USING (url)
-                JOIN country      c  USING (country_name)
-                JOIN inserted_sales
-                ON inserted_sales.utc_date = s.utc_date
-                AND inserted_sales.country_id = c.country_id
-                WHERE s.track_name IS NOT NULL
-                ON CONFLICT DO NOTHING
-                RETURNING 1""")
-            logger.info("sale_track %s rows linked", cur.rowcount)
-
-            cur.execute("""
-                INSERT INTO sale_album_assignment(album_id, sale_id, sold_for, is_physical)
-                SELECT al.album_id, inserted_sales.sale_id, s.sold_for, (s.item_type = 'p')
-                FROM stage_sale s
-                JOIN album        al USING (url)
-                JOIN country      c  USING (country_name)
-                JOIN inserted_sales
-                ON inserted_sales.utc_date = s.utc_date
-                AND inserted_sales.country_id = c.country_id
-                WHERE s.album_name IS NOT NULL
-                ON CONFLICT DO NOTHING
-                RETURNING 1""")
-            logger.info("sale_album %s rows linked", cur.rowcount)
-
-            cur.execute("""
-                INSERT INTO sale_merchandise_assignment(merchandise_id, sale_id, sold_for)
-                SELECT m.merchandise_id, inserted_sales.sale_id, s.sold_for
-                FROM stage_sale s
-                JOIN merchandise   m  USING (url)
-                JOIN country       c  USING (country_name)
-                JOIN inserted_sales
-                ON inserted_sales.utc_date = s.utc_date
-                AND inserted_sales.country_id = c.country_id
-                WHERE s.merch_name IS NOT NULL
-                ON CONFLICT DO NOTHING
-                RETURNING 1""")
-            logger.info("sale_merch %s rows linked", cur.rowcount)
-
-            cur.execute("""
-                INSERT INTO artist_track_assignment(artist_id, track_id)
-                SELECT a.artist_id, t.track_id
-                FROM stage_sale s
-                JOIN artist a USING (artist_name)
-                JOIN track  t USING (url)
-                WHERE s.track_name IS NOT NULL
-                ON CONFLICT DO NOTHING
-                RETURNING 1""")
-            logger.info("artist_track %s rows linked", cur.rowcount)
-
-            cur.execute("""
-                INSERT INTO artist_album_assignment(artist_id, album_id)
-                SELECT a.artist_id, al.album_id
-                FROM stage_sale s
-                JOIN artist a USING (artist_name)
-                JOIN album  al USING (url)
-                WHERE s.album_name IS NOT NULL
-                ON CONFLICT DO NOTHING
-                RETURNING 1""")
-            logger.info("artist_album %s rows linked", cur.rowcount)
-
-            cur.execute("""
-                INSERT INTO artist_merchandise_assignment(artist_id, merchandise_id)
-                SELECT a.artist_id, m.merchandise_id
-                FROM stage_sale s
-                JOIN artist      a USING (artist_name)
-                JOIN merchandise m USING (url)
-                WHERE s.merch_name IS NOT NULL
-                ON CONFLICT DO NOTHING
-                RETURNING 1""")
-            logger.info("artist_merch %s rows linked", cur.rowcount)
-
-            cur.execute("""
-                INSERT INTO track_tag_assignment(tag_id, track_id)
-                SELECT tg.tag_id, tr.track_id
-                FROM stage_tag st
-                JOIN tag   tg USING (tag_name)
-                JOIN track tr USING (url)
-                ON CONFLICT DO NOTHING
-                RETURNING 1""")
-            logger.info("track_tag %s rows linked", cur.rowcount)
-
-            cur.execute("""
-                INSERT INTO album_tag_assignment(tag_id, album_id)
-                SELECT tg.tag_id, al.album_id
-                FROM stage_tag st
-                JOIN tag   tg USING (tag_name)
-                JOIN album al USING (url)
-                ON CONFLICT DO NOTHING
-                RETURNING 1""")
-            logger.info("album_tag %s rows linked", cur.rowcount)
+            prepare_staging(cur)
+            copy_csv(cur, io.StringIO(sales_csv), "stage_sale", SALE_COLS)
+            if tags_csv:
+                copy_csv(cur, io.StringIO(tags_csv), "stage_tag", TAG_COLS)
+            merge_staging(cur, high_water_mark)
         conn.commit()
-        logger.info(f"\nLoaded{len(df):,} rows ✔")
+        logger.info(f"\nLoaded{row_count:,} rows ✔")
 
 
 if __name__ == "__main__":
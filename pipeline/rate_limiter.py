@@ -0,0 +1,122 @@
+"""Script for adaptive rate limiting of requests to Bandcamp item pages."""
+
+import os
+import threading
+import time
+
+import requests
+
+from utilities import get_logger
+
+DEFAULT_RATE = 5.0
+MIN_RATE, MAX_RATE = 0.5, 50.0
+DEFAULT_CONCURRENCY = 4.0
+MIN_CONCURRENCY, MAX_CONCURRENCY = 1.0, 32.0
+TARGET_LATENCY = 2.0
+THROTTLE_DECREASE = 0.5
+LATENCY_DECREASE = 0.9
+
+_RATE_LIMITER = None
+_RATE_LIMITER_LOCK = threading.Lock()
+
+
+def is_throttle_error(error: Exception) -> bool:
+    """Returns True if the error means the remote side wants us to slow down:
+    a timeout, a refused or dropped connection, or a 429 response."""
+    if isinstance(error, (requests.exceptions.Timeout, requests.exceptions.ConnectionError)):
+        return True
+    response = getattr(error, "response", None)
+    return (isinstance(error, requests.exceptions.HTTPError)
+            and response is not None and response.status_code == 429)
+
+
+class AdaptiveRateLimiter:
+    """Token bucket limiting the request rate, plus a concurrency limit, both tuned AIMD-style.
+    Every fast success raises the rate and concurrency additively, while 429s, timeouts
+    and connection errors halve them and slow responses trim them slightly."""
+
+    def __init__(self, rate: float = None, concurrency: float = None,
+                 target_latency: float = TARGET_LATENCY):
+        self.rate = rate or float(os.getenv("SCRAPE_START_RATE", DEFAULT_RATE))
+        self.concurrency = concurrency or DEFAULT_CONCURRENCY
+        self.target_latency = target_latency
+        self.tokens = 1.0
+        self.in_flight = 0
+        self.successes = 0
+        self.throttled = 0
+        self._last_refill = time.monotonic()
+        self._condition = threading.Condition()
+
+    def _refill(self) -> None:
+        """Returns None, but adds the tokens earned since the last refill."""
+        now = time.monotonic()
+        burst = max(1.0, self.rate)
+        self.tokens = min(burst, self.tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def acquire(self) -> None:
+        """Returns None once a request may start, blocking until both a token
+        and a concurrency slot are free."""
+        with self._condition:
+            while True:
+                self._refill()
+                has_slot = self.in_flight < int(self.concurrency)
+                if has_slot and self.tokens >= 1:
+                    self.tokens -= 1
+                    self.in_flight += 1
+                    return
+                self._condition.wait((1 - self.tokens) / self.rate if has_slot else None)
+
+    def release(self, latency: float, throttled: bool = False) -> None:
+        """Returns None, but frees the request's slot and adapts the limits to its outcome."""
+        with self._condition:
+            self.in_flight -= 1
+            if throttled:
+                self.throttled += 1
+                self.rate = max(MIN_RATE, self.rate * THROTTLE_DECREASE)
+                self.concurrency = max(MIN_CONCURRENCY,
+                                       self.concurrency * THROTTLE_DECREASE)
+                self.tokens = min(self.tokens, 0.0)
+            elif latency > self.target_latency:
+                self.concurrency = max(MIN_CONCURRENCY,
+                                       self.concurrency * LATENCY_DECREASE)
+            else:
+                self.successes += 1
+                self.rate = min(MAX_RATE, self.rate + 1 / self.rate)
+                self.concurrency = min(MAX_CONCURRENCY,
+                                       self.concurrency + 1 / self.concurrency)
+            self._condition.notify_all()
+
+    def call(self, func, *args):
+        """Returns func(*args), run once the limiter allows it.
+        Timeouts, connection errors and 429 responses are reported as throttling and
+        re-raised."""
+        self.acquire()
+        started_at = time.monotonic()
+        throttled = False
+        try:
+            return func(*args)
+        except Exception as error:
+            throttled = is_throttle_error(error)
+            raise
+        finally:
+            self.release(time.monotonic() - started_at, throttled)
+
+    def report(self) -> dict:
+        """Returns the current limits and outcome counts, and logs them."""
+        logger = get_logger()
+        logger.info("Scrape rate limit: %.1f req/s, concurrency %.1f "
+                    "(%s fast successes, %s throttled)",
+                    self.rate, self.concurrency, self.successes, self.throttled)
+        return {"rate": self.rate, "concurrency": self.concurrency,
+                "successes": self.successes, "throttled": self.throttled}
+
+
+def get_rate_limiter() -> AdaptiveRateLimiter:
+    """Returns the limiter shared by every scrape in this process, so learned limits
+    carry over between warm invocations."""
+    global _RATE_LIMITER  # pylint: disable=global-statement
+    with _RATE_LIMITER_LOCK:
+        if _RATE_LIMITER is None:
+            _RATE_LIMITER = AdaptiveRateLimiter()
+        return _RATE_LIMITER
@@ -0,0 +1,168 @@
+"""Script for remembering recently loaded sales, so overlapping salesfeed windows
+don't send the same events through scraping and loading again."""
+
+import os
+import threading
+from datetime import datetime, timedelta
+from decimal import Decimal
+from hashlib import blake2b
+from os import environ as ENV
+
+import psycopg2
+
+from utilities import get_logger
+from load import get_db_connection, COUNTRY_LEN
+from salesfeed import SaleItem
+from record_transform import standardize_dates
+
+DEFAULT_WINDOW = 60 * 60
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+RECENT_EVENTS_SQL = """
+SELECT s.utc_date, c.country_name, item.url, item.sold_for
+FROM sale s
+JOIN country c USING (country_id)
+JOIN (
+    SELECT sale_id, url, sold_for
+    FROM sale_track_assignment JOIN track USING (track_id)
+    UNION ALL
+    SELECT sale_id, url, sold_for
+    FROM sale_album_assignment JOIN album USING (album_id)
+    UNION ALL
+    SELECT sale_id, url, sold_for
+    FROM sale_merchandise_assignment JOIN merchandise USING (merchandise_id)
+) item USING (sale_id)
+WHERE s.utc_date >= (NOW() AT TIME ZONE 'UTC') - %(window)s * INTERVAL '1 second'
+"""
+
+_RECENT_EVENTS = None
+_RECENT_EVENTS_LOCK = threading.Lock()
+
+
+def format_amount(amount) -> str:
+    """Returns the amount without trailing zeros, so 8, 8.0 and Decimal('8.00') match."""
+    if amount is None:
+        return ""
+    number = Decimal(repr(amount)) if isinstance(amount, float) else Decimal(amount)
+    return format(number.normalize(), "f")
+
+
+def get_event_key(utc_us: int, country: str, url: str, amount) -> int:
+    """Returns a 64-bit key for a sale made at utc_us (epoch microseconds).
+    Times are compared to the microsecond, the precision sale.utc_date and the
+    database's sale_event_key keep, so sales a few microseconds apart stay distinct."""
+    text = f"{utc_us}|{(country or '')[:COUNTRY_LEN]}|{url or ''}|{format_amount(amount)}"
+    return int.from_bytes(blake2b(text.encode(), digest_size=8).digest(), "big")
+
+
+def get_item_time(item: SaleItem) -> int:
+    """Returns the item's time in epoch microseconds, rounded as the loader rounds it
+    before storing it in sale.utc_date."""
+    return (standardize_dates(item.utc_date).replace(tzinfo=None) - EPOCH) // MICROSECOND
+
+
+def get_item_key(item: SaleItem) -> int | None:
+    """Returns the event key for a salesfeed item, or None if it has no time."""
+    if item.utc_date is None:
+        return None
+    return get_event_key(get_item_time(item), item.country, item.url, item.amount_paid_usd)
+
+
+def get_row_key(row: dict) -> tuple[int, int]:
+    """Returns the event key and epoch microseconds of a sale read by RECENT_EVENTS_SQL."""
+    utc_us = (row["utc_date"] - EPOCH) // MICROSECOND
+    return get_event_key(utc_us, row["country_name"], row["url"], row["sold_for"]), utc_us
+
+
+class RecentEvents:
+    """Time-windowed set of the event keys loaded in the last window seconds.
+    Holds only 64-bit keys and their times, and forgets events once they fall
+    more than window seconds behind the newest one seen."""
+
+    def __init__(self, window: int = None):
+        self.window = window or int(os.getenv("RECENT_EVENTS_WINDOW", DEFAULT_WINDOW))
+        self.events = {}
+        self.newest = 0
+        self.checked = 0
+        self.skipped = 0
+
+    def __len__(self) -> int:
+        return len(self.events)
+
+    def add_key(self, key: int, utc_us: int) -> None:
+        """Returns None, but remembers that the event was loaded at utc_us."""
+        self.events[key] = utc_us
+        self.newest = max(self.newest, utc_us)
+
+    def add(self, items: list[SaleItem]) -> None:
+        """Returns None, but remembers the loaded items and forgets expired events.
+        Only call this once the items are committed, or they'd never be retried."""
+        for item in items:
+            key = get_item_key(item)
+            if key is not None:
+                self.add_key(key, get_item_time(item))
+        self.expire()
+
+    def expire(self) -> int:
+        """Returns the number of events forgotten for being older than the window."""
+        cutoff = self.newest - self.window * 1_000_000
+        expired = [key for key, utc_us in self.events.items() if utc_us < cutoff]
+        for key in expired:
+            del self.events[key]
+        return len(expired)
+
+    def drop_loaded(self, items: list[SaleItem]) -> list[SaleItem]:
+        """Returns the items that haven't been loaded yet, counting the ones skipped."""
+        new_items = [item for item in items if get_item_key(item) not in self.events]
+        self.checked += len(items)
+        self.skipped += len(items) - len(new_items)
+        return new_items
+
+    def rebuild(self) -> int:
+        """Returns the number of events read after refilling the set with the sales
+        loaded in the last window seconds. Leaves it empty if the database can't be
+        reached, so nothing is skipped."""
+        logger = get_logger()
+        try:
+            conn = get_db_connection(ENV)
+        except (KeyError, psycopg2.Error):
+            logger.warning("Could not read recent events. Nothing will be skipped.")
+            return 0
+        try:
+            with conn.cursor() as cur:
+                cur.execute(RECENT_EVENTS_SQL, {"window": self.window})
+                rows = cur.fetchall()
+        except psycopg2.Error:
+            logger.warning("Could not read recent events. Nothing will be skipped.")
+            return 0
+        finally:
+            conn.close()
+        for row in rows:
+            self.add_key(*get_row_key(row))
+        self.expire()
+        logger.info("Rebuilt recent events from %s stored sales.", len(rows))
+        return len(rows)
+
+    def report(self) -> dict:
+        """Returns this run's checked and skipped counts and skip ratio, logs them
+        and starts counting afresh for the next run."""
+        logger = get_logger()
+        skip_ratio = self.skipped / self.checked if self.checked else 0
+        logger.info("Recent events: skipped %s of %s sales already loaded "
+                    "(%.0f%% skip ratio, %s events remembered)",
+                    self.skipped, self.checked, skip_ratio * 100, len(self))
+        stats = {"checked": self.checked, "skipped": self.skipped, "skip_ratio": skip_ratio}
+        self.checked = self.skipped = 0
+        return stats
+
+
+def get_recent_events() -> RecentEvents:
+    """Returns the recent events shared by every run in this process, so they carry over
+    between warm invocations. A cold start rebuilds them from the database."""
+    global _RECENT_EVENTS  # pylint: disable=global-statement
+    with _RECENT_EVENTS_LOCK:
+        if _RECENT_EVENTS is None:
+            _RECENT_EVENTS = RecentEvents()
+            _RECENT_EVENTS.rebuild()
+        return _RECENT_EVENTS
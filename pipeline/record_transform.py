@@ -0,0 +1,44 @@
+"""Script for the parts of the transform that work on single values.
+Kept free of pandas, so the small-batch record path can use them without importing it."""
+import re
+from datetime import datetime, UTC
+from utilities import get_logger
+
+COLUMN_RENAMES = {"country": "country_name", "album_title": "album_name",
+                  "track_title": "track_name",
+                  "amount_paid_usd": "sold_for", "genres": "tag_names"
+                  }
+RELEASE_DATE_PATTERN = r"released\s+([A-Za-z]+\s+\d{1,2},\s+\d{4})"
+RELEASE_DATE_FORMAT = "%B %d, %Y"
+REQUIRED_COLUMNS = [
+    "utc_date", "item_type", "album_name", "artist_name", "item_description",
+    "tag_names", "sold_for", "release_date", "country_name", "slug_type", "url", "art_url"
+]
+
+
+def standardize_dates(date: float) -> datetime:
+    """Converts a UTC timestamp string to a datetime object."""
+    logger = get_logger()
+
+    if not isinstance(date, (float, int)):
+        logger.critical(
+            "Date object must be a float or int before standardizing.")
+        raise TypeError(
+            "Date object must be a float or int before standardizing.")
+
+    return datetime.fromtimestamp(float(date), tz=UTC)
+
+
+def standardize_release_date(date: str) -> datetime:
+    """Converts a string like 'released June 3, 2025' into a datetime object."""
+    logger = get_logger()
+
+    if not isinstance(date, str):
+        logger.critical("Release date must be a string.")
+        raise TypeError("Release date must be a string.")
+
+    match = re.search(RELEASE_DATE_PATTERN, date)
+    if match:
+        return datetime.strptime(match.group(1), RELEASE_DATE_FORMAT)
+    logger.critical("Invalid release date format: %s", date)
+    raise ValueError(f"Invalid release date format: {date}")
@@ -0,0 +1,101 @@
+"""Script for decoding salesfeed API payloads into compact typed records."""
+# pylint: disable=import-outside-toplevel
+from __future__ import annotations
+
+import json
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import pyarrow as pa
+
+SALE_ITEM_FIELDS = (
+    "addl_count", "album_title", "amount_paid", "amount_paid_fmt", "amount_paid_usd",
+    "art_id", "art_url", "artist_name", "country", "country_code", "currency", "genres",
+    "item_description", "item_price", "item_type", "package_image_id", "release_date",
+    "releases", "slug_type", "track_album_slug_text", "url", "utc_date",
+)
+_SALE_ITEM_FIELD_SET = frozenset(SALE_ITEM_FIELDS)
+
+
+class SaleItem:
+    """One item sold in a salesfeed event, stored in fixed slots instead of a dict.
+    Keys outside SALE_ITEM_FIELDS are dropped; missing ones are None."""
+
+    __slots__ = SALE_ITEM_FIELDS
+
+    def __init__(self, pairs=()):
+        for field in SALE_ITEM_FIELDS:
+            setattr(self, field, None)
+        for key, value in pairs:
+            if key in _SALE_ITEM_FIELD_SET:
+                setattr(self, key, value)
+
+    @classmethod
+    def from_mapping(cls, mapping: dict) -> "SaleItem":
+        """Returns a SaleItem holding the values of an already decoded item dict."""
+        return cls(mapping.items())
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, SaleItem):
+            return NotImplemented
+        return all(getattr(self, field) == getattr(other, field)
+                   for field in SALE_ITEM_FIELDS)
+
+    def __repr__(self) -> str:
+        return f"SaleItem(url={self.url!r}, item_type={self.item_type!r})"
+
+
+def salesfeed_pairs_hook(pairs: list[tuple]) -> dict | SaleItem:
+    """Returns a SaleItem for JSON objects that describe a sold item, and a dict otherwise.
+    Used as the json object_pairs_hook so items never exist as dicts."""
+    for key, _ in pairs:
+        if key == "item_type":
+            return SaleItem(pairs)
+    return dict(pairs)
+
+
+def decode_salesfeed(content: bytes | str) -> dict:
+    """Returns the salesfeed payload with every event item decoded as a SaleItem."""
+    return json.loads(content, object_pairs_hook=salesfeed_pairs_hook)
+
+
+def items_to_columns(items: list[SaleItem],
+                     fields: list[str] = SALE_ITEM_FIELDS) -> dict[str, list]:
+    """Returns the items as one list per field, in the order given.
+    Only the requested fields are materialised.
+    A falsy addl_count is stored as None, matching the csv output."""
+    columns = {field: [getattr(item, field) for item in items]
+               for field in fields}
+    if "addl_count" in columns:
+        columns["addl_count"] = [count or None for count in columns["addl_count"]]
+    return columns
+
+
+def columns_to_rows(columns: dict[str, list]) -> list[dict]:
+    """Returns column lists as one dict per row, for writers that need rows."""
+    keys = list(columns)
+    return [dict(zip(keys, values)) for values in zip(*columns.values())]
+
+
+def get_sale_item_schema() -> pa.Schema:
+    """Returns the parquet schema for every salesfeed field.
+    Built on demand, so decoding records doesn't import pyarrow."""
+    import pyarrow as pa
+    return pa.schema([
+        ("addl_count", pa.int64()), ("album_title", pa.string()),
+        ("amount_paid", pa.float64()), ("amount_paid_fmt", pa.string()),
+        ("amount_paid_usd", pa.float64()), ("art_id", pa.int64()), ("art_url", pa.string()),
+        ("artist_name", pa.string()), ("country", pa.string()), ("country_code", pa.string()),
+        ("currency", pa.string()), ("genres", pa.list_(pa.string())),
+        ("item_description", pa.string()), ("item_price", pa.float64()),
+        ("item_type", pa.string()), ("package_image_id", pa.int64()),
+        ("release_date", pa.string()), ("releases", pa.int64()), ("slug_type", pa.string()),
+        ("track_album_slug_text", pa.string()), ("url", pa.string()), ("utc_date", pa.float64()),
+    ])
+
+
+def get_columns_schema(columns: dict[str, list]) -> pa.Schema:
+    """Returns the parquet schema for a set of salesfeed columns, in their order."""
+    import pyarrow as pa
+    schema = get_sale_item_schema()
+    return pa.schema([schema.field(name) for name in columns])
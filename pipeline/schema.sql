@@ -1,3 +1,4 @@
+DROP TABLE IF EXISTS etl_watermark;
 DROP TABLE IF EXISTS album_tag_assignment;
 DROP TABLE IF EXISTS track_tag_assignment;
 DROP TABLE IF EXISTS artist_merchandise_assignment;
@@ -13,6 +14,7 @@ DROP TABLE IF EXISTS sale;
 DROP TABLE IF EXISTS artist;
 DROP TABLE IF EXISTS tag;
 DROP TABLE IF EXISTS country;
+DROP FUNCTION IF EXISTS sale_event_key;
 
 CREATE TABLE country (
     country_id BIGINT GENERATED ALWAYS AS IDENTITY,
@@ -62,13 +64,29 @@ CREATE TABLE track (
     PRIMARY KEY (track_id)
 );
 
+-- Identifies a purchase by when, where, what and how much, so the same event
+-- loaded twice (retries, overlapping windows) maps to the same key.
+CREATE FUNCTION sale_event_key(utc_date TIMESTAMP, country_id BIGINT, url TEXT, sold_for NUMERIC)
+RETURNS UUID
+LANGUAGE SQL IMMUTABLE
+AS $$
+    SELECT md5(concat_ws('|',
+        to_char(utc_date, 'YYYY-MM-DD HH24:MI:SS.US'),
+        country_id,
+        COALESCE(url, ''),
+        COALESCE(trim_scale(sold_for)::TEXT, '')))::UUID
+$$;
+
 CREATE TABLE sale (
     sale_id BIGINT GENERATED ALWAYS AS IDENTITY,
     utc_date TIMESTAMP NOT NULL,
     country_id BIGINT NOT NULL,
+    event_key UUID NOT NULL,
     PRIMARY KEY (sale_id),
     FOREIGN KEY (country_id) REFERENCES country (country_id)
 );
+CREATE UNIQUE INDEX unique_sale_event_key ON sale (event_key);
+CREATE INDEX sale_utc_date ON sale (utc_date);
 
 -- Sale assignment tables 
 
@@ -163,6 +181,15 @@ CREATE TABLE album_tag_assignment (
     UNIQUE (tag_id, album_id)
 );
 
+-- ETL bookkeeping
+
+CREATE TABLE etl_watermark (
+    pipeline_name VARCHAR(50) NOT NULL,
+    high_water_mark BIGINT NOT NULL,
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (pipeline_name)
+);
+
 ALTER SEQUENCE country_country_id_seq RESTART WITH 1;
 ALTER SEQUENCE artist_artist_id_seq RESTART WITH 1;
 ALTER SEQUENCE tag_tag_id_seq RESTART WITH 1;
@@ -0,0 +1,103 @@
+"""Script for caching scraped release dates and genres between ETL runs."""
+
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import time
+
+from utilities import get_logger
+
+DEFAULT_CACHE_PATH = os.path.join(tempfile.gettempdir(),
+                                  "bandcamp_scrape_cache.sqlite3")
+DEFAULT_CACHE_TTL = 7 * 24 * 60 * 60
+DEFAULT_CACHE_MAX_ENTRIES = 50000
+
+CACHE_DDL = """
+CREATE TABLE IF NOT EXISTS scrape_cache(
+  url           TEXT PRIMARY KEY,
+  release_date  TEXT,
+  genres        TEXT NOT NULL,
+  scraped_at    REAL NOT NULL,
+  last_used     REAL NOT NULL);
+
+CREATE INDEX IF NOT EXISTS scrape_cache_last_used ON scrape_cache (last_used);
+"""
+
+
+def normalise_cache_url(url: str) -> str:
+    """Returns the item url reduced to a scheme-less, lowercase-host cache key."""
+    if not isinstance(url, str):
+        raise TypeError("Cache url must be a string.")
+    url = re.sub(r'^(https?:)?//', '', url.strip())
+    url = re.split(r'[?#]', url, maxsplit=1)[0].rstrip('/')
+    host, _, path = url.partition('/')
+    return f"{host.lower()}/{path}"
+
+
+class ScrapeCache:
+    """SQLite-backed cache of scraped item details, keyed on the normalised item url.
+    Entries expire after ttl seconds and the least recently used entries are
+    evicted once the cache grows past max_entries."""
+
+    def __init__(self, path: str = None, ttl: int = None, max_entries: int = None):
+        self.path = path or os.getenv("SCRAPE_CACHE_PATH", DEFAULT_CACHE_PATH)
+        self.ttl = ttl or int(os.getenv("SCRAPE_CACHE_TTL", DEFAULT_CACHE_TTL))
+        self.max_entries = max_entries or int(
+            os.getenv("SCRAPE_CACHE_MAX_ENTRIES", DEFAULT_CACHE_MAX_ENTRIES))
+        self.hits = 0
+        self.misses = 0
+        self.conn = sqlite3.connect(self.path)
+        self.conn.executescript(CACHE_DDL)
+
+    def get(self, url: str) -> dict | None:
+        """Returns the cached details for url, or None if missing or expired."""
+        now = time.time()
+        key = normalise_cache_url(url)
+        row = self.conn.execute(
+            "SELECT release_date, genres FROM scrape_cache WHERE url = ? AND scraped_at > ?",
+            (key, now - self.ttl)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.conn.execute(
+            "UPDATE scrape_cache SET last_used = ? WHERE url = ?", (now, key))
+        return {"release_date": row[0], "genres": json.loads(row[1])}
+
+    def set(self, url: str, details: dict) -> None:
+        """Returns None, but stores the scraped details for url."""
+        now = time.time()
+        self.conn.execute(
+            """INSERT OR REPLACE INTO scrape_cache
+            (url, release_date, genres, scraped_at, last_used)
+            VALUES (?, ?, ?, ?, ?)""",
+            (normalise_cache_url(url), details.get("release_date"),
+             json.dumps(details.get("genres") or []), now, now))
+
+    def evict(self) -> int:
+        """Returns the number of entries removed for being expired or over the size limit."""
+        cur = self.conn.execute(
+            "DELETE FROM scrape_cache WHERE scraped_at <= ?", (time.time() - self.ttl,))
+        removed = cur.rowcount
+        cur = self.conn.execute(
+            """DELETE FROM scrape_cache WHERE url IN (
+                SELECT url FROM scrape_cache ORDER BY last_used DESC
+                LIMIT -1 OFFSET ?)""", (self.max_entries,))
+        return removed + cur.rowcount
+
+    def report(self) -> dict:
+        """Returns the hit and miss counts for this run and logs them."""
+        logger = get_logger()
+        lookups = self.hits + self.misses
+        hit_rate = self.hits / lookups if lookups else 0
+        logger.info("Scrape cache: %s hits, %s misses (%.0f%% hit rate)",
+                    self.hits, self.misses, hit_rate * 100)
+        return {"hits": self.hits, "misses": self.misses}
+
+    def close(self) -> None:
+        """Returns None, but evicts stale entries and saves the cache to disk."""
+        self.evict()
+        self.conn.commit()
+        self.conn.close()
@@ -0,0 +1,234 @@
+"""Script for building the staging COPY rows straight from extracted sales.
+Small batches skip the DataFrame stages of transform and load entirely, while
+writing exactly the same stage_sale and stage_tag CSV as the pandas path.
+Larger batches go from the extract frame to the staging frames in one fused pass,
+and extract files too large for memory are streamed through it in chunks.
+pandas is only imported once a frame is built, so small batches never import it."""
+# pylint: disable=import-outside-toplevel
+from __future__ import annotations
+
+import csv
+import io
+import os
+import sys
+from typing import TYPE_CHECKING
+
+from load import (SALE_COLS, TAG_COLS, TAG_LEN, ARTIST_LEN, COUNTRY_LEN, NAME_LEN,
+                  build_frames, load_stage_frames, load_stage_chunks, load_staging_csv,
+                  get_stage_tag_path, advance_watermark)
+from salesfeed import SaleItem
+from record_transform import standardize_dates, standardize_release_date
+from utilities import get_logger, set_logger, iter_data_chunks, CHUNK_ROWS
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+SMALL_BATCH_ROWS = int(os.getenv("SMALL_BATCH_ROWS", "1000"))
+FILE_CHUNK_ROWS = CHUNK_ROWS or 100000
+
+
+class StageSale:
+    """One stage_sale row plus the tags of the item sold, stored in fixed slots."""
+
+    __slots__ = tuple(SALE_COLS) + ("tag_names",)
+
+    def to_copy_row(self, format_sold_for) -> list[str]:
+        """Returns the row as the strings DataFrame.to_csv would write for it."""
+        return [
+            str(self.utc_date),
+            format_text(self.country_name, COUNTRY_LEN),
+            format_text(self.artist_name, ARTIST_LEN),
+            format_text(self.track_name),
+            format_text(self.album_name),
+            format_text(self.merch_name),
+            format_text(self.slug_type),
+            format_text(self.item_type),
+            format_text(self.url),
+            format_text(self.art_url),
+            self.release_date.strftime("%Y-%m-%d") if self.release_date else "",
+            format_sold_for(self.sold_for),
+        ]
+
+
+def is_missing(value) -> bool:
+    """Returns True for the values pandas treats as missing (None and NaN)."""
+    return value is None or (isinstance(value, float) and value != value)
+
+
+def format_text(value, length: int = None) -> str:
+    """Returns a text value as written to CSV, cut to length if given."""
+    if is_missing(value):
+        return ""
+    return str(value)[:length]
+
+
+def truncate_name(value) -> str | None:
+    """Returns a name cut to NAME_LEN, or None if it isn't a string."""
+    return value[:NAME_LEN] if isinstance(value, str) else None
+
+
+def format_tag(tag) -> str:
+    """Returns a tag stripped, lowercased and cut to TAG_LEN.
+    Lowercases one character at a time (as pyarrow does), so 'İ' and a final 'Σ'
+    map to the same letters the pandas path writes."""
+    tag = str(tag).strip().replace("İ", "i").replace("Σ", "σ")
+    return tag.lower()[:TAG_LEN]
+
+
+def get_sold_for_formatter(amounts: list):
+    """Returns a function formatting sold_for the way to_csv formats the column pandas
+    would infer from all the amounts: ints if every amount is an int, floats otherwise."""
+    if all(isinstance(amount, int) and not isinstance(amount, bool) for amount in amounts):
+        return str
+    if all(is_missing(amount) or isinstance(amount, (int, float)) for amount in amounts):
+        return lambda amount: "" if is_missing(amount) else repr(float(amount))
+    return format_text
+
+
+def standardize_utc_date(date):
+    """Returns the utc_date as a datetime, raising like standardize_date_series."""
+    logger = get_logger()
+    if is_missing(date):
+        logger.critical("Dates cannot be NaN before standardizing.")
+        raise ValueError("Dates cannot be NaN before standardizing.")
+    return standardize_dates(date)
+
+
+def build_stage_sales(items: list[SaleItem]) -> list[StageSale]:
+    """Returns the stage_sale rows for the items, cleaned as clean_dataframe and
+    build_frames would: items without an artist are dropped, album names fall back
+    to the description, and the rows are in utc_date order."""
+    sales = []
+    for item in items:
+        if is_missing(item.artist_name):
+            continue
+        sale = StageSale()
+        sale.utc_date = standardize_utc_date(item.utc_date)
+        sale.country_name = item.country
+        sale.artist_name = item.artist_name
+        sale.slug_type, sale.item_type = item.slug_type, item.item_type
+        sale.url, sale.art_url = item.url, item.art_url
+        sale.release_date = (standardize_release_date(item.release_date)
+                             if isinstance(item.release_date, str) else None)
+        sale.sold_for = item.amount_paid_usd
+        sale.tag_names = item.genres
+
+        description = "" if is_missing(item.item_description) else item.item_description
+        is_track = item.slug_type == "t" and item.item_type == "t"
+        is_album = item.slug_type == "a" and item.item_type in ("a", "p")
+        is_merch = item.slug_type == "p" and item.item_type == "p"
+        sale.track_name = truncate_name(description) if is_track else None
+        sale.merch_name = truncate_name(description) if is_merch else None
+        if not is_album:
+            sale.album_name = None
+        elif item.item_type == "p":
+            sale.album_name = truncate_name(item.album_title)
+        else:
+            sale.album_name = truncate_name(description or "Unknown Album")
+        sales.append(sale)
+
+    sales.sort(key=lambda sale: sale.utc_date)
+    return sales
+
+
+def build_stage_tags(sales: list[StageSale]) -> list[tuple[str, str]]:
+    """Returns one (url, tag_name) row per tag of each sale, in sale order."""
+    return [(sale.url, format_tag(tag))
+            for sale in sales if not is_missing(sale.url) and sale.tag_names
+            for tag in sale.tag_names if not is_missing(tag)]
+
+
+def write_csv(rows: list[list]) -> str:
+    """Returns the rows as headerless CSV text, quoted like DataFrame.to_csv."""
+    buf = io.StringIO()
+    csv.writer(buf, lineterminator=os.linesep).writerows(rows)
+    return buf.getvalue()
+
+
+def build_stage_csv(items: list[SaleItem]) -> tuple[str, str, int]:
+    """Returns the stage_sale CSV, the stage_tag CSV and the number of sales for the items.
+    The text matches what copy_df writes for build_frames(clean_dataframe(...))."""
+    format_sold_for = get_sold_for_formatter([item.amount_paid_usd for item in items])
+    sales = build_stage_sales(items)
+    sales_csv = write_csv([sale.to_copy_row(format_sold_for) for sale in sales])
+    tags_csv = write_csv(build_stage_tags(sales))
+    return sales_csv, tags_csv, len(sales)
+
+
+def run_load_items(items: list[SaleItem], high_water_mark: int = None) -> None:
+    """Returns None, but transforms and loads a batch of salesfeed records without pandas.
+    If there is nothing to load, only the high-water mark is saved."""
+    logger = get_logger()
+    sales_csv, tags_csv, row_count = build_stage_csv(items)
+    if not row_count:
+        logger.info("Nothing to load")
+        if high_water_mark is not None:
+            advance_watermark(high_water_mark)
+        return
+    load_staging_csv(sales_csv, tags_csv, row_count, high_water_mark)
+
+
+def build_stage_frames(df: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Returns the stage_sale and stage_tag frames for an extract frame, the same as
+    build_frames(clean_dataframe(df)) but without building the cleaned frame:
+    each column is converted once, album names aren't filled in twice and the
+    dates transform parsed aren't parsed again."""
+    import pandas as pd
+    from transform import clean_columns
+    logger = get_logger()
+    if df.empty:
+        logger.critical("DataFrame cannot be empty before cleaning...")
+        raise KeyError("DataFrame cannot be empty before cleaning...")
+
+    columns, order = clean_columns(df, fill_album_names=False)
+    ordered_df = pd.DataFrame(columns, copy=False)
+    if order is not None:
+        ordered_df = ordered_df.take(order)
+    return build_frames(ordered_df)
+
+
+def run_load_frame(df: pd.DataFrame, high_water_mark: int = None) -> int:
+    """Returns the number of sales loaded after transforming and loading an extract
+    frame with build_stage_frames."""
+    sales, tags = build_stage_frames(df)
+    load_stage_frames(sales, tags, high_water_mark)
+    return len(sales)
+
+
+def run_load_file(file_path: str, chunk_rows: int = FILE_CHUNK_ROWS,
+                  high_water_mark: int = None) -> int:
+    """Returns the number of sales loaded after streaming an extract .parquet or .csv
+    file through build_stage_frames and into staging chunk_rows at a time.
+    Only one chunk is held in memory; the dimension upserts run once at the end."""
+    return load_stage_chunks((build_stage_frames(chunk)
+                              for chunk in iter_data_chunks(file_path, chunk_rows)),
+                             high_water_mark)
+
+
+def export_stage_files(file_path: str, sales_path: str,
+                       chunk_rows: int = FILE_CHUNK_ROWS) -> int:
+    """Returns the number of sales exported after streaming an extract file through
+    build_stage_frames into a stage_sale CSV at sales_path and a stage_tag CSV beside it.
+    run_load copies files like these straight into staging, so replays skip pandas."""
+    logger = get_logger()
+    tags_path = get_stage_tag_path(sales_path)
+    row_count = 0
+    for i, chunk in enumerate(iter_data_chunks(file_path, chunk_rows)):
+        sales, tags = build_stage_frames(chunk)
+        sales.to_csv(sales_path, index=False, columns=SALE_COLS,
+                     mode="a" if i else "w", header=not i)
+        tags.to_csv(tags_path, index=False, columns=TAG_COLS,
+                    mode="a" if i else "w", header=not i)
+        row_count += len(sales)
+    logger.info("Exported %s sales to %s", row_count, sales_path)
+    return row_count
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (2, 3):
+        sys.exit(1)
+    set_logger()
+    if len(sys.argv) == 3:
+        export_stage_files(sys.argv[1], sys.argv[2])
+    else:
+        run_load_file(sys.argv[1])
@@ -0,0 +1,125 @@
+# pylint: skip-file
+
+"""Test file for the backfill script."""
+
+from concurrent.futures import ThreadPoolExecutor
+from threading import BoundedSemaphore
+from unittest.mock import patch
+import pytest
+from backfill import (split_windows, load_checkpoint, save_checkpoint,
+                      process_window, run_backfill, parse_timestamp,
+                      get_enriched_items_limited)
+
+
+class TestSplitWindows:
+    """Tests for split_windows."""
+
+    def test_split_windows_covers_range(self):
+        """Tests that windows are consecutive and the last one is clipped to the end."""
+        assert split_windows(0, 1500, 600) == [(0, 600), (600, 1200), (1200, 1500)]
+
+    @pytest.mark.parametrize("start, end", ((100, 100), (100, 50), (-10, 50)))
+    def test_split_windows_rejects_invalid_range(self, start, end):
+        """Tests that empty, reversed or negative ranges are rejected."""
+        with pytest.raises(ValueError):
+            split_windows(start, end)
+
+    def test_split_windows_rejects_invalid_type(self):
+        """Tests that non-integer times are rejected."""
+        with pytest.raises(TypeError):
+            split_windows("2025-06-01", 100)
+
+
+class TestCheckpoint:
+    """Tests for load_checkpoint and save_checkpoint."""
+
+    def test_checkpoint_round_trip(self, tmp_path):
+        """Tests that saved windows are read back."""
+        path = str(tmp_path / "checkpoint.json")
+        save_checkpoint(path, {600, 0})
+        assert load_checkpoint(path) == {0, 600}
+
+    def test_load_checkpoint_missing_file(self, tmp_path):
+        """Tests that a missing checkpoint means nothing is done yet."""
+        assert load_checkpoint(str(tmp_path / "missing.json")) == set()
+
+
+class TestProcessWindow:
+    """Tests for process_window."""
+
+    @patch("backfill.load_stage_frames")
+    @patch("backfill.build_stage_frames", side_effect=lambda df: (df, df))
+    @patch("backfill.collect_api_columns")
+    @patch("backfill.fetch_new_api_data")
+    def test_process_window_drops_events_past_window_end(self, fake_fetch, fake_collect,
+                                                         fake_build, fake_load):
+        """Tests that events belonging to the next window are left for it."""
+        fake_fetch.return_value = {"start_date": 0, "events": [
+            {"utc_date": 100, "items": [{"url": "a"}]},
+            {"utc_date": 700, "items": [{"url": "b"}]}]}
+        fake_collect.return_value = {"url": ["a"]}
+        assert process_window((0, 600)) == 1
+        collected_events = fake_collect.call_args.args[0]["events"]
+        assert [event["utc_date"] for event in collected_events] == [100]
+        fake_load.assert_called_once()
+        assert fake_collect.call_args.kwargs["lookup_enriched"] is get_enriched_items_limited
+
+    @patch("backfill.load_stage_frames")
+    @patch("backfill.fetch_new_api_data", side_effect=ValueError("no data"))
+    def test_process_window_without_data_loads_nothing(self, fake_fetch, fake_load):
+        """Tests that an empty window counts as done with no events."""
+        assert process_window((0, 600)) == 0
+        fake_load.assert_not_called()
+
+    def test_get_enriched_items_limited_holds_db_slot(self):
+        """Tests that the stored item lookup waits for a free DB slot."""
+        semaphore = BoundedSemaphore(1)
+
+        def lookup(urls):
+            assert not semaphore.acquire(blocking=False)
+            return {url: {} for url in urls}
+
+        with patch("backfill._DB_SEMAPHORE", semaphore), \
+                patch("backfill.get_enriched_items", side_effect=lookup) as fake_lookup:
+            assert get_enriched_items_limited(["a"]) == {"a": {}}
+        fake_lookup.assert_called_once_with(["a"])
+        assert semaphore.acquire(blocking=False)
+
+
+class TestRunBackfill:
+    """Tests for run_backfill."""
+
+    @patch("backfill.ProcessPoolExecutor", ThreadPoolExecutor)
+    @patch("backfill.process_window", return_value=5)
+    def test_run_backfill_skips_checkpointed_windows(self, fake_process_window, tmp_path):
+        """Tests that finished windows are skipped and new ones checkpointed."""
+        path = str(tmp_path / "checkpoint.json")
+        save_checkpoint(path, {0})
+        summary = run_backfill(0, 1800, workers=2, checkpoint_path=path)
+        assert fake_process_window.call_count == 2
+        assert summary["events"] == 10
+        assert summary["failed"] == 0
+        assert load_checkpoint(path) == {0, 600, 1200}
+
+    @patch("backfill.ProcessPoolExecutor", ThreadPoolExecutor)
+    @patch("backfill.process_window", side_effect=[RuntimeError("boom"), 3])
+    def test_run_backfill_failed_windows_are_not_checkpointed(self, fake_process_window,
+                                                              tmp_path):
+        """Tests that a failed window is retried on the next run."""
+        path = str(tmp_path / "checkpoint.json")
+        summary = run_backfill(0, 1200, workers=1, checkpoint_path=path)
+        assert summary["failed"] == 1
+        assert len(load_checkpoint(path)) == 1
+
+
+class TestParseTimestamp:
+    """Tests for parse_timestamp."""
+
+    @pytest.mark.parametrize("value, expected", (
+        ("1749583860", 1749583860),
+        ("2025-06-10T19:31:00", 1749583860),
+        ("2025-06-10T20:31:00+01:00", 1749583860),
+    ))
+    def test_parse_timestamp(self, value, expected):
+        """Tests that epoch and ISO inputs are converted to epoch seconds in UTC."""
+        assert parse_timestamp(value) == expected
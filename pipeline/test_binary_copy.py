@@ -0,0 +1,134 @@
+"""Test file for the binary_copy script."""
+
+# pylint: skip-file
+
+import struct
+from datetime import datetime, date, timedelta
+from unittest.mock import MagicMock
+
+import pytest
+import pandas as pd
+
+from binary_copy import (CopyStream, encode_numeric, encode_text, encode_columns,
+                         iter_copy_chunks, COPY_SIGNATURE)
+from load import copy_df, build_frames, SALE_COLS, STAGE_COLUMN_TYPES
+
+
+def decode_copy(data: bytes, types: list[str]) -> list[list]:
+    """Returns the rows in binary COPY data, decoded by column type."""
+    assert data.startswith(COPY_SIGNATURE)
+    pos, rows = len(COPY_SIGNATURE), []
+    while True:
+        (field_count,) = struct.unpack_from("!h", data, pos)
+        pos += 2
+        if field_count == -1:
+            assert pos == len(data)
+            return rows
+        row = []
+        for column_type in types[:field_count]:
+            (length,) = struct.unpack_from("!i", data, pos)
+            pos += 4
+            field = data[pos:pos + max(length, 0)]
+            pos += max(length, 0)
+            if length == -1:
+                row.append(None)
+            elif column_type == "timestamp":
+                row.append(datetime(2000, 1, 1)
+                           + timedelta(microseconds=struct.unpack("!q", field)[0]))
+            elif column_type == "date":
+                row.append(date(2000, 1, 1) + timedelta(days=struct.unpack("!i", field)[0]))
+            elif column_type == "numeric":
+                row.append(field)
+            else:
+                row.append(field.decode())
+        rows.append(row)
+
+
+class TestEncodeNumeric:
+    """Tests for the NUMERIC encoder."""
+
+    @pytest.mark.parametrize("value, expected", [
+        (8, (1, 0, 0, 0, 8)),
+        (8.0, (1, 0, 0, 1, 8)),
+        (2.02, (2, 0, 0, 2, 2, 200)),
+        (-1234567.5, (3, 1, 0x4000, 1, 123, 4567, 5000)),
+        (0.0005, (1, -1, 0, 4, 5)),
+        (1e16, (1, 4, 0, 0, 1)),
+        (-0.0, (0, 0, 0, 1)),
+    ])
+    def test_encode_numeric_matches_postgres_layout(self, value, expected):
+        """Tests the digit groups, weight, sign and scale of encoded numbers."""
+        encoded = encode_numeric(value)
+        assert struct.unpack(f"!{len(encoded) // 2}h", encoded) == expected
+
+
+class TestEncodeColumns:
+    """Tests for encoding DataFrame columns."""
+
+    def test_encode_text_sends_empty_strings_as_null(self):
+        """Tests that empty and missing text become NULL, as with the CSV path."""
+        prefixes, data = encode_text(pd.Series(["rock", "", None]))
+        assert prefixes.to_pylist() == [b"\x00\x00\x00\x04", b"\xff\xff\xff\xff",
+                                        b"\xff\xff\xff\xff"]
+        assert data.to_pylist() == [b"rock", b"", None]
+
+    def test_encode_text_accepts_categoricals(self):
+        """Tests that categorical text columns are decoded before encoding."""
+        _, data = encode_text(pd.Series(["a", "t", "a"], dtype="category"))
+        assert data.to_pylist() == [b"a", b"t", b"a"]
+
+    def test_encode_text_rejects_numbers(self):
+        """Tests that a text column holding numbers raises a TypeError."""
+        with pytest.raises(TypeError):
+            encode_text(pd.Series(["a", 5], dtype=object))
+
+    def test_encode_columns_round_trip(self, sample_df):
+        """Tests that the staging rows decode to the values the CSV path sends."""
+        sales, _ = build_frames(sample_df.assign(
+            utc_date=pd.to_datetime(sample_df["utc_date"], unit="s", utc=True),
+            release_date=[pd.Timestamp("2023-01-18"), None]))
+        types = [STAGE_COLUMN_TYPES.get(col, "text") for col in SALE_COLS]
+        data = CopyStream(iter_copy_chunks(
+            encode_columns(sales, SALE_COLS, STAGE_COLUMN_TYPES), len(sales), chunk_rows=1))
+        rows = decode_copy(data.read(), types)
+        assert rows[0][:4] == [datetime(2025, 6, 10, 8, 6, 1, 505790), "United Kingdom",
+                               "Alex Lynch", "Thank Me Later"]
+        assert rows[0][4:6] == [None, None]
+        assert rows[0][10:] == [date(2023, 1, 18), encode_numeric(2.02)]
+        assert rows[1][10] is None
+
+
+class TestCopyStream:
+    """Tests for the CopyStream file-like object."""
+
+    def test_copy_stream_reads_across_chunks(self):
+        """Tests that sized reads walk through every chunk and then return b''."""
+        stream = CopyStream(iter([b"abc", b"", b"defg"]))
+        assert [stream.read(2) for _ in range(5)] == [b"ab", b"c", b"de", b"fg", b""]
+
+    def test_copy_stream_reads_everything(self):
+        """Tests that a negative size returns the rest of the data."""
+        stream = CopyStream(iter([b"abc", b"def"]))
+        stream.read(1)
+        assert stream.read() == b"bcdef"
+
+
+class TestCopyDf:
+    """Tests for choosing between binary and CSV COPY."""
+
+    def test_copy_df_uses_binary_format(self, sample_df):
+        """Tests that staging frames are copied in the binary format."""
+        sales, _ = build_frames(sample_df)
+        cur = MagicMock()
+        copy_df(cur, sales, "stage_sale", SALE_COLS, binary=True)
+        sql, stream = cur.copy_expert.call_args.args
+        assert sql.endswith("WITH (FORMAT binary)")
+        assert stream.read().startswith(COPY_SIGNATURE)
+
+    def test_copy_df_falls_back_to_csv(self, bad_df):
+        """Tests that frames the binary encoder rejects are copied as CSV."""
+        cur = MagicMock()
+        copy_df(cur, bad_df, "stage_sale", ["utc_date", "artist_name"], binary=True)
+        sql, buf = cur.copy_expert.call_args.args
+        assert sql.endswith("WITH CSV")
+        assert len(buf.read().splitlines()) == len(bad_df)
@@ -6,20 +6,52 @@ from unittest.mock import patch, MagicMock
 from etl_controller import (run_pipeline, etl_lambda_handler)
 
 
+@patch("etl_controller.get_recent_events")
 class TestPipeline:
     """Tests for the ETL pipeline."""
-    @patch("etl_controller.run_load")
-    @patch("etl_controller.clean_dataframe")
-    @patch("etl_controller.run_extract")
-    def test_run_pipeline(self, mock_extract, mock_clean, mock_load):
+    @patch("etl_controller.run_load_items")
+    @patch("etl_controller.run_load_frame")
+    @patch("etl_controller.items_to_dataframe")
+    @patch("etl_controller.extract_items")
+    def test_run_pipeline(self, mock_extract, mock_to_df, mock_load, mock_load_items,
+                          mock_get_recent_events):
         """Tests that each part of the etl pipeline is called at least once."""
         mock_df = MagicMock()
-        mock_extract.return_value = mock_df
-        mock_clean.return_value = mock_df
+        items = [MagicMock()] * 3
+        mock_extract.return_value = (items, 1749583860)
+        mock_to_df.return_value = mock_df
+        with patch("etl_controller.SMALL_BATCH_ROWS", 2):
+            run_pipeline()
+        mock_extract.assert_called_once_with(
+            recent_events=mock_get_recent_events.return_value)
+        mock_to_df.assert_called_once_with(items)
+        mock_load.assert_called_once_with(mock_df, 1749583860)
+        mock_load_items.assert_not_called()
+        mock_get_recent_events.return_value.add.assert_called_once_with(items)
+
+    @patch("etl_controller.run_load_items")
+    @patch("etl_controller.run_load_frame")
+    @patch("etl_controller.items_to_dataframe")
+    @patch("etl_controller.extract_items")
+    def test_run_pipeline_small_batch(self, mock_extract, mock_to_df, mock_load,
+                                      mock_load_items, mock_get_recent_events):
+        """Tests that batches below SMALL_BATCH_ROWS are loaded without pandas."""
+        items = [MagicMock()] * 3
+        mock_extract.return_value = (items, 1749583860)
+        with patch("etl_controller.SMALL_BATCH_ROWS", 4):
+            run_pipeline()
+        mock_load_items.assert_called_once_with(items, 1749583860)
+        mock_to_df.assert_not_called()
+        mock_load.assert_not_called()
+
+    @patch("etl_controller.run_load_items", side_effect=RuntimeError("boom"))
+    @patch("etl_controller.extract_items")
+    def test_run_pipeline_failed_load_is_not_remembered(self, mock_extract, mock_load_items,
+                                                        mock_get_recent_events):
+        """Tests that sales are only remembered as loaded once the load succeeds."""
+        mock_extract.return_value = ([MagicMock()], 1749583860)
         run_pipeline()
-        mock_extract.assert_called_once_with(None)
-        mock_clean.assert_called_once_with(mock_df)
-        mock_load.assert_called_once_with(mock_df)
+        mock_get_recent_events.return_value.add.assert_not_called()
 
 
 class TestLambdaHandler:
@@ -5,16 +5,32 @@
 import pytest
 import os
 import json
-from unittest.mock import patch, mock_open
+import requests
+from datetime import date
+from unittest.mock import patch, mock_open, MagicMock
 from extract import (
     get_api_request,
     fetch_api_data,
     validate_api_data,
+    format_release_date,
+    get_enriched_items,
+    scrape_item_pages,
     collect_api_rows_and_columns,
     save_to_csv,
+    save_to_parquet,
     run_extract,
-    get_time_offset
+    get_time_offset,
+    get_watermark,
+    fetch_new_api_data,
+    get_source_fields,
+    collect_api_columns,
+    collect_api_items,
+    items_to_dataframe
 )
+from recent_events import RecentEvents
+from salesfeed import SaleItem
+from transform import REQUIRED_COLUMNS
+from utilities import load_parquet_data
 
 
 class TestGetAPIRequest:
@@ -30,14 +46,14 @@ class TestGetAPIRequest:
         with pytest.raises(ValueError):
             get_api_request(-58492573)
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_get_api_request_should_deny_404(self, fake_requests):
         """Test that checks if function halts if it can't connect."""
         fake_requests.return_value.status_code = 404
         with pytest.raises(ConnectionError):
             get_api_request(24234344)
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_get_api_request_correct(self, fake_requests):
         """Test that checks if function correctly functions."""
         fake_requests.return_value.status_code = 200
@@ -72,6 +88,63 @@ class TestFetchAPIData:
             fetch_api_data(1749583860)
 
 
+class TestWatermark:
+    """Tests for get_watermark and fetch_new_api_data."""
+
+    @patch('extract.get_db_connection')
+    def test_get_watermark_returns_stored_value(self, fake_get_db_connection):
+        """Test that the stored high-water mark is returned."""
+        fake_cursor = fake_get_db_connection.return_value.cursor.return_value.__enter__.return_value
+        fake_cursor.fetchone.return_value = {"high_water_mark": 1749584460}
+        assert get_watermark() == 1749584460
+
+    @patch('extract.get_db_connection')
+    def test_get_watermark_returns_none_when_unset(self, fake_get_db_connection):
+        """Test that a fresh database has no watermark."""
+        fake_cursor = fake_get_db_connection.return_value.cursor.return_value.__enter__.return_value
+        fake_cursor.fetchone.return_value = None
+        assert get_watermark() is None
+
+    @patch('extract.get_db_connection', side_effect=KeyError('DB_HOST'))
+    def test_get_watermark_without_database_returns_none(self, fake_get_db_connection):
+        """Test that a missing database falls back to the fixed offset."""
+        assert get_watermark() is None
+
+    @patch('extract.get_api_request')
+    def test_fetch_new_api_data_single_window(self, fake_get_request, example_api_call):
+        """Test that a caught-up feed is fetched once, without an offset."""
+        example_api_call['server_time'] = example_api_call['end_date'] + 60
+        fake_get_request.return_value = example_api_call
+        result = fetch_new_api_data(1749583860)
+        fake_get_request.assert_called_once_with(1749583860, offset=0)
+        assert result['end_date'] == 1749584460
+        assert len(result['events']) == 1
+
+    @patch('extract.get_api_request')
+    def test_fetch_new_api_data_fills_gap(self, fake_get_request, example_api_call):
+        """Test that consecutive windows are fetched until the feed catches up."""
+        def fake_window(start_date, offset):
+            return example_api_call | {'start_date': start_date,
+                                       'end_date': start_date + 600,
+                                       'server_time': 1000 + 1800}
+        fake_get_request.side_effect = fake_window
+        result = fetch_new_api_data(1000)
+        assert [call.args[0] for call in fake_get_request.call_args_list] == [
+            1000, 1600, 2200]
+        assert result['start_date'] == 1000
+        assert result['end_date'] == 2800
+        assert len(result['events']) == 3
+
+    @patch('extract.get_api_request')
+    def test_fetch_new_api_data_stops_at_max_windows(self, fake_get_request, example_api_call):
+        """Test that a large gap is only partly filled in one run."""
+        fake_get_request.side_effect = lambda start_date, offset: example_api_call | {
+            'start_date': start_date, 'end_date': start_date + 600, 'server_time': 10 ** 9}
+        result = fetch_new_api_data(1000, max_windows=2)
+        assert fake_get_request.call_count == 2
+        assert result['end_date'] == 2200
+
+
 class TestValidateAPIData:
     """Tests for validate_api_data."""
 
@@ -142,6 +215,123 @@ class TestValidateAPIData:
             api_data, 'data/output.csv') == altered_file_path
 
 
+class TestGetEnrichedItems:
+    """Tests for get_enriched_items and format_release_date."""
+
+    def test_format_release_date_matches_item_page_text(self):
+        """Test that stored dates are formatted like the scraped release date."""
+        assert format_release_date(date(2024, 10, 1)) == "released October 1, 2024"
+
+    @patch('extract.get_db_connection')
+    def test_get_enriched_items_returns_rows_by_url(self, fake_get_db_connection):
+        """Test that stored items are returned keyed on their url in one query."""
+        fake_cursor = fake_get_db_connection.return_value.cursor.return_value.__enter__.return_value
+        fake_cursor.fetchall.return_value = [
+            {"url": "https://a.bandcamp.com/track/1",
+             "release_date": date(2024, 6, 11), "genres": ["pop", "rock"]}]
+        result = get_enriched_items(["https://a.bandcamp.com/track/1",
+                                     "https://a.bandcamp.com/track/2"])
+        assert result == {"https://a.bandcamp.com/track/1": {
+            "release_date": "released June 11, 2024", "genres": ["pop", "rock"]}}
+        fake_cursor.execute.assert_called_once()
+
+    @patch('extract.get_db_connection')
+    def test_get_enriched_items_accepts_merch_with_release_date_only(self,
+                                                                     fake_get_db_connection):
+        """Test that merch, which has no stored tags, is skipped on its release date alone."""
+        fake_cursor = fake_get_db_connection.return_value.cursor.return_value.__enter__.return_value
+        fake_cursor.fetchall.return_value = [
+            {"url": "https://a.bandcamp.com/merch/shirt",
+             "release_date": date(2024, 6, 11), "genres": []}]
+        result = get_enriched_items(["https://a.bandcamp.com/merch/shirt"])
+        assert result == {"https://a.bandcamp.com/merch/shirt": {
+            "release_date": "released June 11, 2024", "genres": []}}
+        sql = fake_cursor.execute.call_args.args[0]
+        assert "HAVING COUNT(tg.tag_id) > 0 OR BOOL_AND(item.is_merch)" in sql
+
+    @patch('extract.get_db_connection', side_effect=KeyError('DB_HOST'))
+    def test_get_enriched_items_without_database_returns_empty(self, fake_get_db_connection):
+        """Test that a missing database falls back to scraping everything."""
+        assert get_enriched_items(["https://a.bandcamp.com/track/1"]) == {}
+
+    def test_get_enriched_items_with_no_urls_skips_query(self):
+        """Test that an empty batch does not touch the database."""
+        with patch('extract.get_db_connection') as fake_get_db_connection:
+            assert get_enriched_items([]) == {}
+            fake_get_db_connection.assert_not_called()
+
+
+class TestScrapeItemPages:
+    """Tests for scrape_item_pages."""
+
+    @patch('extract.get_release_date_and_genres')
+    def test_scrape_item_pages_keeps_url_order(self, fake_release_date_and_genres):
+        """Test that results line up with the urls they were scraped from."""
+        fake_release_date_and_genres.side_effect = lambda url, logger: {
+            'release_date': url, 'genres': []}
+        urls = [f'https://artist.bandcamp.com/track/{i}' for i in range(20)]
+        results = scrape_item_pages(urls, max_workers=4)
+        assert [result['release_date'] for result in results] == urls
+
+    @patch('extract.get_release_date_and_genres')
+    def test_scrape_item_pages_missing_page_falls_back_to_none(self, fake_release_date_and_genres):
+        """Test that a page without tags leaves an empty slot instead of failing."""
+        def fake_scrape(url, logger):
+            if url.endswith('bad'):
+                raise ValueError("Could not find element with id 'pgBd in HTML.")
+            return {'release_date': 'released June 11, 2024', 'genres': ['pop']}
+        fake_release_date_and_genres.side_effect = fake_scrape
+        results = scrape_item_pages(['https://a.com/good', 'https://a.com/bad'])
+        assert results[0]['genres'] == ['pop']
+        assert results[1] is None
+
+    @patch('extract.get_release_date_and_genres')
+    def test_scrape_item_pages_timeouts_within_budget(self, fake_release_date_and_genres):
+        """Test that a few timeouts within the budget do not stop the batch."""
+        def fake_scrape(url, logger):
+            if url.endswith('0'):
+                raise requests.exceptions.ReadTimeout()
+            return {'release_date': None, 'genres': []}
+        fake_release_date_and_genres.side_effect = fake_scrape
+        urls = [f'https://a.com/{i}' for i in range(10)]
+        results = scrape_item_pages(urls, timeout_budget=0.25)
+        assert results.count(None) == 1
+
+    @patch('extract.get_release_date_and_genres')
+    def test_scrape_item_pages_timeouts_over_budget(self, fake_release_date_and_genres):
+        """Test that the batch halts once too many pages time out."""
+        fake_release_date_and_genres.side_effect = requests.exceptions.ReadTimeout()
+        urls = [f'https://a.com/{i}' for i in range(10)]
+        with pytest.raises(requests.exceptions.ReadTimeout):
+            scrape_item_pages(urls, timeout_budget=0.25)
+
+
+    @pytest.mark.parametrize('url_count', [1, 2, 3])
+    @patch('extract.get_release_date_and_genres')
+    def test_scrape_item_pages_small_batch_tolerates_a_timeout(self, fake_release_date_and_genres,
+                                                               url_count):
+        """Test that small batches still allow two timeouts before halting."""
+        def fake_scrape(url, logger):
+            if url.endswith('0'):
+                raise requests.exceptions.ReadTimeout()
+            return {'release_date': None, 'genres': []}
+        fake_release_date_and_genres.side_effect = fake_scrape
+        urls = [f'https://a.com/{i}' for i in range(url_count)]
+        results = scrape_item_pages(urls, timeout_budget=0.25)
+        assert results.count(None) == 1
+
+    @patch('extract.get_release_date_and_genres',
+           side_effect=requests.exceptions.ReadTimeout())
+    def test_scrape_item_pages_budget_counts_requested_pages(self, fake_release_date_and_genres):
+        """Test that cached pages don't widen the timeout budget of the pages requested."""
+        urls = [f'https://a.com/{i}' for i in range(20)]
+        cache = MagicMock()
+        cache.get.side_effect = lambda url: (
+            None if urls.index(url) < 4 else {'release_date': None, 'genres': []})
+        with pytest.raises(requests.exceptions.ReadTimeout):
+            scrape_item_pages(urls, timeout_budget=0.25, cache=cache)
+
+
 class TestCollectAPIRowsAndColumns:
     """Tests for collect_api_rows_and_columns. """
 
@@ -171,9 +361,160 @@ class TestCollectAPIRowsAndColumns:
              'slug_type', 'track_album_slug_text', 'url', 'utc_date'])
 
 
+    @patch('extract.get_release_date_and_genres')
+    @patch('extract.get_enriched_items', return_value={})
+    def test_collect_api_rows_and_columns_scrapes_each_url_once(self, fake_enriched, fake_scrape,
+                                                                example_api_call):
+        """Test that a url sold several times is scraped once and shared by every row."""
+        item = example_api_call['events'][0]['items'][0]
+        other_item = item | {'url': '//other.bandcamp.com/track/song'}
+        example_api_call['events'].append(
+            {'event_type': 'sale', 'items': [dict(item), other_item, dict(item)]})
+        fake_scrape.side_effect = lambda url, logger: {'release_date': None, 'genres': [url]}
+        rows, _ = collect_api_rows_and_columns(example_api_call)
+        assert fake_scrape.call_count == 2
+        assert [row['genres'][0] for row in rows] == [
+            row['url'] for row in rows]
+        assert len(rows) == 4
+
+    @patch('extract.get_release_date_and_genres')
+    @patch('extract.get_enriched_items')
+    def test_collect_api_rows_and_columns_skips_enriched_items(self, fake_enriched, fake_scrape,
+                                                               example_api_call):
+        """Test that items already in the database are not scraped."""
+        url = 'https://ellazirina.bandcamp.com/album/boundless-blue-sunset-hue'
+        fake_enriched.return_value = {url: {'release_date': 'released June 11, 2024',
+                                            'genres': ['jazz']}}
+        rows, _ = collect_api_rows_and_columns(example_api_call)
+        fake_scrape.assert_not_called()
+        assert rows[0]['genres'] == ['jazz']
+
+    @patch('extract.get_release_date_and_genres')
+    @patch('extract.get_enriched_items')
+    def test_collect_api_rows_and_columns_skips_stored_merch(self, fake_enriched, fake_scrape,
+                                                             example_api_call):
+        """Test that merch stored with a release date but no tags is not scraped."""
+        item = example_api_call['events'][0]['items'][0]
+        item |= {'url': '//ellazirina.bandcamp.com/merch/shirt', 'item_type': 'p',
+                 'slug_type': 'p'}
+        fake_enriched.return_value = {'https://ellazirina.bandcamp.com/merch/shirt': {
+            'release_date': 'released June 11, 2024', 'genres': []}}
+        rows, _ = collect_api_rows_and_columns(example_api_call)
+        fake_scrape.assert_not_called()
+        assert (rows[0]['release_date'], rows[0]['genres']) == ('released June 11, 2024', [])
+
+    @patch('extract.get_release_date_and_genres')
+    @patch('extract.get_enriched_items')
+    def test_collect_api_rows_and_columns_force_refresh(self, fake_enriched, fake_scrape,
+                                                        example_api_call):
+        """Test that force_refresh scrapes every item without the database lookup."""
+        fake_scrape.return_value = {'release_date': None, 'genres': ['pop']}
+        rows, _ = collect_api_rows_and_columns(example_api_call, force_refresh=True)
+        fake_enriched.assert_not_called()
+        fake_scrape.assert_called_once()
+        assert rows[0]['genres'] == ['pop']
+
+
+    @patch('extract.get_release_date_and_genres')
+    @patch('extract.get_enriched_items', return_value={})
+    def test_collect_api_items_drops_recent_events(self, fake_enriched, fake_scrape,
+                                                   example_api_call):
+        """Test that sales already loaded are dropped before any scraping."""
+        recent_events = RecentEvents(window=600)
+        item = example_api_call['events'][0]['items'][0]
+        recent_events.add([SaleItem.from_mapping(item | {'url': 'https:' + item['url']})])
+        assert collect_api_items(example_api_call, recent_events=recent_events) == []
+        fake_scrape.assert_not_called()
+        assert recent_events.report()['skip_ratio'] == 1.0
+
+
+class TestColumnProjection:
+    """Tests for projecting extract down to the columns transform needs."""
+
+    def test_get_source_fields_maps_renamed_columns(self):
+        """Test that transformed names are mapped back to salesfeed fields."""
+        assert get_source_fields(['sold_for', 'tag_names', 'url']) == [
+            'amount_paid_usd', 'genres', 'url']
+
+    def test_get_source_fields_rejects_unknown_columns(self):
+        """Test that a column the salesfeed can't provide is rejected."""
+        with pytest.raises(KeyError):
+            get_source_fields(['not_a_column'])
+
+    @patch('extract.get_release_date_and_genres')
+    @patch('extract.get_enriched_items', return_value={})
+    def test_collect_api_columns_only_materialises_projection(self, fake_enriched, fake_scrape,
+                                                              example_api_call):
+        """Test that only the projected fields are returned, in projection order."""
+        fake_scrape.return_value = {'release_date': 'released October 11, 2024',
+                                    'genres': ['jazz']}
+        columns = collect_api_columns(example_api_call, columns=REQUIRED_COLUMNS)
+        assert list(columns) == get_source_fields(REQUIRED_COLUMNS)
+        assert columns['amount_paid_usd'] == [8]
+        assert columns['genres'] == [['jazz']]
+
+    @pytest.mark.parametrize('all_columns, expected_count', ((False, 12), (True, 22)))
+    @patch('extract.get_enriched_items', return_value={})
+    @patch('extract.get_release_date_and_genres')
+    @patch('extract.get_api_request')
+    @patch('extract.save_to_csv', return_value=True)
+    def test_run_extract_csv_all_columns_switch(self, fake_save_to_csv, fake_get_request,
+                                                fake_scrape, fake_enriched, all_columns,
+                                                expected_count, example_api_call):
+        """Test that the csv keeps every field only when all_columns is set."""
+        fake_get_request.return_value = example_api_call
+        fake_scrape.return_value = {'release_date': None, 'genres': []}
+        run_extract('data/output.csv', 2380921482190481, all_columns=all_columns)
+        assert len(fake_save_to_csv.call_args.args[0][0]) == expected_count
+
+
+class TestItemsToDataFrame:
+    """Tests for the items_to_dataframe function."""
+
+    def test_items_to_dataframe_projects_and_keeps_watermark(self, example_api_call):
+        """Tests that only the required columns are built and the mark is attached."""
+        items = [SaleItem.from_mapping(item)
+                 for event in example_api_call["events"] for item in event["items"]]
+        df = items_to_dataframe(items, 1749584460)
+        assert sorted(df.columns) == sorted(get_source_fields(REQUIRED_COLUMNS))
+        assert len(df) == len(items)
+        assert df.attrs["high_water_mark"] == 1749584460
+
+    def test_items_to_dataframe_all_columns(self, example_api_call):
+        """Tests that every field is kept when all_columns is set."""
+        items = [SaleItem.from_mapping(example_api_call["events"][0]["items"][0])]
+        assert "currency" in items_to_dataframe(items, all_columns=True).columns
+        assert "currency" not in items_to_dataframe(items, columns=["sold_for"]).columns
+
+
+class TestSaveToParquet:
+    """Tests for save_to_parquet."""
+
+    def test_save_to_parquet_keeps_types(self, tmp_path):
+        """Test that lists and numbers are read back without re-parsing."""
+        path = str(tmp_path / "output.parquet")
+        columns = {'amount_paid_usd': [8, 2.5], 'genres': [['jazz', 'ambient'], []],
+                   'addl_count': [None, 2]}
+        assert save_to_parquet(columns, path)
+        loaded_df = load_parquet_data(path)
+        assert list(loaded_df.columns) == list(columns)
+        assert loaded_df['genres'].tolist() == [['jazz', 'ambient'], []]
+        assert loaded_df['amount_paid_usd'].tolist() == [8.0, 2.5]
+
+    def test_save_to_parquet_schema_mismatch(self, tmp_path):
+        """Test that values not matching the salesfeed schema aren't saved."""
+        path = str(tmp_path / "output.parquet")
+        assert not save_to_parquet({'art_id': ['not a number']}, path)
+
+    def test_validate_api_data_accepts_parquet_path(self, example_api_call):
+        """Test that a .parquet path is accepted alongside .csv."""
+        assert validate_api_data(example_api_call, 'data/output.parquet').endswith(
+            'data/output.parquet')
+
+
 class TestRunExtract:
     """Tests for run_extract."""
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_run_extract_wrong_type_for_filepath(self, fake_requests):
         """Test that checks if script halts if the file path isn't a string."""
         fake_requests.return_value.status_code = 200
@@ -181,7 +522,7 @@ class TestRunExtract:
         with pytest.raises(TypeError):
             run_extract({"filepath": "i am not a filepath"})
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_run_extract_wrong_value_folder_path_doesnt_exist(self, fake_requests, example_api_call):
         """Test that checks if script halts if the folder path doesn't exist."""
         fake_requests.return_value.status_code = 200
@@ -214,15 +555,51 @@ class TestRunExtract:
                                                example_api_call):
         """Test that checks that csv is saved if the data is correctly formatted."""
         fake_get_request.return_value = example_api_call
-        fake_release_date_and_columns.return_value == {'genres': [
+        fake_release_date_and_columns.return_value = {'genres': [
             'jazz', 'chamber jazz', 'cool jazz', 'guitar', 'modal jazz'], 'release_date': 'released October 11, 2024'}
         fake_save_to_csv.return_value = True
         assert run_extract('data/output.csv', 2380921482190481)
 
 
+class TestRunExtractWatermark:
+    """Tests for run_extract's incremental mode."""
+
+    @patch('extract.get_enriched_items', return_value={})
+    @patch('extract.get_release_date_and_genres')
+    @patch('extract.get_api_request')
+    @patch('extract.get_watermark', return_value=1749583860)
+    def test_run_extract_starts_from_watermark(self, fake_watermark, fake_get_request,
+                                               fake_scrape, fake_enriched, example_api_call):
+        """Test that the stored watermark is used as the window start and the new one is returned."""
+        fake_get_request.return_value = example_api_call
+        fake_scrape.return_value = {'release_date': None, 'genres': []}
+        result = run_extract()
+        fake_get_request.assert_called_once_with(1749583860, offset=0)
+        assert result.attrs['high_water_mark'] == 1749584460
+
+    @patch('extract.get_enriched_items', return_value={})
+    @patch('extract.get_release_date_and_genres')
+    @patch('extract.get_api_request')
+    @patch('extract.get_watermark', return_value=None)
+    @patch('extract.time.time', return_value=1749584000)
+    def test_run_extract_without_watermark_uses_current_time(self, fake_time, fake_watermark,
+                                                             fake_get_request, fake_scrape,
+                                                             fake_enriched, example_api_call):
+        """Test that the current time is read on each call, not at import."""
+        fake_get_request.return_value = example_api_call
+        fake_scrape.return_value = {'release_date': None, 'genres': []}
+        run_extract()
+        fake_get_request.assert_called_once_with(1749584000, offset=200)
+
+
 class TestGetTimeOffset:
     """Tests for get_time_offset."""
 
+    @patch('extract.time.time', return_value=5000.5)
+    def tests_get_time_offset_defaults_to_current_time(self, fake_time):
+        """Test that the default time is read when the function is called."""
+        assert get_time_offset() == 4800
+
     def tests_get_time_offset_passing_5000_should_return_4800(self):
         """Test that checks if the offset is working."""
         assert get_time_offset(5000) == 4800
@@ -0,0 +1,115 @@
+# pylint: skip-file
+
+"""Test file for the shared HTTP client."""
+
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import http_client
+from http_client import (build_session, get_session, get_scrape_session,
+                         get_connection_stats)
+
+
+class FakeBandcampHandler(BaseHTTPRequestHandler):
+    """Serves keep-alive responses, failing the first request to /flaky with a 503."""
+    protocol_version = "HTTP/1.1"
+    flaky_calls = 0
+    throttled_calls = 0
+
+    def do_GET(self):
+        status = 200
+        if self.path == "/flaky":
+            FakeBandcampHandler.flaky_calls += 1
+            status = 503 if FakeBandcampHandler.flaky_calls == 1 else 200
+        elif self.path == "/throttled":
+            FakeBandcampHandler.throttled_calls += 1
+            status = 429
+        body = b"ok"
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def local_server():
+    """Runs a local HTTP server for the duration of a test and returns its base url."""
+    FakeBandcampHandler.flaky_calls = 0
+    FakeBandcampHandler.throttled_calls = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeBandcampHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+class TestBuildSession:
+    """Tests for build_session."""
+
+    def test_build_session_sets_pool_size(self):
+        """Tests that the pool size is applied to the mounted adapter."""
+        session = build_session(pool_size=4)
+        adapter = session.get_adapter("https://bandcamp.com")
+        assert adapter._pool_maxsize == 4
+        assert 429 in adapter.max_retries.status_forcelist
+
+    def test_build_session_pool_size_from_env(self, monkeypatch):
+        """Tests that HTTP_POOL_SIZE tunes the pool size."""
+        monkeypatch.setenv("HTTP_POOL_SIZE", "32")
+        adapter = build_session().get_adapter("https://bandcamp.com")
+        assert adapter._pool_maxsize == 32
+
+    def test_build_session_rejects_invalid_pool_size(self):
+        """Tests that a pool size below one is rejected."""
+        with pytest.raises(ValueError):
+            build_session(pool_size=0)
+
+    def test_build_session_retries_server_errors(self, local_server):
+        """Tests that a 503 is retried transparently."""
+        session = build_session(backoff_factor=0, backoff_jitter=0)
+        response = session.get(local_server + "/flaky", timeout=5)
+        assert response.status_code == 200
+        assert FakeBandcampHandler.flaky_calls == 2
+
+
+class TestGetSession:
+    """Tests for get_session."""
+
+    def test_get_session_returns_shared_session(self, monkeypatch):
+        """Tests that every caller gets the same session."""
+        monkeypatch.setattr(http_client, "_SESSION", None)
+        assert get_session() is get_session()
+
+
+    def test_get_scrape_session_returns_429_at_once(self, monkeypatch, local_server):
+        """Tests that item page fetches see a 429 on the first response, so the rate
+        limiter gets the signal, while 5xx responses are still retried."""
+        monkeypatch.setattr(http_client, "_SCRAPE_SESSION", None)
+        session = get_scrape_session()
+        assert session is get_scrape_session()
+        assert session is not get_session()
+        response = session.get(local_server + "/throttled", timeout=5)
+        assert response.status_code == 429
+        assert FakeBandcampHandler.throttled_calls == 1
+        assert 503 in session.get_adapter(local_server).max_retries.status_forcelist
+
+
+class TestGetConnectionStats:
+    """Tests for get_connection_stats."""
+
+    def test_get_connection_stats_counts_reused_connections(self, local_server):
+        """Tests that keep-alive requests to one host reuse a single connection."""
+        session = build_session()
+        for _ in range(5):
+            session.get(local_server + "/", timeout=5)
+        stats = get_connection_stats(session)
+        assert stats["127.0.0.1"] == {
+            "requests": 5, "connections": 1, "reused": 4}
+
+    def test_get_connection_stats_empty_before_requests(self):
+        """Tests that an unused session reports no hosts."""
+        assert get_connection_stats(build_session()) == {}
@@ -1,17 +1,25 @@
 
 """Test file for the load pipeline."""
 
+import os
+import re
 from unittest.mock import patch, MagicMock
 import pytest
 import pandas as pd
-import psycopg2
 from psycopg2.extras import RealDictCursor
 from load import (
     get_db_connection,
     run_load,
     copy_df,
     build_frames,
-    insert_dimension_data
+    save_watermark,
+    load_staging_csv,
+    to_datetime_column,
+    copy_csv_file,
+    is_stage_file,
+    merge_staging,
+    prepare_staging,
+    SALE_COLS
 )
 
 
@@ -85,6 +93,208 @@ class TestBuildFrames:
         assert pd.isna(sales_df["utc_date"]).all()
         assert pd.isna(sales_df["release_date"]).all()
 
+    def test_build_frames_name_columns_by_item_kind(self, sample_df):
+        """Tests that each kind of sale fills only its own name column, truncated to NAME_LEN."""
+        df = pd.concat([sample_df] * 3, ignore_index=True).iloc[:5]
+        df["slug_type"] = ["t", "a", "a", "p", "a"]
+        df["item_type"] = ["t", "a", "p", "p", "a"]
+        df["album_name"] = [None, None, "Parent Album", None, None]
+        df["item_description"] = ["x" * 300, "The Album", "Vinyl", "T-Shirt", None]
+        sales_df, _ = build_frames(df)
+        names = sales_df[["track_name", "album_name", "merch_name"]].astype(object)
+        names = names.where(names.notna(), None)
+        assert names["track_name"].tolist() == ["x" * 255, None, None, None, None]
+        assert names["album_name"].tolist() == [
+            None, "The Album", "Parent Album", None, "Unknown Album"]
+        assert names["merch_name"].tolist() == [None, None, None, "T-Shirt", None]
+
+    def test_build_frames_prefers_album_title(self, sample_df):
+        """Tests that a raw album_title is used for albums when it is present."""
+        df = sample_df.assign(slug_type="a", item_type="a",
+                              album_title=["Real Title", ""])
+        sales_df, _ = build_frames(df)
+        assert sales_df["album_name"].tolist() == ["Real Title", "Nothing Better"]
+
+
+class TestToDatetimeColumn:
+    """Tests for the to_datetime_column function."""
+
+    def test_to_datetime_column_keeps_converted_columns(self):
+        """Tests that a column transform already converted is returned untouched."""
+        dates = pd.Series(pd.to_datetime([1749542761], unit="s", utc=True))
+        assert to_datetime_column(dates) is dates
+
+    def test_to_datetime_column_parses_strings(self):
+        """Tests that text is parsed and anything unparseable becomes NaT."""
+        dates = to_datetime_column(pd.Series(["2023-01-18", "soon"]), format="%Y-%m-%d")
+        assert dates.iloc[0] == pd.Timestamp("2023-01-18")
+        assert pd.isna(dates.iloc[1])
+
+
+class TestCopyCsvFile:
+    """Tests for streaming staging CSV files into COPY."""
+
+    def test_copy_csv_file_streams_reordered_columns(self, tmp_path):
+        """Tests that a file whose columns are all staging columns is copied as it is,
+        in its own column order, without the header."""
+        path = tmp_path / "stage_tags.csv"
+        path.write_text('tag_name,url\nrock,"//a.com/1"\n', encoding="utf-8")
+        cur = MagicMock()
+        copied = []
+        cur.copy_expert.side_effect = lambda sql, csv_file: copied.append(csv_file.read())
+        copy_csv_file(cur, str(path), "stage_tag", ["url", "tag_name"])
+        assert cur.copy_expert.call_args.args[0] == (
+            'COPY stage_tag ("tag_name", "url") FROM STDIN WITH CSV')
+        assert copied == ['rock,"//a.com/1"\n']
+        cur.execute.assert_not_called()
+
+    def test_copy_csv_file_drops_extra_columns(self, tmp_path):
+        """Tests that columns staging doesn't have go through a temporary table."""
+        path = tmp_path / "stage_tags.csv"
+        path.write_text("url,tag_name,note\n//a.com/1,rock,x\n", encoding="utf-8")
+        cur = MagicMock()
+        copy_csv_file(cur, str(path), "stage_tag", ["url", "tag_name"])
+        queries = [call.args[0] for call in cur.execute.call_args_list]
+        assert 'ADD COLUMN "note" TEXT' in queries[1]
+        assert queries[2] == ("INSERT INTO stage_tag (url, tag_name) "
+                              "SELECT url, tag_name FROM stage_tag_file;")
+
+    def test_is_stage_file(self, tmp_path, sample_df):
+        """Tests that only CSV files with every stage_sale column count as staging files."""
+        stage_path, clean_path = tmp_path / "stage.csv", tmp_path / "clean.csv"
+        stage_path.write_text(",".join(reversed(SALE_COLS)) + "\n", encoding="utf-8")
+        sample_df.to_csv(clean_path, index=False)
+        assert is_stage_file(str(stage_path))
+        assert not is_stage_file(str(clean_path))
+
+    @patch("load.build_frames")
+    @patch("load.load_stage_files")
+    def test_run_load_copies_stage_files_directly(self, mock_load_stage_files,
+                                                  mock_build_frames, tmp_path):
+        """Tests that run_load hands staging CSV files to COPY without pandas."""
+        path = tmp_path / "stage.csv"
+        path.write_text(",".join(SALE_COLS) + "\n", encoding="utf-8")
+        run_load(csv_path=str(path), high_water_mark=1749584460)
+        mock_load_stage_files.assert_called_once_with(
+            str(path), str(tmp_path / "stage_tags.csv"), 1749584460)
+        mock_build_frames.assert_not_called()
+
+
+class TestSaveWatermark:
+    """Tests for the save_watermark function."""
+
+    def test_save_watermark_upserts_without_rewinding(self):
+        """Tests that the watermark upsert only ever moves forwards."""
+        cur = MagicMock()
+        save_watermark(cur, 1749584460)
+        query, params = cur.execute.call_args.args
+        assert "GREATEST" in query
+        assert params == ("salesfeed", 1749584460)
+
+    def test_watermark_migration_creates_the_table_written_to(self):
+        """Tests that add_watermark.sql creates etl_watermark as schema.sql does,
+        with every column and the conflict key save_watermark uses."""
+        def read_table(file_name):
+            with open(os.path.join(os.path.dirname(__file__), file_name),
+                      encoding="utf-8") as sql_file:
+                match = re.search(r"CREATE TABLE (IF NOT EXISTS )?etl_watermark \((.*?)\n\);",
+                                  sql_file.read(), re.DOTALL)
+            assert match, file_name
+            return match.group(1), match.group(2)
+
+        if_not_exists, migrated = read_table("add_watermark.sql")
+        assert if_not_exists
+        assert migrated == read_table("schema.sql")[1]
+
+        cur = MagicMock()
+        save_watermark(cur, 1749584460)
+        query = cur.execute.call_args.args[0]
+        columns = re.search(r"etl_watermark\((.*?)\)", query).group(1).split(", ")
+        conflict_key = re.search(r"ON CONFLICT \((.*?)\)", query).group(1)
+        for column in columns + ["updated_at"]:
+            assert re.search(rf"^\s+{column} ", migrated, re.MULTILINE)
+        assert f"PRIMARY KEY ({conflict_key})" in migrated
+
+
+class TestMergeStaging:
+    """Tests for staging tables and the merge that runs alongside other loads."""
+
+    def test_prepare_staging_uses_session_tables(self):
+        """Tests that each load stages into its own temporary tables."""
+        cur = MagicMock()
+        prepare_staging(cur)
+        ddl = cur.execute.call_args_list[0].args[0]
+        assert ddl.count("CREATE TEMP TABLE") == 2
+        assert "UNLOGGED" not in ddl
+
+    def test_merge_staging_locks_dimensions_then_commits(self):
+        """Tests that the dimension upserts run under the advisory lock and are committed
+        before the sales, which are saved with the watermark."""
+        cur = MagicMock()
+        cur.fetchone.return_value = {"count": 1}
+        events = []
+        cur.execute.side_effect = lambda query, *args: events.append(query)
+        cur.connection.commit.side_effect = lambda: events.append("COMMIT")
+        merge_staging(cur, 1749584460)
+        assert "pg_advisory_xact_lock" in events[0]
+        commit_at = events.index("COMMIT")
+        assert any("INSERT INTO album_tag_assignment" in query
+                   for query in events[:commit_at])
+        assert not any("INSERT INTO sale(" in query for query in events[:commit_at])
+        assert "etl_watermark" in events[-1]
+
+    def test_merge_staging_links_sales_by_stage_id(self):
+        """Tests that sales carry their stage_id out of the insert and the assignments
+        join on it rather than on utc_date and country."""
+        cur = MagicMock()
+        cur.fetchone.return_value = {"count": 1}
+        merge_staging(cur)
+        queries = [call.args[0] for call in cur.execute.call_args_list]
+        sale_insert = next(query for query in queries if "INSERT INTO sale(" in query)
+        assert "RETURNING sale_id" in sale_insert
+        assert "SELECT new_sales.stage_id, ins.sale_id" in sale_insert
+        links = [query for query in queries if "INSERT INTO sale_" in query]
+        assert len(links) == 3
+        for query in links:
+            assert "USING (stage_id)" in query
+            assert "utc_date" not in query
+
+    def test_merge_staging_skips_known_events(self):
+        """Tests that sales are keyed by event and existing keys are skipped in key order."""
+        cur = MagicMock()
+        cur.fetchone.return_value = {"count": 1}
+        merge_staging(cur)
+        sale_insert = next(call.args[0] for call in cur.execute.call_args_list
+                           if "INSERT INTO sale(" in call.args[0])
+        assert "sale_event_key(s.utc_date, c.country_id, s.url, s.sold_for)" in sale_insert
+        assert "ORDER BY event_key" in sale_insert
+        assert "ON CONFLICT (event_key) DO NOTHING" in sale_insert
+
+
+class TestLoadStagingCsv:
+    """Tests for the load_staging_csv function."""
+
+    @patch("load.merge_staging")
+    @patch("load.copy_csv")
+    @patch("load.get_db_connection")
+    def test_load_staging_csv_copies_and_merges(self, mock_get_db_conn, mock_copy_csv,
+                                                mock_merge_staging):
+        """Tests that both CSV texts are copied and merged in one transaction."""
+        load_staging_csv("a,b\n", "url,rock\n", 1, high_water_mark=1749584460)
+        assert [call.args[2] for call in mock_copy_csv.call_args_list] == [
+            "stage_sale", "stage_tag"]
+        assert mock_merge_staging.call_args.args[1] == 1749584460
+        mock_get_db_conn.return_value.__enter__.return_value.commit.assert_called_once()
+
+    @patch("load.merge_staging")
+    @patch("load.copy_csv")
+    @patch("load.get_db_connection")
+    def test_load_staging_csv_without_tags(self, mock_get_db_conn, mock_copy_csv,
+                                           mock_merge_staging):
+        """Tests that an empty tag CSV is not copied."""
+        load_staging_csv("a,b\n", "", 1)
+        assert [call.args[2] for call in mock_copy_csv.call_args_list] == ["stage_sale"]
+
 
 class TestRunLoad:
     """Test class for run_load function."""
@@ -114,7 +324,7 @@ class TestRunLoad:
     @patch("load.insert_dimension_data")
     @patch("load.get_db_connection")
     @patch("load.build_frames")
-    @patch("load.pd.read_csv")
+    @patch("pandas.read_csv")
     @patch("load.os.path.exists", return_value=True)
     def test_run_load_csv_path(
         self,
@@ -138,3 +348,55 @@ class TestRunLoad:
 
         run_load(csv_path="dummy.csv")
         assert mock_insert_dimension_data.call_count >= 1
+
+    @patch("load.copy_df")
+    @patch("load.insert_dimension_data")
+    @patch("load.get_db_connection")
+    def test_run_load_parquet_path(self, mock_get_db_conn, mock_insert_dimension_data,
+                                   mock_copy_df, tmp_path):
+        """Tests that a parquet file is read directly, keeping tag lists as lists."""
+        path = str(tmp_path / "clean_sales.parquet")
+        pd.DataFrame({
+            "utc_date": [pd.Timestamp("2025-06-10 08:06:01", tz="UTC")],
+            "item_type": ["t"], "album_name": [None], "artist_name": ["Alex Lynch"],
+            "item_description": ["Thank Me Later"], "tag_names": [["rock", "indie"]],
+            "sold_for": [2.02], "release_date": [pd.Timestamp("2023-01-18")],
+            "country_name": ["United Kingdom"], "slug_type": ["t"],
+            "url": ["https://bandcamp.com/track/1"], "art_url": ["//image.com/1.jpg"],
+        }).to_parquet(path)
+        run_load(csv_path=path)
+        tag_call = [call for call in mock_copy_df.call_args_list
+                    if call.args[2] == "stage_tag"][0]
+        assert tag_call.args[1]["tag_name"].tolist() == ["rock", "indie"]
+
+    @patch("load.merge_staging")
+    @patch("load.copy_df")
+    @patch("load.get_db_connection")
+    def test_run_load_chunked_parquet_path(self, mock_get_db_conn, mock_copy_df,
+                                           mock_merge_staging, tmp_path):
+        """Tests that a file read in chunks is staged chunk by chunk and merged once."""
+        path = str(tmp_path / "clean_sales.parquet")
+        pd.DataFrame({
+            "utc_date": pd.to_datetime([1749542761, 1749542767, 1749542770], unit="s", utc=True),
+            "item_type": ["t"] * 3, "album_name": [None] * 3, "artist_name": ["Alex Lynch"] * 3,
+            "item_description": ["Thank Me Later"] * 3, "tag_names": [["rock"]] * 3,
+            "sold_for": [2.02] * 3, "release_date": [pd.Timestamp("2023-01-18")] * 3,
+            "country_name": ["United Kingdom"] * 3, "slug_type": ["t"] * 3,
+            "url": ["https://bandcamp.com/track/1"] * 3, "art_url": ["//image.com/1.jpg"] * 3,
+        }).to_parquet(path)
+        run_load(csv_path=path, chunk_rows=2)
+        sale_copies = [call for call in mock_copy_df.call_args_list
+                       if call.args[2] == "stage_sale"]
+        assert [len(call.args[1]) for call in sale_copies] == [2, 1]
+        mock_merge_staging.assert_called_once()
+
+    @patch("load.save_watermark")
+    @patch("load.copy_df")
+    @patch("load.insert_dimension_data")
+    @patch("load.get_db_connection")
+    def test_run_load_saves_watermark(self, mock_get_db_conn, mock_insert_dimension_data,
+                                      mock_copy_df, mock_save_watermark, sample_df):
+        """Tests that the watermark is saved in the load transaction when given."""
+        run_load(sample_df, high_water_mark=1749584460)
+        mock_save_watermark.assert_called_once()
+        assert mock_save_watermark.call_args.args[1] == 1749584460
@@ -0,0 +1,155 @@
+# pylint: skip-file
+
+"""Test file for the adaptive rate limiter."""
+
+import threading
+import time
+from unittest.mock import Mock, patch
+import pytest
+import requests
+from rate_limiter import AdaptiveRateLimiter, is_throttle_error
+from extract import scrape_item_pages
+
+
+def rate_limited_error():
+    """Returns the HTTPError raised for a 429 response."""
+    return requests.exceptions.HTTPError("Rate limited.", response=Mock(status_code=429))
+
+
+class TestIsThrottleError:
+    """Tests for is_throttle_error."""
+
+    @pytest.mark.parametrize("error, expected", (
+        (requests.exceptions.ReadTimeout(), True),
+        (requests.exceptions.ConnectTimeout(), True),
+        (requests.exceptions.ConnectionError(), True),
+        (rate_limited_error(), True),
+        (requests.exceptions.HTTPError("Not found", response=Mock(status_code=404)), False),
+        (ValueError("Could not find element"), False),
+    ))
+    def test_is_throttle_error(self, error, expected):
+        """Tests that only timeouts, connection errors and 429s count as throttling."""
+        assert is_throttle_error(error) == expected
+
+
+class TestAdaptiveRateLimiter:
+    """Tests for the AdaptiveRateLimiter class."""
+
+    def test_fast_success_increases_limits_additively(self):
+        """Tests that a fast response nudges rate and concurrency up."""
+        limiter = AdaptiveRateLimiter(rate=4, concurrency=4)
+        limiter.acquire()
+        limiter.release(latency=0.1)
+        assert limiter.rate == pytest.approx(4.25)
+        assert limiter.concurrency == pytest.approx(4.25)
+
+    def test_throttle_halves_limits(self):
+        """Tests that a 429 or timeout halves rate and concurrency."""
+        limiter = AdaptiveRateLimiter(rate=8, concurrency=8)
+        limiter.acquire()
+        limiter.release(latency=0.1, throttled=True)
+        assert (limiter.rate, limiter.concurrency) == (4, 4)
+        assert limiter.throttled == 1
+
+    def test_slow_response_trims_concurrency(self):
+        """Tests that responses slower than the target latency reduce concurrency."""
+        limiter = AdaptiveRateLimiter(rate=8, concurrency=10, target_latency=1)
+        limiter.acquire()
+        limiter.release(latency=5)
+        assert limiter.concurrency == pytest.approx(9)
+        assert limiter.rate == 8
+
+    def test_limits_never_drop_below_minimum(self):
+        """Tests that repeated throttling bottoms out instead of stalling."""
+        limiter = AdaptiveRateLimiter(rate=1, concurrency=1)
+        for _ in range(10):
+            limiter.in_flight += 1
+            limiter.release(latency=0, throttled=True)
+        assert limiter.rate == 0.5
+        assert limiter.concurrency == 1
+
+    def test_acquire_waits_for_token(self):
+        """Tests that the token bucket paces requests to the current rate."""
+        limiter = AdaptiveRateLimiter(rate=20, concurrency=32)
+        limiter.tokens = 0
+        started_at = time.monotonic()
+        limiter.acquire()
+        assert time.monotonic() - started_at >= 0.04
+
+    def test_acquire_respects_concurrency(self):
+        """Tests that no more than the concurrency limit run at once.
+        Fast successes raise the limit, so each call is checked against the limit
+        in force when it started."""
+        limiter = AdaptiveRateLimiter(rate=10000, concurrency=2)
+        running = []
+        over_limit = []
+        lock = threading.Lock()
+
+        def work():
+            with lock:
+                running.append(1)
+                if len(running) > int(limiter.concurrency):
+                    over_limit.append(len(running))
+            time.sleep(0.02)
+            with lock:
+                running.pop()
+
+        threads = [threading.Thread(target=limiter.call, args=(work,)) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert over_limit == []
+
+    def test_call_reports_throttling_and_reraises(self):
+        """Tests that call re-raises errors after adapting to them."""
+        limiter = AdaptiveRateLimiter(rate=8, concurrency=8)
+        with pytest.raises(requests.exceptions.HTTPError):
+            limiter.call(Mock(side_effect=rate_limited_error()))
+        assert limiter.throttled == 1
+        assert limiter.in_flight == 0
+
+
+class TestScrapeItemPagesWithLimiter:
+    """Tests for scrape_item_pages with a rate limiter."""
+
+    @patch('extract.get_release_date_and_genres')
+    def test_rate_limited_page_falls_back_and_backs_off(self, fake_release_date_and_genres):
+        """Tests that a 429 leaves an empty slot and slows the limiter down."""
+        fake_release_date_and_genres.side_effect = rate_limited_error()
+        limiter = AdaptiveRateLimiter(rate=10000, concurrency=8)
+        assert scrape_item_pages(["https://a.com/1"], limiter=limiter) == [None]
+        assert limiter.concurrency == 4
+
+    @patch('extract.get_release_date_and_genres')
+    def test_connection_errors_back_off_and_count_towards_budget(self,
+                                                                 fake_release_date_and_genres):
+        """Tests that refused connections leave empty slots, slow the limiter down and
+        only halt the batch once they exceed the timeout budget."""
+        def fake_scrape(url, logger):
+            if url.endswith("0"):
+                raise requests.exceptions.ConnectionError("Connection refused")
+            if url.endswith("1"):
+                raise requests.exceptions.ConnectTimeout()
+            return {"release_date": None, "genres": []}
+        fake_release_date_and_genres.side_effect = fake_scrape
+        limiter = AdaptiveRateLimiter(rate=10000, concurrency=8)
+        urls = [f"https://a.com/{i}" for i in range(10)]
+        assert scrape_item_pages(urls, timeout_budget=0.25, limiter=limiter).count(None) == 2
+        assert limiter.throttled == 2
+
+        fake_release_date_and_genres.side_effect = requests.exceptions.ConnectionError()
+        with pytest.raises(requests.exceptions.ReadTimeout):
+            scrape_item_pages(urls, timeout_budget=0.25,
+                              limiter=AdaptiveRateLimiter(rate=10000, concurrency=8))
+
+    @patch('extract.get_release_date_and_genres',
+           side_effect=requests.exceptions.ReadTimeout())
+    def test_aborted_batch_still_reports_limiter(self, fake_release_date_and_genres):
+        """Tests that the limiter's stats are logged when the timeout budget halts a batch."""
+        limiter = AdaptiveRateLimiter(rate=10000, concurrency=8)
+        with patch.object(limiter, "report") as fake_report:
+            with pytest.raises(requests.exceptions.ReadTimeout):
+                scrape_item_pages([f"https://a.com/{i}" for i in range(10)],
+                                  timeout_budget=0.25, limiter=limiter)
+        fake_report.assert_called_once()
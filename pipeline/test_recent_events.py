@@ -0,0 +1,131 @@
+"""Test file for the recent_events script."""
+
+# pylint: skip-file
+
+from decimal import Decimal
+from unittest.mock import patch
+
+import pytest
+import pandas as pd
+import psycopg2
+
+import recent_events
+from recent_events import (RecentEvents, format_amount, get_event_key, get_item_key,
+                           get_row_key, get_recent_events)
+from salesfeed import SaleItem
+from transform import standardize_date_series
+
+URL = "https://ellazirina.bandcamp.com/album/boundless-blue-sunset-hue"
+
+
+def make_item(utc_date: float = 1749638295.4456537, **fields) -> SaleItem:
+    """Returns a SaleItem as collect_api_items sees it, with any fields overridden."""
+    item = {"utc_date": utc_date, "country": "Japan", "url": URL, "amount_paid_usd": 8}
+    item.update(fields)
+    return SaleItem.from_mapping(item)
+
+
+def stored_row(item: SaleItem, sold_for: Decimal) -> dict:
+    """Returns the row RECENT_EVENTS_SQL reads back for the item once loaded: the time
+    the pandas load path writes, as the TIMESTAMP column holds it (naive UTC)."""
+    utc_date = standardize_date_series(pd.Series([item.utc_date]))[0].to_pydatetime()
+    utc_date = utc_date.replace(tzinfo=None)
+    return {"utc_date": utc_date, "country_name": item.country, "url": item.url,
+            "sold_for": sold_for}
+
+
+class TestEventKeys:
+    """Tests for the event key helpers."""
+
+    @pytest.mark.parametrize("amount, expected", [
+        (8, "8"), (8.0, "8"), (Decimal("8.50"), "8.5"), (2.02, "2.02"), (10, "10"), (None, "")])
+    def test_format_amount(self, amount, expected):
+        """Tests that equal amounts format the same whatever their type and scale."""
+        assert format_amount(amount) == expected
+
+    def test_get_event_key_differs_by_field(self):
+        """Tests that changing any part of the event changes the key."""
+        key = get_event_key(1749638295445, "Japan", URL, 8)
+        assert key == get_event_key(1749638295445, "Japan", URL, 8.0)
+        assert len({key, get_event_key(1749638295446, "Japan", URL, 8),
+                    get_event_key(1749638295445, "Peru", URL, 8),
+                    get_event_key(1749638295445, "Japan", URL + "2", 8),
+                    get_event_key(1749638295445, "Japan", URL, 9)}) == 5
+
+    @pytest.mark.parametrize("utc_date", [1749638295.4456537, 1749638295.4449996,
+                                          1749638295.0009999, 1749638295.0])
+    def test_item_and_stored_row_keys_match(self, utc_date):
+        """Tests that an API item and its stored row key the same, even when the float
+        time rounds across a millisecond boundary."""
+        item = make_item(utc_date=utc_date, amount_paid_usd=8.5)
+        assert get_item_key(item) == get_row_key(stored_row(item, Decimal("8.50")))[0]
+
+    def test_sales_in_the_same_millisecond_stay_distinct(self):
+        """Tests that sales microseconds apart don't share a key, as in the database."""
+        first, second = make_item(utc_date=1749638295.445001), make_item(utc_date=1749638295.445002)
+        assert get_item_key(first) != get_item_key(second)
+        events = RecentEvents(window=600)
+        events.add([first])
+        assert events.drop_loaded([first, second]) == [second]
+
+    def test_get_item_key_without_time(self):
+        """Tests that items without a time have no key."""
+        assert get_item_key(make_item(utc_date=None)) is None
+
+
+class TestRecentEvents:
+    """Tests for the RecentEvents set."""
+
+    def test_drop_loaded_skips_added_items_and_reports_ratio(self):
+        """Tests that loaded items are dropped and the skip ratio is reported per run."""
+        events = RecentEvents(window=600)
+        loaded = make_item()
+        events.add([loaded])
+        new_item = make_item(amount_paid_usd=9)
+        assert events.drop_loaded([make_item(), new_item]) == [new_item]
+        assert events.report() == {"checked": 2, "skipped": 1, "skip_ratio": 0.5}
+        assert events.report()["checked"] == 0
+
+    def test_items_without_time_are_never_skipped(self):
+        """Tests that an item with no key always counts as new."""
+        events = RecentEvents(window=600)
+        item = make_item(utc_date=None)
+        events.add([item])
+        assert events.drop_loaded([item]) == [item]
+
+    def test_add_forgets_events_outside_the_window(self):
+        """Tests that events older than the window behind the newest are forgotten."""
+        events = RecentEvents(window=60)
+        old_item = make_item(utc_date=1749638000.0)
+        events.add([old_item, make_item(utc_date=1749638030.0, amount_paid_usd=2)])
+        assert len(events) == 2
+        events.add([make_item(utc_date=1749638070.0)])
+        assert len(events) == 2
+        assert events.drop_loaded([old_item]) == [old_item]
+
+    @patch("recent_events.get_db_connection")
+    def test_rebuild_matches_stored_sales(self, mock_get_db_conn):
+        """Tests that stored sales rebuild keys that match the salesfeed items."""
+        items = [make_item(utc_date=1749638295.0 + i / 7, amount_paid_usd=8.0)
+                 for i in range(50)]
+        cur = mock_get_db_conn.return_value.cursor.return_value.__enter__.return_value
+        cur.fetchall.return_value = [stored_row(item, Decimal("8.0")) for item in items]
+        events = RecentEvents(window=600)
+        assert events.rebuild() == 50
+        assert events.drop_loaded(items) == []
+        assert cur.execute.call_args.args[1] == {"window": 600}
+        mock_get_db_conn.return_value.close.assert_called_once()
+
+    @patch("recent_events.get_db_connection", side_effect=psycopg2.OperationalError)
+    def test_rebuild_without_database_skips_nothing(self, mock_get_db_conn):
+        """Tests that an unreachable database leaves the set empty."""
+        events = RecentEvents(window=600)
+        assert events.rebuild() == 0
+        assert events.drop_loaded([make_item()]) == [make_item()]
+
+    @patch.object(RecentEvents, "rebuild")
+    def test_get_recent_events_rebuilds_once(self, mock_rebuild, monkeypatch):
+        """Tests that the set is rebuilt on a cold start and reused when warm."""
+        monkeypatch.setattr(recent_events, "_RECENT_EVENTS", None)
+        assert get_recent_events() is get_recent_events()
+        mock_rebuild.assert_called_once()
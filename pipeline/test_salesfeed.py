@@ -0,0 +1,75 @@
+# pylint: skip-file
+
+"""Test file for the salesfeed decoding functions."""
+
+import json
+import pytest
+from salesfeed import (SALE_ITEM_FIELDS, SaleItem, decode_salesfeed,
+                       items_to_columns, columns_to_rows)
+
+
+class TestSaleItem:
+    """Tests for the SaleItem record."""
+
+    def test_sale_item_has_no_instance_dict(self):
+        """Tests that records are slot-only and cannot grow extra attributes."""
+        item = SaleItem()
+        assert not hasattr(item, "__dict__")
+        with pytest.raises(AttributeError):
+            item.not_a_field = 1
+
+    def test_sale_item_from_mapping_fills_known_fields(self, example_api_call):
+        """Tests that known keys are copied and missing ones default to None."""
+        item = SaleItem.from_mapping(example_api_call["events"][0]["items"][0])
+        assert item.artist_name == "Ella Zirina"
+        assert item.genres is None
+        assert item.addl_count is None
+
+    def test_sale_item_drops_unknown_keys(self):
+        """Tests that keys outside the fixed schema are ignored."""
+        item = SaleItem([("item_type", "a"), ("surprise", 1)])
+        assert item.item_type == "a"
+        assert not hasattr(item, "surprise")
+
+
+class TestDecodeSalesfeed:
+    """Tests for decode_salesfeed."""
+
+    def test_decode_salesfeed_builds_records_for_items_only(self, example_api_call):
+        """Tests that items become SaleItems while the envelope stays a dict."""
+        decoded = decode_salesfeed(json.dumps(example_api_call))
+        assert isinstance(decoded, dict)
+        assert isinstance(decoded["events"][0], dict)
+        item = decoded["events"][0]["items"][0]
+        assert isinstance(item, SaleItem)
+        assert item == SaleItem.from_mapping(example_api_call["events"][0]["items"][0])
+
+
+class TestColumns:
+    """Tests for items_to_columns and columns_to_rows."""
+
+    def test_items_to_columns_keeps_field_order(self, example_api_call):
+        """Tests that every field becomes a column in schema order."""
+        items = [SaleItem.from_mapping(item)
+                 for item in example_api_call["events"][0]["items"]]
+        columns = items_to_columns(items)
+        assert tuple(columns) == SALE_ITEM_FIELDS
+        assert columns["artist_name"] == ["Ella Zirina"]
+
+    def test_items_to_columns_normalises_addl_count(self):
+        """Tests that a zero addl_count is written as None, like the csv output."""
+        items = [SaleItem([("item_type", "a"), ("addl_count", 0)]),
+                 SaleItem([("item_type", "a"), ("addl_count", 2)])]
+        assert items_to_columns(items)["addl_count"] == [None, 2]
+
+    def test_items_to_columns_with_fields_subset(self, example_api_call):
+        """Tests that only the requested fields are built, in the order given."""
+        items = [SaleItem.from_mapping(item)
+                 for item in example_api_call["events"][0]["items"]]
+        columns = items_to_columns(items, ["url", "artist_name"])
+        assert list(columns) == ["url", "artist_name"]
+
+    def test_columns_to_rows_round_trip(self):
+        """Tests that columns are turned back into one dict per row."""
+        assert columns_to_rows({"a": [1, 2], "b": [3, 4]}) == [
+            {"a": 1, "b": 3}, {"a": 2, "b": 4}]
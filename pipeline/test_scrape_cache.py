@@ -0,0 +1,99 @@
+# pylint: skip-file
+
+"""Test file for the scrape cache."""
+
+from unittest.mock import patch
+import pytest
+from scrape_cache import ScrapeCache, normalise_cache_url
+from extract import scrape_item_pages
+
+
+@pytest.fixture
+def cache(tmp_path):
+    """Returns an empty scrape cache stored in a temporary directory."""
+    scrape_cache = ScrapeCache(str(tmp_path / "cache.sqlite3"))
+    yield scrape_cache
+    scrape_cache.conn.close()
+
+
+class TestNormaliseCacheUrl:
+    """Tests for normalise_cache_url."""
+
+    @pytest.mark.parametrize("url", (
+        "https://Artist.bandcamp.com/track/song",
+        "//artist.bandcamp.com/track/song",
+        "artist.bandcamp.com/track/song/",
+        "https://artist.bandcamp.com/track/song?from=salesfeed",
+    ))
+    def test_normalise_cache_url_variants_share_a_key(self, url):
+        """Tests that the same item url in different forms maps to one key."""
+        assert normalise_cache_url(url) == "artist.bandcamp.com/track/song"
+
+    def test_normalise_cache_url_raises_error_on_invalid_type(self):
+        """Tests that a non-string url is rejected."""
+        with pytest.raises(TypeError):
+            normalise_cache_url(None)
+
+
+class TestScrapeCache:
+    """Tests for the ScrapeCache class."""
+
+    def test_get_returns_stored_details(self, cache):
+        """Tests that stored details are returned on a later lookup."""
+        details = {"release_date": "released June 11, 2024", "genres": ["pop"]}
+        cache.set("https://a.bandcamp.com/track/1", details)
+        assert cache.get("//a.bandcamp.com/track/1") == details
+        assert (cache.hits, cache.misses) == (1, 0)
+
+    def test_get_counts_misses(self, cache):
+        """Tests that unknown urls count as misses."""
+        assert cache.get("https://a.bandcamp.com/track/1") is None
+        assert cache.report() == {"hits": 0, "misses": 1}
+
+    def test_get_ignores_expired_entries(self, cache):
+        """Tests that entries older than the ttl are treated as misses."""
+        with patch("scrape_cache.time.time", return_value=0):
+            cache.set("https://a.bandcamp.com/track/1",
+                      {"release_date": None, "genres": []})
+        assert cache.get("https://a.bandcamp.com/track/1") is None
+
+    def test_evict_keeps_most_recently_used_entries(self, tmp_path):
+        """Tests that eviction trims the cache to max_entries."""
+        cache = ScrapeCache(str(tmp_path / "small.sqlite3"), max_entries=2)
+        for i in range(4):
+            with patch("scrape_cache.time.time", return_value=1e10 + i):
+                cache.set(f"https://a.bandcamp.com/track/{i}",
+                          {"release_date": None, "genres": []})
+        assert cache.evict() == 2
+        assert cache.get("https://a.bandcamp.com/track/3") is not None
+        assert cache.get("https://a.bandcamp.com/track/0") is None
+        cache.conn.close()
+
+    def test_close_persists_entries(self, tmp_path):
+        """Tests that entries survive reopening the cache file."""
+        path = str(tmp_path / "persist.sqlite3")
+        cache = ScrapeCache(path)
+        cache.set("https://a.bandcamp.com/track/1",
+                  {"release_date": None, "genres": ["pop"]})
+        cache.close()
+        reopened = ScrapeCache(path)
+        assert reopened.get("https://a.bandcamp.com/track/1")["genres"] == ["pop"]
+        reopened.conn.close()
+
+
+class TestScrapeItemPagesWithCache:
+    """Tests for scrape_item_pages when a cache is given."""
+
+    @patch('extract.get_release_date_and_genres')
+    def test_cache_hits_skip_the_request(self, fake_release_date_and_genres, cache):
+        """Tests that cached urls are not scraped again."""
+        cache.set("https://a.bandcamp.com/track/1",
+                  {"release_date": "cached", "genres": []})
+        fake_release_date_and_genres.return_value = {
+            "release_date": "scraped", "genres": []}
+        results = scrape_item_pages(["https://a.bandcamp.com/track/1",
+                                     "https://a.bandcamp.com/track/2"], cache=cache)
+        assert [result["release_date"] for result in results] == [
+            "cached", "scraped"]
+        fake_release_date_and_genres.assert_called_once()
+        assert cache.get("https://a.bandcamp.com/track/2") is not None
@@ -0,0 +1,198 @@
+"""Test file for the staging script."""
+
+# pylint: skip-file
+
+import io
+import os
+import subprocess
+import sys
+import pytest
+import pandas as pd
+from unittest.mock import patch
+
+from extract import get_source_fields
+from load import build_frames, SALE_COLS
+from salesfeed import SaleItem, items_to_columns
+from transform import clean_dataframe, REQUIRED_COLUMNS
+from staging import (build_stage_csv, build_stage_frames, format_tag,
+                     get_sold_for_formatter, run_load_items, run_load_frame,
+                     run_load_file, export_stage_files)
+from utilities import load_csv_data
+
+
+def make_item(**fields) -> SaleItem:
+    """Returns a SaleItem for an album sale, with any fields overridden."""
+    item = {
+        "utc_date": 1749638295.4456537, "artist_name": "Ella Zirina", "item_type": "a",
+        "item_description": "Boundless Blue, Sunset Hue", "album_title": None,
+        "slug_type": "a", "amount_paid_usd": 8, "country": "Japan",
+        "url": "//ellazirina.bandcamp.com/album/boundless-blue-sunset-hue",
+        "art_url": "https://f4.bcbits.com/img/a3672109546_7.jpg",
+        "release_date": "released October 11, 2024", "genres": ["Rock", " Indie "],
+    }
+    item.update(fields)
+    return SaleItem.from_mapping(item)
+
+
+def pandas_stage_csv(items: list[SaleItem]) -> tuple[str, str]:
+    """Returns the stage_sale and stage_tag CSV the pandas path writes for the items."""
+    df = pd.DataFrame(items_to_columns(items, get_source_fields(REQUIRED_COLUMNS)))
+    sales, tags = build_frames(clean_dataframe(df))
+    sales_buf, tags_buf = io.StringIO(), io.StringIO()
+    sales.to_csv(sales_buf, index=False, header=False, columns=SALE_COLS)
+    tags.to_csv(tags_buf, index=False, header=False, columns=["url", "tag_name"])
+    return sales_buf.getvalue(), tags_buf.getvalue()
+
+
+class TestBuildStageCsv:
+    """Tests that build_stage_csv writes the same bytes as the pandas path."""
+
+    @pytest.mark.parametrize("items", [
+        [make_item()],
+        [make_item(utc_date=1749638300.5, item_type="t", slug_type="t",
+                   item_description='Track "One", pt. 2', url="//a.bandcamp.com/track/1"),
+         make_item(utc_date=1749638290.0, item_type="p", slug_type="p",
+                   item_description="T-Shirt", url="//a.bandcamp.com/merch/1"),
+         make_item(utc_date=1749638295.0, item_type="p", slug_type="a",
+                   album_title="Boundless Blue", url="//a.bandcamp.com/album/2")],
+        [make_item(amount_paid_usd=8.5), make_item(amount_paid_usd=None)],
+        [make_item(artist_name=None), make_item(utc_date=1749638000.25)],
+        [make_item(utc_date=1749638295.0, url=f"//a.bandcamp.com/album/{i}")
+         for i in range(3)],
+        [make_item(release_date=None, genres=None, item_description=None, country=None)],
+        [make_item(genres=["İstanbul", "ΟΔΥΣΣΕΥΣ", "x" * 80])],
+    ], ids=["album", "kinds", "float-prices", "missing-artist", "ties",
+            "missing-fields", "unicode-tags"])
+    def test_build_stage_csv_matches_pandas_path(self, items):
+        """Tests that both staging CSV texts are byte-identical to the pandas path."""
+        sales_csv, tags_csv, row_count = build_stage_csv(items)
+        assert (sales_csv, tags_csv) == pandas_stage_csv(items)
+        assert row_count == sum(item.artist_name is not None for item in items)
+
+    def test_build_stage_csv_nan_utc_date(self):
+        """Tests that a missing utc_date raises ValueError like clean_dataframe."""
+        with pytest.raises(ValueError):
+            build_stage_csv([make_item(utc_date=None)])
+
+
+class TestStagingHelpers:
+    """Tests for the value formatting helpers."""
+
+    def test_get_sold_for_formatter_ints(self):
+        """Tests that a batch of ints keeps writing ints."""
+        assert get_sold_for_formatter([8, 2])(8) == "8"
+
+    def test_get_sold_for_formatter_mixed(self):
+        """Tests that one float or missing amount turns the whole batch into floats."""
+        format_sold_for = get_sold_for_formatter([8, 2.5, None])
+        assert format_sold_for(8) == "8.0"
+        assert format_sold_for(None) == ""
+
+    def test_format_tag(self):
+        """Tests that tags are stripped, lowercased and cut to length."""
+        assert format_tag("  Hip Hop ") == "hip hop"
+        assert format_tag("İ") == "i"
+
+
+class TestRunLoadItems:
+    """Tests for the run_load_items function."""
+
+    @patch("staging.load_staging_csv")
+    def test_run_load_items_loads_csv(self, mock_load_staging_csv):
+        """Tests that the staging CSV is loaded with the high water mark."""
+        run_load_items([make_item()], 1749584460)
+        sales_csv, tags_csv, row_count, high_water_mark = mock_load_staging_csv.call_args.args
+        assert sales_csv.startswith("2025-06-11 10:38:15.445654+00:00,Japan,Ella Zirina")
+        assert tags_csv.splitlines()[0].endswith(",rock")
+        assert (row_count, high_water_mark) == (1, 1749584460)
+
+    @patch("staging.load_staging_csv")
+    def test_run_load_items_nothing_to_load(self, mock_load_staging_csv):
+        """Tests that an empty batch never touches the database."""
+        run_load_items([make_item(artist_name=None)])
+        mock_load_staging_csv.assert_not_called()
+
+    @patch("staging.advance_watermark")
+    @patch("staging.load_staging_csv")
+    def test_run_load_items_empty_batch_advances_watermark(self, mock_load_staging_csv,
+                                                           mock_advance_watermark):
+        """Tests that a batch with nothing new still moves the high-water mark on."""
+        run_load_items([], 1749584460)
+        mock_load_staging_csv.assert_not_called()
+        mock_advance_watermark.assert_called_once_with(1749584460)
+
+    def test_run_load_items_never_imports_pandas(self):
+        """Tests that importing the pipeline and loading records leaves pandas unimported."""
+        script = (
+            "import sys\n"
+            "from unittest.mock import patch, MagicMock\n"
+            "import etl_controller, staging\n"
+            "from salesfeed import SaleItem\n"
+            "item = SaleItem.from_mapping({'utc_date': 1749638295.4, 'artist_name': 'A',\n"
+            "    'item_type': 't', 'slug_type': 't', 'url': 'u', 'genres': ['rock'],\n"
+            "    'release_date': 'released October 11, 2024'})\n"
+            "with patch('load.get_db_connection', return_value=MagicMock()), \\\n"
+            "        patch('load.merge_staging'):\n"
+            "    staging.run_load_items([item], 1749584460)\n"
+            "print(sorted({'pandas', 'pyarrow', 'numpy'} & set(sys.modules)))\n"
+        )
+        result = subprocess.run([sys.executable, "-c", script], capture_output=True,
+                                text=True, check=True, cwd=os.path.dirname(__file__))
+        assert result.stdout.strip() == "[]"
+
+
+class TestBuildStageFrames:
+    """Tests for the fused build_stage_frames pass."""
+
+    def test_build_stage_frames_matches_separate_stages(self, sample_df):
+        """Tests that the fused pass gives the same frames as transform then load."""
+        df = pd.concat([sample_df.iloc[::-1], sample_df], ignore_index=True)
+        df.loc[1, "artist_name"] = None
+        df.loc[0, ["item_type", "slug_type"]] = "a"
+        expected = build_frames(clean_dataframe(df.copy()))
+        for expected_frame, frame in zip(expected, build_stage_frames(df)):
+            pd.testing.assert_frame_equal(expected_frame, frame)
+
+    def test_build_stage_frames_raises_when_empty(self, empty_df):
+        """Tests that an empty frame raises KeyError like clean_dataframe."""
+        with pytest.raises(KeyError):
+            build_stage_frames(empty_df)
+
+    @patch("staging.load_stage_frames")
+    def test_run_load_frame_loads_stage_frames(self, mock_load_stage_frames, sample_df):
+        """Tests that the fused frames are loaded with the high water mark."""
+        assert run_load_frame(sample_df, 1749584460) == 2
+        sales, tags, high_water_mark = mock_load_stage_frames.call_args.args
+        assert sales["track_name"].tolist() == ["Thank Me Later", "Nothing Better"]
+        assert tags["tag_name"].tolist() == ["rock", "rnb"]
+        assert high_water_mark == 1749584460
+
+
+class TestRunLoadFile:
+    """Tests for streaming an extract file with run_load_file."""
+
+    @patch("load.merge_staging")
+    @patch("load.copy_df")
+    @patch("load.get_db_connection")
+    def test_run_load_file_stages_each_chunk_and_merges_once(
+            self, mock_get_db_conn, mock_copy_df, mock_merge_staging, sample_df, tmp_path):
+        """Tests that every chunk is copied into staging but merged only once."""
+        path = str(tmp_path / "output.csv")
+        pd.concat([sample_df] * 3, ignore_index=True).to_csv(path, index=False)
+        assert run_load_file(path, chunk_rows=2, high_water_mark=1749584460) == 6
+        sale_copies = [call for call in mock_copy_df.call_args_list
+                       if call.args[2] == "stage_sale"]
+        assert [len(call.args[1]) for call in sale_copies] == [2, 2, 2]
+        mock_merge_staging.assert_called_once()
+        assert mock_merge_staging.call_args.args[1] == 1749584460
+
+    def test_export_stage_files_writes_staging_csv(self, sample_df, tmp_path):
+        """Tests that the staging CSV files hold the same rows as the staging frames."""
+        path, sales_path = str(tmp_path / "output.csv"), str(tmp_path / "stage.csv")
+        sample_df.to_csv(path, index=False)
+        assert export_stage_files(path, sales_path, chunk_rows=1) == 2
+        sales, tags = build_stage_frames(pd.read_csv(path))
+        assert load_csv_data(sales_path).columns.tolist() == SALE_COLS
+        assert load_csv_data(sales_path)["url"].tolist() == sales["url"].tolist()
+        assert load_csv_data(str(tmp_path / "stage_tags.csv"))["tag_name"].tolist() == (
+            tags["tag_name"].tolist())
@@ -1,19 +1,25 @@
 """Test file for the transform pipeline."""
 
-from datetime import datetime, UTC
+from datetime import datetime
 from unittest.mock import patch
 import pytest
 import pandas as pd
 
+from utilities import load_data
 from transform import (rename_columns,
                        get_required_columns,
                        handle_missing_values,
                        correct_album_name,
                        standardize_dates,
                        standardize_release_date,
+                       standardize_date_series,
+                       standardize_release_date_series,
                        sort_by_date,
                        clean_dataframe,
-                       export_dataframe)
+                       clean_columns,
+                       export_dataframe,
+                       export_dataframe_chunks,
+                       REQUIRED_COLUMNS)
 
 
 class TestCleaningFunctions:
@@ -146,36 +152,106 @@ class TestStandardizationFunctions:
         with pytest.raises(TypeError):
             standardize_release_date(bad_value)
 
+    def test_standardize_date_series_matches_row_wise(self):
+        """Tests that the vectorised dates equal standardize_dates on each row, to the microsecond."""
+        dates = pd.Series([1749542761.50579, 1749542767.53329, 1717945897.8614645, 17])
+        expected = dates.apply(standardize_dates)
+        pd.testing.assert_series_equal(standardize_date_series(dates), expected)
+
+    def test_standardize_date_series_raises_type_error_on_invalid_input(self):
+        """Tests that a non-numeric date raises TypeError like the row-wise function."""
+        with pytest.raises(TypeError):
+            standardize_date_series(pd.Series([1749542761.5, "not_a_timestamp"]))
+
+    def test_standardize_date_series_raises_value_error_on_nan(self):
+        """Tests that a missing date raises ValueError like datetime.fromtimestamp."""
+        with pytest.raises(ValueError):
+            standardize_date_series(pd.Series([1749542761.5, float("nan")]))
+
+    def test_standardize_release_date_series_matches_row_wise(self):
+        """Tests that strings are parsed and anything else is left as it is."""
+        dates = pd.Series(["released January 18, 2023", None,
+                           "released January 18, 2023", "released  june 3,  2025"],
+                          index=[3, 1, 2, 0])
+        expected = dates.apply(
+            lambda x: standardize_release_date(x) if isinstance(x, str) else x)
+        pd.testing.assert_series_equal(standardize_release_date_series(dates), expected)
+
+    def test_standardize_release_date_series_raises_on_invalid_format(self):
+        """Tests that an unparseable release string raises ValueError."""
+        with pytest.raises(ValueError):
+            standardize_release_date_series(
+                pd.Series(["released January 18, 2023", "coming soon"]))
+
 
 class TestPipeline:
     """Tests for the combinining of functionalities and the exporting to csv."""
-    @patch("transform.handle_missing_values")
-    @patch("transform.correct_album_name")
-    @patch("transform.sort_by_date")
-    @patch("transform.get_required_columns")
-    @patch("transform.rename_columns")
-    def test_clean_dataframe_pipeline(self,
-                                      mock_rename, mock_get_required, mock_handle_missing,
-                                      mock_correct_album, mock_sort, sample_df
-                                      ):
-        """Tests that clean_dataframe applies all transformation steps."""
-        mock_rename.return_value = sample_df
-        mock_get_required.return_value = sample_df
-        mock_handle_missing.return_value = sample_df
-        mock_correct_album.return_value = sample_df
-        mock_sort.return_value = sample_df
+    @patch("transform.clean_columns", wraps=clean_columns)
+    def test_clean_dataframe_pipeline(self, mock_clean_columns, sample_df):
+        """Tests that clean_dataframe builds the frame from clean_columns, sorted by date."""
+        df = sample_df.iloc[::-1]
 
-        result = clean_dataframe(sample_df)
+        result = clean_dataframe(df)
 
         assert isinstance(result, pd.DataFrame)
-        mock_rename.assert_called_once()
-        mock_get_required.assert_called_once()
-        mock_handle_missing.assert_called_once()
-        mock_correct_album.assert_called_once()
-        mock_sort.assert_called_once()
+        mock_clean_columns.assert_called_once()
+        assert result["utc_date"].is_monotonic_increasing
+
+    def test_clean_dataframe_matches_separate_steps(self, sample_df):
+        """Tests that the one-pass clean gives the same rows and values as running
+        each cleaning step on its own."""
+        df = pd.concat([sample_df.iloc[::-1], sample_df], ignore_index=True)
+        df.loc[1, "artist_name"] = None
+        df.loc[0, "item_type"] = "a"
+        expected = correct_album_name(handle_missing_values(
+            get_required_columns(rename_columns(df.copy()))))
+        expected["utc_date"] = standardize_date_series(expected["utc_date"])
+        expected["release_date"] = standardize_release_date_series(expected["release_date"])
+        pd.testing.assert_frame_equal(clean_dataframe(df.copy()), sort_by_date(expected))
+
+    def test_clean_columns_returns_sort_order(self, sample_df):
+        """Tests that the columns stay in input order with the order to sort them by."""
+        columns, order = clean_columns(sample_df.iloc[::-1], fill_album_names=False)
+        assert list(columns) == REQUIRED_COLUMNS
+        assert order.tolist() == [1, 0]
+        assert columns["utc_date"].iloc[0] > columns["utc_date"].iloc[1]
+
+    def test_clean_columns_already_in_order(self, sample_df):
+        """Tests that no order is returned when the rows are already sorted."""
+        _, order = clean_columns(sample_df)
+        assert order is None
 
     @patch("pandas.DataFrame.to_csv")
     def test_export_dataframe_call(self, mock_to_csv, sample_df):
         """Test that export_dataframe creates a csv of the clean data."""
         export_dataframe(sample_df, output_path="mock_path.csv")
         mock_to_csv.assert_called_once_with("mock_path.csv", index=False)
+
+    def test_export_dataframe_parquet_round_trip(self, sample_df, tmp_path):
+        """Test that the clean data round-trips through parquet with its types intact."""
+        clean_df = clean_dataframe(sample_df)
+        output_path = str(tmp_path / "clean_sales.parquet")
+        export_dataframe(clean_df, output_path=output_path)
+        loaded_df = load_data(output_path)
+        assert loaded_df["tag_names"].tolist() == [["rock"], ["rnb"]]
+        assert str(loaded_df["utc_date"].dtype) == str(clean_df["utc_date"].dtype)
+        assert loaded_df["sold_for"].tolist() == [2.02, 2.02]
+
+    def test_export_dataframe_chunks_parquet(self, sample_df, tmp_path):
+        """Tests that cleaned chunks are appended to one parquet file, typing columns
+        that are all null in the first chunk from the clean schema."""
+        output_path = str(tmp_path / "clean_sales.parquet")
+        first, second = clean_dataframe(sample_df.iloc[:1]), clean_dataframe(sample_df.iloc[1:])
+        first["release_date"] = None
+        assert export_dataframe_chunks([first, second], output_path) == 2
+        loaded_df = load_data(output_path)
+        assert loaded_df["tag_names"].tolist() == [["rock"], ["rnb"]]
+        assert pd.isna(loaded_df["release_date"].iloc[0])
+        assert loaded_df["release_date"].iloc[1] == pd.Timestamp("2023-01-20")
+
+    def test_export_dataframe_chunks_csv(self, sample_df, tmp_path):
+        """Tests that chunks are appended to one CSV file with a single header."""
+        output_path = str(tmp_path / "clean_sales.csv")
+        chunks = [clean_dataframe(sample_df.iloc[:1]), clean_dataframe(sample_df.iloc[1:])]
+        assert export_dataframe_chunks(chunks, output_path) == 2
+        assert len(pd.read_csv(output_path)) == 2
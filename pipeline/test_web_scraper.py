@@ -1,10 +1,14 @@
 # pylint: skip-file
 
 """Test file for web scraper functions."""
-from unittest.mock import Mock, patch
+from unittest.mock import Mock, MagicMock, patch
 import pytest
+import requests
 from bs4 import BeautifulSoup
-from web_scraper import get_relevant_html, get_release_date, filter_tags, get_genres, get_release_date_and_genres
+from web_scraper import (get_relevant_html, get_release_date, filter_tags, get_genres,
+                         get_release_date_and_genres, format_published_date,
+                         get_release_date_and_genres_from_structured_data,
+                         parse_page_stream, stream_release_date_and_genres)
 from utilities import set_logger, get_logger
 
 set_logger()
@@ -127,7 +131,7 @@ def test_get_genres_when_no_genres_found(test_html, expected_result):
     assert get_genres(soup, logger) == expected_result
 
 
-@patch("web_scraper.requests.get")
+@patch("requests.Session.get")
 def test_get_release_date_and_genres_returns_expected_dict(mock_get_request):
     """Tests that the get_release_date_and_genres functions returns the expected 
     dict containing release date and genres."""
@@ -149,3 +153,159 @@ def test_get_release_date_and_genres_returns_expected_dict(mock_get_request):
 
     assert result["release_date"] == "released June 11, 2024"
     assert result["genres"] == ["electronic", "pop"]
+
+
+@pytest.mark.parametrize("published, expected_date",
+                         (
+                             ("11 Oct 2024 00:00:00 GMT", "released October 11, 2024"),
+                             ("06 Jun 2025 00:00:00 GMT", "released June 6, 2025"),
+                             ("not a date", None),
+                             (None, None)
+                         ))
+def test_format_published_date(published, expected_date):
+    """Tests that structured data dates are formatted like the credits text."""
+    assert format_published_date(published) == expected_date
+
+
+def test_structured_data_returns_release_date_and_genres():
+    """Tests that the JSON-LD blob is read without parsing the page."""
+    test_html = b"""<head><script type="application/ld+json">
+    {"datePublished": "11 Jun 2024 00:00:00 GMT",
+     "keywords": ["electronic", "Germany", "pop"]}
+    </script></head>"""
+    assert get_release_date_and_genres_from_structured_data(test_html, logger) == {
+        "release_date": "released June 11, 2024", "genres": ["electronic", "pop"]}
+
+
+def test_structured_data_uses_tralbum_release_date():
+    """Tests that the data-tralbum attribute supplies a missing release date."""
+    test_html = b"""<script type="application/ld+json">{"keywords": "jazz, Japan"}</script>
+    <script data-tralbum="{&quot;current&quot;:{&quot;release_date&quot;:&quot;01 Oct 2024 00:00:00 GMT&quot;}}"></script>"""
+    assert get_release_date_and_genres_from_structured_data(test_html, logger) == {
+        "release_date": "released October 1, 2024", "genres": ["jazz"]}
+
+
+@pytest.mark.parametrize("ld_json",
+                         (
+                             b"""[{"datePublished": "11 Jun 2024 00:00:00 GMT",
+                                  "keywords": ["electronic", "Germany", "pop"]}]""",
+                             b"""{"@graph": [{"@type": "Organization"},
+                                  {"datePublished": "11 Jun 2024 00:00:00 GMT",
+                                   "keywords": ["electronic", "Germany", "pop"]}]}"""
+                         ))
+def test_structured_data_reads_list_shaped_json_ld(ld_json):
+    """Tests that the item is picked out of a JSON-LD array or @graph."""
+    test_html = b'<script type="application/ld+json">' + ld_json + b"</script>"
+    assert get_release_date_and_genres_from_structured_data(test_html, logger) == {
+        "release_date": "released June 11, 2024", "genres": ["electronic", "pop"]}
+
+
+@patch("requests.Session.get")
+def test_get_release_date_and_genres_falls_back_from_odd_json_ld(mock_get_request):
+    """Tests that JSON-LD that isn't an object, and tralbum data that isn't either,
+    fall back to parsing the page instead of raising."""
+    mock_response = Mock()
+    mock_response.status_code = 200
+    mock_response.content = b"""<script type="application/ld+json">["pop", 5]</script>
+    <script data-tralbum="[1, 2]"></script>
+    <div id='pgBd'><div class='tralbumData tralbum-credits'>released June 11, 2024</div>
+    <a class='tag'>pop</a></div>"""
+    mock_get_request.return_value = mock_response
+
+    result = get_release_date_and_genres("http://test.com", logger, stream=False)
+
+    assert result == {"release_date": "released June 11, 2024", "genres": ["pop"]}
+
+
+@pytest.mark.parametrize("test_html",
+                         (
+                             b"<div id='pgBd'></div>",
+                             b"<script type='application/ld+json'>{not json}</script>",
+                             b"""<script type="application/ld+json">{"keywords": ["pop"]}</script>"""
+                         ))
+def test_structured_data_missing_returns_none(test_html):
+    """Tests that pages without usable structured data return None."""
+    assert get_release_date_and_genres_from_structured_data(test_html, logger) is None
+
+
+@patch("requests.Session.get")
+def test_get_release_date_and_genres_prefers_structured_data(mock_get_request):
+    """Tests that the structured data is used over the HTML when both are present."""
+    mock_response = Mock()
+    mock_response.content = b"""<script type="application/ld+json">
+    {"datePublished": "11 Jun 2024 00:00:00 GMT", "keywords": ["techno"]}</script>
+    <div id='pgBd'><a class='tag'>pop</a></div>"""
+    mock_get_request.return_value = mock_response
+
+    result = get_release_date_and_genres("http://test.com", logger)
+
+    assert result == {"release_date": "released June 11, 2024", "genres": ["techno"]}
+
+
+STREAMED_PAGE_CHUNKS = [
+    b"<html><head><title>Item</title></head><body><div id='pgBd'>",
+    b"<div class='tralbumData tralbum-credits'> released June 11, 2024 <br>",
+    b"\n by Artist <div>nested</div></div>",
+    b"<div class='tralbumData tralbum-tags'><a class='tag'>electronic</a>",
+    b"<a class='tag'>Germany</a><a class='tag'>pop</a></div>",
+    b"<div class='comments'>" + b"a long comment " * 1000 + b"</div></div></body></html>",
+]
+
+
+def test_parse_page_stream_stops_after_tags():
+    """Tests that the stream is abandoned once the tags block has closed."""
+    details, bytes_read = parse_page_stream(iter(STREAMED_PAGE_CHUNKS), logger)
+    assert details == {"release_date": "released June 11, 2024",
+                       "genres": ["electronic", "pop"]}
+    assert bytes_read == sum(len(chunk) for chunk in STREAMED_PAGE_CHUNKS[:-1])
+
+
+def test_parse_page_stream_stops_after_structured_data():
+    """Tests that the stream is abandoned as soon as the JSON-LD has been read."""
+    chunks = [b'<head><script type="application/ld+json">{"datePublished": ',
+              b'"11 Jun 2024 00:00:00 GMT", "keywords": ["techno"]}</script></head>',
+              b"<body><div id='pgBd'><a class='tag'>pop</a></div></body>"]
+    details, bytes_read = parse_page_stream(iter(chunks), logger)
+    assert details == {"release_date": "released June 11, 2024", "genres": ["techno"]}
+    assert bytes_read == len(chunks[0]) + len(chunks[1])
+
+
+def test_parse_page_stream_reads_on_past_unusable_structured_data():
+    """Tests that JSON-LD with a date it can't read doesn't stop the stream before
+    the credits and tags, wherever the chunks split."""
+    page = (b'<head><script type="application/ld+json">{"datePublished": "2024-10-11",'
+            b' "keywords": ["techno"]}</script></head>' + b"".join(STREAMED_PAGE_CHUNKS))
+    expected = {"release_date": "released June 11, 2024", "genres": ["electronic", "pop"]}
+    assert parse_page_stream(iter([page[:120], page[120:]]), logger)[0] == expected
+    assert parse_page_stream(iter([page]), logger)[0] == expected
+
+
+def test_parse_page_stream_raises_error_without_page_body():
+    """Tests that a page without pgBd fails like the full-page path."""
+    with pytest.raises(ValueError):
+        parse_page_stream(iter([b"<html><body>Not found</body></html>"]), logger)
+
+
+@patch("requests.Session.get")
+def test_stream_release_date_and_genres_requests_a_stream(mock_get_request):
+    """Tests that the page is requested as a stream and read in chunks."""
+    mock_response = MagicMock()
+    mock_response.__enter__.return_value.iter_content.return_value = iter(
+        STREAMED_PAGE_CHUNKS)
+    mock_get_request.return_value = mock_response
+
+    result = stream_release_date_and_genres("http://test.com", logger)
+
+    assert result["genres"] == ["electronic", "pop"]
+    assert mock_get_request.call_args.kwargs["stream"] is True
+
+
+@patch("requests.Session.get")
+def test_get_release_date_and_genres_raises_when_rate_limited(mock_get_request):
+    """Tests that a 429 surfaces as an HTTPError so the rate limiter can back off."""
+    mock_response = Mock()
+    mock_response.status_code = 429
+    mock_get_request.return_value = mock_response
+
+    with pytest.raises(requests.exceptions.HTTPError):
+        get_release_date_and_genres("http://test.com", logger)
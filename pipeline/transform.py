@@ -1,31 +1,39 @@
 """Script for the transform part of the ETL."""
-import re
-from datetime import datetime, UTC
+import numpy as np
 import pandas as pd
-from utilities import get_logger, set_logger
+import pyarrow as pa
+from pandas.api.types import is_bool_dtype, is_numeric_dtype
+from utilities import (get_logger, set_logger, load_data, save_parquet_data,
+                       iter_data_chunks, save_parquet_chunks, CHUNK_ROWS)
+# standardize_dates and standardize_release_date are re-exported for callers of transform.
+from record_transform import (  # pylint: disable=unused-import
+    COLUMN_RENAMES, RELEASE_DATE_PATTERN, RELEASE_DATE_FORMAT, REQUIRED_COLUMNS,
+    standardize_dates, standardize_release_date)
+
+CLEAN_SCHEMA = pa.schema([
+    ("utc_date", pa.timestamp("us", tz="UTC")), ("item_type", pa.string()),
+    ("album_name", pa.string()), ("artist_name", pa.string()),
+    ("item_description", pa.string()), ("tag_names", pa.list_(pa.string())),
+    ("sold_for", pa.float64()), ("release_date", pa.timestamp("us")),
+    ("country_name", pa.string()), ("slug_type", pa.string()), ("url", pa.string()),
+    ("art_url", pa.string()),
+])
 
 
 def rename_columns(df: pd.DataFrame) -> pd.DataFrame:
     """Renames columns to a standardized format if needed."""
-    return df.rename(columns={"country": "country_name", "album_title": "album_name",
-                              "track_title": "track_name",
-                              "amount_paid_usd": "sold_for", "genres": "tag_names"
-                              })
+    return df.rename(columns=COLUMN_RENAMES)
 
 
 def get_required_columns(df: pd.DataFrame) -> pd.DataFrame:
     """Returns the dataframe with the required columns."""
     logger = get_logger()
 
-    required_cols = [
-        "utc_date", "item_type", "album_name", "artist_name", "item_description",
-        "tag_names", "sold_for", "release_date", "country_name", "slug_type", "url", "art_url"
-    ]
-    missing_cols = [col for col in required_cols if col not in df.columns]
+    missing_cols = [col for col in REQUIRED_COLUMNS if col not in df.columns]
     if missing_cols:
         logger.critical("Missing required columns: %s", missing_cols)
         raise KeyError(f"Missing required columns: {missing_cols}")
-    return df[required_cols]
+    return df[REQUIRED_COLUMNS]
 
 
 def handle_missing_values(df: pd.DataFrame) -> pd.DataFrame:
@@ -52,78 +60,157 @@ def correct_album_name(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
-def standardize_dates(date: float) -> datetime:
-    """Converts a UTC timestamp string to a datetime object."""
+def standardize_date_series(dates: pd.Series) -> pd.Series:
+    """Converts a column of UTC timestamps to tz-aware datetimes in one pass.
+    Gives the same values and errors as applying standardize_dates to each row."""
     logger = get_logger()
 
-    if not isinstance(date, (float, int)):
-        logger.critical(
-            "Date object must be a float or int before standardizing.")
-        raise TypeError(
-            "Date object must be a float or int before standardizing.")
-
-    return datetime.fromtimestamp(float(date), tz=UTC)
-
-
-def standardize_release_date(date: str) -> datetime:
-    """Converts a string like 'released June 3, 2025' into a datetime object."""
+    if not is_numeric_dtype(dates) or is_bool_dtype(dates):
+        for date in pd.unique(dates):
+            if not isinstance(date, (float, int)):
+                logger.critical(
+                    "Date object must be a float or int before standardizing.")
+                raise TypeError(
+                    "Date object must be a float or int before standardizing.")
+
+    seconds = dates.to_numpy(dtype="float64")
+    if np.isnan(seconds).any():
+        logger.critical("Dates cannot be NaN before standardizing.")
+        raise ValueError("Dates cannot be NaN before standardizing.")
+
+    # Rounded to the microsecond like datetime.fromtimestamp, so values match exactly.
+    fraction, whole = np.modf(seconds)
+    microseconds = (whole.astype("int64") * 1_000_000
+                    + np.round(fraction * 1e6).astype("int64"))
+    return pd.Series(pd.to_datetime(microseconds, unit="us", utc=True),
+                     index=dates.index, name=dates.name)
+
+
+def standardize_release_date_series(dates: pd.Series) -> pd.Series:
+    """Converts a column of strings like 'released June 3, 2025' into datetimes.
+    Each distinct string is parsed once; values that aren't strings are left as they are.
+    Gives the same values and errors as applying standardize_release_date to each string."""
     logger = get_logger()
 
-    if not isinstance(date, str):
-        logger.critical("Release date must be a string.")
-        raise TypeError("Release date must be a string.")
+    codes, uniques = pd.factorize(dates)
+    uniques = np.asarray(uniques, dtype=object)
+    is_string = np.fromiter((isinstance(date, str) for date in uniques),
+                            dtype=bool, count=len(uniques))
+
+    release_strings = pd.Series(uniques[is_string], dtype=object)
+    matches = release_strings.str.extract(RELEASE_DATE_PATTERN, expand=False)
+    if matches.isna().any():
+        invalid_date = release_strings[matches.isna()].iloc[0]
+        logger.critical("Invalid release date format: %s", invalid_date)
+        raise ValueError(f"Invalid release date format: {invalid_date}")
+    parsed = pd.to_datetime(matches.str.replace(r"\s+", " ", regex=True),
+                            format=RELEASE_DATE_FORMAT)
 
-    match = re.search(r"released\s+([A-Za-z]+\s+\d{1,2},\s+\d{4})", date)
-    if match:
-        return datetime.strptime(match.group(1), "%B %d, %Y")
-    logger.critical("Invalid release date format: %s", date)
-    raise ValueError(f"Invalid release date format: {date}")
+    uniques[is_string] = parsed.to_numpy(dtype=object)
+    values = np.empty(len(dates), dtype=object)
+    present = codes != -1
+    values[present] = uniques[codes[present]]
+    values[~present] = dates[~present].to_numpy(dtype=object)
+    return pd.Series(values, index=dates.index, name=dates.name).infer_objects()
 
 
 def sort_by_date(df: pd.DataFrame) -> pd.DataFrame:
     """Sorts the DataFrame by the utc_date column in ascending order.
+    The sort is stable, so sales at the same time keep their feed order.
     Raises a ValueError if any null values exist in the utc_date column.
     """
     if df["utc_date"].isnull().any():
         raise ValueError("utc_date column contains null values.")
-    return df.sort_values(by="utc_date")
+    return df.sort_values(by="utc_date", kind="stable")
+
+
+def copy_album_descriptions(df: pd.DataFrame, is_album: pd.Series) -> pd.Series:
+    """Returns album_name with item_description copied in for albums, like correct_album_name,
+    but only converting the album rows' descriptions."""
+    album_names = df["album_name"].to_numpy(dtype=object, copy=True)
+    album_names[is_album.to_numpy()] = df["item_description"][is_album].to_numpy(dtype=object)
+    return pd.Series(album_names, index=df.index, name="album_name",
+                     dtype=df["album_name"].dtype)
+
+
+def clean_columns(df: pd.DataFrame,
+                  fill_album_names: bool = True) -> tuple[dict[str, pd.Series], np.ndarray | None]:
+    """Returns the cleaned required columns, still in input order, and the stable
+    utc_date order to take them in (None if they're already in order).
+    Each column is filtered and converted once; album names are only filled in
+    from the descriptions if fill_album_names is set."""
+    df = get_required_columns(rename_columns(df))
+    if df["artist_name"].isna().any():
+        df = handle_missing_values(df)
+
+    utc_date = standardize_date_series(df["utc_date"])
+    order = utc_date.argsort(kind="stable").to_numpy()
+    if (order == np.arange(len(order))).all():
+        order = None
+
+    columns = dict(df.items())
+    columns["utc_date"] = utc_date
+    columns["release_date"] = standardize_release_date_series(df["release_date"])
+    if fill_album_names:
+        columns["album_name"] = copy_album_descriptions(df, df["item_type"] == "a")
+    return columns, order
 
 
 def clean_dataframe(df: pd.DataFrame) -> pd.DataFrame:
-    """Returns a cleaned pandas DataFrame after applying all transformation functions."""
+    """Returns a cleaned pandas DataFrame after applying all transformation functions.
+    Built in one pass from clean_columns, so each column is converted once."""
     logger = get_logger()
     if df.empty:
         logger.critical("DataFrame cannot be empty before cleaning...")
         raise KeyError("DataFrame cannot be empty before cleaning...")
 
     logger.info("Cleaning dataframe...")
+    columns, order = clean_columns(df)
+    clean_df = pd.DataFrame(columns, copy=False)
+    if order is not None:
+        clean_df = clean_df.take(order)
+    logger.info("Cleaning successfull!")
+    return clean_df
 
-    df = rename_columns(df)
-    df = get_required_columns(df)
-    df = handle_missing_values(df)
-    df = correct_album_name(df)
-    df["utc_date"] = df["utc_date"].apply(standardize_dates)
-    df["release_date"] = df["release_date"].apply(
-        lambda x: standardize_release_date(x) if isinstance(x, str) else x
-    )
 
-    df = sort_by_date(df)
-    logger.info("Cleaning successfull!")
-    return df
+def export_dataframe(df: pd.DataFrame, output_path: str = "data/clean_sales.parquet") -> None:
+    """Exports the cleaned DataFrame to a .parquet file, or a CSV file if the path ends in .csv."""
+    logger = get_logger()
+    if output_path.endswith(".csv"):
+        logger.info("Exporting to csv...")
+        df.to_csv(output_path, index=False)
+    else:
+        logger.info("Exporting to parquet...")
+        save_parquet_data(df, output_path)
+    logger.info("Success!")
 
 
-def export_dataframe(df: pd.DataFrame, output_path: str = "data/clean_sales.csv") -> None:
-    """Exports the cleaned DataFrame to a CSV file."""
+def export_dataframe_chunks(chunks, output_path: str = "data/clean_sales.parquet") -> int:
+    """Returns the number of rows exported after appending each cleaned DataFrame to one
+    .parquet file, or a CSV file if the path ends in .csv.
+    Each chunk is sorted on its own, so the file is only in order within chunks."""
     logger = get_logger()
-    logger.info("Exporting to csv...")
-    df.to_csv(output_path, index=False)
+    if not output_path.endswith(".csv"):
+        logger.info("Exporting chunks to parquet...")
+        row_count = save_parquet_chunks(chunks, output_path, CLEAN_SCHEMA)
+    else:
+        logger.info("Exporting chunks to csv...")
+        row_count = 0
+        for i, df in enumerate(chunks):
+            df.to_csv(output_path, index=False, mode="a" if i else "w", header=not i)
+            row_count += len(df)
     logger.info("Success!")
+    return row_count
 
 
 if __name__ == "__main__":
     set_logger()
-    FILE_PATH = "data/output.csv"
-    data = pd.read_csv(FILE_PATH)
-
-    CLEAN_DF = clean_dataframe(data)
-    export_dataframe(CLEAN_DF)
+    FILE_PATH = "data/output.parquet"
+
+    if CHUNK_ROWS:
+        export_dataframe_chunks(clean_dataframe(chunk)
+                                for chunk in iter_data_chunks(FILE_PATH, CHUNK_ROWS))
+    else:
+        data = load_data(FILE_PATH)
+        CLEAN_DF = clean_dataframe(data)
+        export_dataframe(CLEAN_DF)
@@ -1,8 +1,22 @@
-"""Python script for logging on AWS."""
+"""Python script for logging on AWS.
+pandas and pyarrow are only imported by the file helpers that use them, so modules
+that just need the logger don't pay for importing them."""
+# pylint: disable=import-outside-toplevel
+from __future__ import annotations
 
+import os
+from collections.abc import Iterable, Iterator
 from logging import getLogger, INFO, StreamHandler
 from sys import stdout
-import pandas as pd
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+PARQUET_COMPRESSION = "zstd"
+CHUNK_ROWS = int(os.getenv("CHUNK_ROWS", "0"))
 
 
 def get_logger():
@@ -19,6 +33,7 @@ def set_logger():
 
 def load_csv_data(file_path: str = 'data/output.csv') -> pd.DataFrame:
     """Loads the unclean data from csv."""
+    import pandas as pd
     logger = get_logger()
     if not isinstance(file_path, str):
         logger.critical("Invalid URL type.")
@@ -27,3 +42,121 @@ def load_csv_data(file_path: str = 'data/output.csv') -> pd.DataFrame:
         logger.critical("Filename doesn't end in .csv.")
         raise ValueError("Please end your filename in .csv.")
     return pd.read_csv(file_path)
+
+
+def save_parquet_data(df: pd.DataFrame, file_path: str,
+                      schema: pa.Schema = None) -> None:
+    """Writes the DataFrame to a zstd-compressed parquet file.
+    If a schema is given the columns are cast to it, otherwise it is taken from the dtypes."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    logger = get_logger()
+    if not isinstance(file_path, str):
+        logger.critical("Invalid URL type.")
+        raise TypeError("Invalid URL type.")
+    if not file_path.endswith(".parquet"):
+        logger.critical("Filename doesn't end in .parquet.")
+        raise ValueError("Please end your filename in .parquet.")
+    table = pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+    pq.write_table(table, file_path, compression=PARQUET_COMPRESSION)
+
+
+def load_parquet_data(file_path: str = 'data/output.parquet') -> pd.DataFrame:
+    """Loads data from parquet, keeping list columns as python lists."""
+    import pyarrow.parquet as pq
+    logger = get_logger()
+    if not isinstance(file_path, str):
+        logger.critical("Invalid URL type.")
+        raise TypeError("Invalid URL type.")
+    if not file_path.endswith(".parquet"):
+        logger.critical("Filename doesn't end in .parquet.")
+        raise ValueError("Please end your filename in .parquet.")
+    return table_to_dataframe(pq.read_table(file_path))
+
+
+def table_to_dataframe(table: pa.Table) -> pd.DataFrame:
+    """Returns the arrow table as a DataFrame, keeping list columns as python lists."""
+    import pyarrow as pa
+    df = table.to_pandas()
+    for field in table.schema:
+        if pa.types.is_list(field.type):
+            df[field.name] = table.column(field.name).to_pylist()
+    return df
+
+
+def load_data(file_path: str) -> pd.DataFrame:
+    """Loads data from a .parquet or .csv file, chosen by its extension."""
+    if isinstance(file_path, str) and file_path.endswith(".parquet"):
+        return load_parquet_data(file_path)
+    return load_csv_data(file_path)
+
+
+def iter_parquet_batches(parquet_file: pq.ParquetFile, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    """Yields the rows of an open parquet file as DataFrames of at most chunk_rows rows."""
+    import pyarrow as pa
+    with parquet_file:
+        for batch in parquet_file.iter_batches(batch_size=chunk_rows):
+            yield table_to_dataframe(pa.Table.from_batches([batch]))
+
+
+def iter_data_chunks(file_path: str, chunk_rows: int = CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """Returns an iterator over a .parquet or .csv file in DataFrames of at most chunk_rows
+    rows, so files larger than memory can be processed. Only one chunk is read at a time."""
+    import pandas as pd
+    import pyarrow.parquet as pq
+    logger = get_logger()
+    if not isinstance(chunk_rows, int) or chunk_rows < 1:
+        logger.critical("Chunk size must be a positive integer.")
+        raise ValueError("Chunk size must be a positive integer.")
+    if isinstance(file_path, str) and file_path.endswith(".parquet"):
+        return iter_parquet_batches(pq.ParquetFile(file_path), chunk_rows)
+    if not isinstance(file_path, str):
+        logger.critical("Invalid URL type.")
+        raise TypeError("Invalid URL type.")
+    if file_path[-4:] != ".csv":
+        logger.critical("Filename doesn't end in .csv.")
+        raise ValueError("Please end your filename in .csv.")
+    return iter(pd.read_csv(file_path, chunksize=chunk_rows))
+
+
+def fill_null_columns(table: pa.Table, schema: pa.Schema) -> pa.Table:
+    """Returns the table with the columns that hold nothing but nulls retyped to
+    the schema's type for them, since pandas can't infer a type for those."""
+    import pyarrow as pa
+    for i, field in enumerate(table.schema):
+        if field.name in schema.names and table.column(i).null_count == table.num_rows:
+            target = schema.field(field.name)
+            table = table.set_column(i, target, pa.nulls(table.num_rows, target.type))
+    return table
+
+
+def save_parquet_chunks(chunks: Iterable[pd.DataFrame], file_path: str,
+                        schema: pa.Schema = None) -> int:
+    """Returns the number of rows written after appending each DataFrame to one
+    zstd-compressed parquet file. The file's schema is taken from the first chunk;
+    columns that are all null in a chunk are typed from schema if it's given."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    logger = get_logger()
+    if not isinstance(file_path, str):
+        logger.critical("Invalid URL type.")
+        raise TypeError("Invalid URL type.")
+    if not file_path.endswith(".parquet"):
+        logger.critical("Filename doesn't end in .parquet.")
+        raise ValueError("Please end your filename in .parquet.")
+
+    writer, row_count = None, 0
+    try:
+        for df in chunks:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if schema is not None:
+                table = fill_null_columns(table, schema)
+            if writer is None:
+                writer = pq.ParquetWriter(file_path, table.schema.remove_metadata(),
+                                          compression=PARQUET_COMPRESSION)
+            writer.write_table(table.cast(writer.schema))
+            row_count += table.num_rows
+    finally:
+        if writer is not None:
+            writer.close()
+    return row_count
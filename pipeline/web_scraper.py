@@ -1,8 +1,90 @@
 """Script for the web scraper part of ETL."""
+import codecs
+import html
+import json
+import os
+import re
+from collections.abc import Iterable
+from datetime import datetime
+from html.parser import HTMLParser
+
 import requests
 from bs4 import BeautifulSoup, Tag
 
 from utilities import set_logger, get_logger
+from http_client import get_scrape_session
+
+LD_JSON_PATTERN = re.compile(
+    rb'<script[^>]*type=["\']application/ld\+json["\'][^>]*>(.*?)</script>', re.S)
+TRALBUM_PATTERN = re.compile(rb'data-tralbum="([^"]*)"')
+PUBLISHED_DATE_FORMAT = "%d %b %Y %H:%M:%S %Z"
+STREAM_PAGES = os.getenv("SCRAPE_STREAM_PAGES", "false").lower() == "true"
+STREAM_CHUNK_SIZE = 16384
+
+
+class ItemPageParser(HTMLParser):
+    """Incremental parser that only keeps the parts of an item page holding the
+    release date and tags: the JSON-LD script, the credits block and the tag links.
+    Sets done once everything needed has been seen, so the rest of the page can be skipped."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.found_page_body = False
+        self.structured_data = {}
+        self.credits_text = []
+        self.tags = []
+        self.done = False
+        self._ld_json = None
+        self._section = None
+        self._section_depth = 0
+        self._tag_text = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        classes = (attrs.get("class") or "").split()
+        if tag == "script" and attrs.get("type") == "application/ld+json":
+            self._ld_json = []
+        elif tag == "div":
+            if attrs.get("id") == "pgBd":
+                self.found_page_body = True
+            if self._section:
+                self._section_depth += 1
+            elif "tralbum-credits" in classes:
+                self._section, self._section_depth = "credits", 1
+            elif "tralbum-tags" in classes:
+                self._section, self._section_depth = "tags", 1
+        elif tag == "a" and "tag" in classes and self.found_page_body:
+            self._tag_text = []
+
+    def handle_endtag(self, tag):
+        if tag == "script" and self._ld_json is not None:
+            try:
+                structured_data = pick_structured_data(json.loads("".join(self._ld_json)))
+            except ValueError:
+                structured_data = None
+            self._ld_json = None
+            if structured_data:
+                self.structured_data = structured_data
+                release_date, keywords = read_structured_data(structured_data)
+                if release_date and keywords is not None:
+                    self.done = True
+        elif tag == "div" and self._section:
+            self._section_depth -= 1
+            if self._section_depth == 0:
+                if self._section == "tags":
+                    self.done = True
+                self._section = None
+        elif tag == "a" and self._tag_text is not None:
+            self.tags.append("".join(self._tag_text).strip())
+            self._tag_text = None
+
+    def handle_data(self, data):
+        if self._ld_json is not None:
+            self._ld_json.append(data)
+        if self._section == "credits":
+            self.credits_text.append(data)
+        if self._tag_text is not None:
+            self._tag_text.append(data)
 
 
 def filter_tags(tags: list[str], logger) -> list[str]:
@@ -23,12 +105,28 @@ def filter_tags(tags: list[str], logger) -> list[str]:
     return genres
 
 
-def get_relevant_html(url: str, logger) -> Tag:
-    """Returns the html element containing details on release date and tags."""
+def check_throttled(page: requests.Response, url: str, logger) -> None:
+    """Returns None, but raises an HTTPError if Bandcamp is rate limiting the request,
+    so the adaptive rate limiter can back off."""
+
+    if page.status_code == 429:
+        logger.warning("Rate limited while retrieving '%s'", url)
+        raise requests.exceptions.HTTPError("Rate limited by Bandcamp.", response=page)
+
+
+def fetch_page(url: str, logger) -> bytes:
+    """Returns the raw content of the page to be scraped."""
 
     logger.info("Retrieving page to be scraped from '%s'", url)
-    page = requests.get(url, timeout=5)
-    soup = BeautifulSoup(page.content, "html.parser")
+    page = get_scrape_session().get(url, timeout=5)
+    check_throttled(page, url, logger)
+    return page.content
+
+
+def parse_relevant_html(content: bytes, logger) -> Tag:
+    """Returns the html element containing details on release date and tags."""
+
+    soup = BeautifulSoup(content, "html.parser")
     results = soup.find(id="pgBd")
 
     if not results:
@@ -39,6 +137,142 @@ def get_relevant_html(url: str, logger) -> Tag:
     return results
 
 
+def get_relevant_html(url: str, logger) -> Tag:
+    """Returns the html element containing details on release date and tags."""
+
+    return parse_relevant_html(fetch_page(url, logger), logger)
+
+
+def format_published_date(published: str) -> str | None:
+    """Returns a structured data date such as '11 Oct 2024 00:00:00 GMT'
+    in the 'released October 11, 2024' form shown on the item page."""
+
+    try:
+        release_date = datetime.strptime(published, PUBLISHED_DATE_FORMAT)
+    except (TypeError, ValueError):
+        return None
+    return f"released {release_date:%B} {release_date.day}, {release_date.year}"
+
+
+def pick_structured_data(ld_json) -> dict:
+    """Returns the JSON-LD object describing the item: the blob itself if it is an object,
+    or the entry with a datePublished from a top-level array or @graph. Returns an empty
+    dict for anything else, so the page is parsed instead."""
+
+    entries = ld_json.get("@graph") if isinstance(ld_json, dict) else ld_json
+    if isinstance(entries, list):
+        return next((entry for entry in entries
+                     if isinstance(entry, dict) and entry.get("datePublished")), {})
+    return ld_json if isinstance(ld_json, dict) else {}
+
+
+def get_structured_data(content: bytes) -> dict:
+    """Returns the release date and tag list embedded in the page as JSON-LD,
+    falling back to the data-tralbum attribute for the release date."""
+
+    structured_data = {}
+    ld_json = LD_JSON_PATTERN.search(content)
+    if ld_json:
+        try:
+            structured_data = pick_structured_data(json.loads(ld_json.group(1)))
+        except ValueError:
+            structured_data = {}
+
+    if not structured_data.get("datePublished"):
+        tralbum = TRALBUM_PATTERN.search(content)
+        if tralbum:
+            try:
+                tralbum_data = json.loads(html.unescape(tralbum.group(1).decode()))
+            except ValueError:
+                tralbum_data = {}
+            if not isinstance(tralbum_data, dict):
+                tralbum_data = {}
+            current = tralbum_data.get("current")
+            if not isinstance(current, dict):
+                current = {}
+            structured_data["datePublished"] = (current.get("release_date")
+                                                or tralbum_data.get("album_release_date"))
+    return structured_data
+
+
+def read_structured_data(structured_data: dict) -> tuple[str | None, list | None]:
+    """Returns the formatted release date and keyword list from parsed structured data,
+    with None for either if it is missing or unusable."""
+
+    keywords = structured_data.get("keywords")
+    if isinstance(keywords, str):
+        keywords = [keyword.strip() for keyword in keywords.split(",")]
+    if not isinstance(keywords, list):
+        keywords = None
+    return format_published_date(structured_data.get("datePublished")), keywords
+
+
+def get_details_from_structured_data(structured_data: dict, logger) -> dict | None:
+    """Returns the release date and genres from parsed structured data,
+    or None if it doesn't hold both."""
+
+    release_date, keywords = read_structured_data(structured_data)
+    if not release_date or not isinstance(keywords, list):
+        logger.debug("No structured data found in page.")
+        return None
+
+    return {"release_date": release_date,
+            "genres": filter_tags([keyword for keyword in keywords if keyword], logger)}
+
+
+def get_release_date_and_genres_from_structured_data(content: bytes, logger) -> dict | None:
+    """Returns the release date and genres read straight from the page's structured data,
+    or None if the page doesn't embed both."""
+
+    if isinstance(content, str):
+        content = content.encode()
+    return get_details_from_structured_data(get_structured_data(content), logger)
+
+
+def parse_page_stream(chunks: Iterable[bytes], logger) -> tuple[dict, int]:
+    """Returns the release date and genres from a page read chunk by chunk, along with
+    the number of bytes consumed. Stops reading as soon as both have been captured."""
+
+    parser = ItemPageParser()
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    bytes_read = 0
+    for chunk in chunks:
+        bytes_read += len(chunk)
+        parser.feed(decoder.decode(chunk))
+        if parser.done:
+            break
+
+    details = get_details_from_structured_data(parser.structured_data, logger)
+    if details:
+        return details, bytes_read
+
+    if not parser.found_page_body:
+        logger.error("Could not find element with id 'pgBd in HTML.")
+        raise ValueError("Could not find element with id 'pgBd in HTML.")
+
+    release_date = None
+    for line in "".join(parser.credits_text).splitlines():
+        if "released" in line.strip():
+            release_date = line.strip()
+            break
+    return {"release_date": release_date,
+            "genres": filter_tags(parser.tags, logger)}, bytes_read
+
+
+def stream_release_date_and_genres(url: str, logger,
+                                   chunk_size: int = STREAM_CHUNK_SIZE) -> dict:
+    """Returns the release date and genres for an item, closing the connection as soon
+    as they have been read instead of downloading the whole page."""
+
+    logger.info("Streaming page to be scraped from '%s'", url)
+    with get_scrape_session().get(url, timeout=5, stream=True) as page:
+        check_throttled(page, url, logger)
+        details, bytes_read = parse_page_stream(
+            page.iter_content(chunk_size), logger)
+    logger.info("Read %s bytes of page before stopping.", bytes_read)
+    return details
+
+
 def get_release_date(results: Tag, logger) -> str:
     """Returns the release date for a given item."""
 
@@ -82,13 +316,24 @@ def get_genres(results: Tag, logger) -> list[str]:
     return genres
 
 
-def get_release_date_and_genres(url: str, logger) -> dict:
-    """Scrapes the given web page and returns the release date and genres."""
+def get_release_date_and_genres(url: str, logger, stream: bool = STREAM_PAGES) -> dict:
+    """Scrapes the given web page and returns the release date and genres.
+    Reads the page's structured data where possible, and only parses the
+    full HTML when it is missing. Set stream to stop downloading the page
+    once the details have been read."""
+
+    if stream:
+        return stream_release_date_and_genres(url, logger)
+
+    content = fetch_page(url, logger)
+    details = get_release_date_and_genres_from_structured_data(content, logger)
+    if details:
+        return details
 
     details = {}
-    html = get_relevant_html(url, logger)
-    item_release_date = get_release_date(html, logger)
-    item_genres = get_genres(html, logger)
+    results = parse_relevant_html(content, logger)
+    item_release_date = get_release_date(results, logger)
+    item_genres = get_genres(results, logger)
 
     details["release_date"] = item_release_date
     details["genres"] = item_genres